@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_userprofile_level'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='new_cards_per_day',
+            field=models.IntegerField(default=50, verbose_name='Новых карточек в день'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_new_cards_per_day'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='timezone',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Часовой пояс'),
+        ),
+    ]
@@ -1,7 +1,10 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -26,6 +29,10 @@ class UserProfile(models.Model):
     last_study_date = models.DateField(null=True, blank=True)
     
     total_points = models.IntegerField(default=0)
+    # Сколько новых карточек вводить в изучение за день по всем колодам (см. cards/newcards.py)
+    new_cards_per_day = models.IntegerField('Новых карточек в день', default=50)
+    # Имя из базы IANA (Europe/Moscow); пусто – часовой пояс сервера (TIME_ZONE)
+    timezone = models.CharField('Часовой пояс', max_length=64, blank=True, default='')
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -40,6 +47,15 @@ class UserProfile(models.Model):
     def level(self):
         """Вычисляем уровень на основе очков"""
         return (self.total_points // 100) + 1
+    
+    def get_timezone(self):
+        """Часовой пояс пользователя, по которому считаются его дни"""
+        if self.timezone:
+            try:
+                return ZoneInfo(self.timezone)
+            except (ZoneInfoNotFoundError, ValueError):
+                pass
+        return timezone.get_default_timezone()
 
 
 # Автоматическое создание профиля при регистрации
@@ -1,6 +1,9 @@
 # backend/accounts/serializers.py
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from .models import UserProfile
 
 User = get_user_model()
 
@@ -45,3 +48,20 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
         read_only_fields = ['id']
+
+
+class StudySettingsSerializer(serializers.ModelSerializer):
+    """Настройки обучения из профиля пользователя"""
+    new_cards_per_day = serializers.IntegerField(min_value=0, max_value=9999)
+    
+    class Meta:
+        model = UserProfile
+        fields = ['new_cards_per_day', 'timezone']
+    
+    def validate_timezone(self, value):
+        if value:
+            try:
+                ZoneInfo(value)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise serializers.ValidationError('Неизвестный часовой пояс')
+        return value
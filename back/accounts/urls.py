@@ -9,6 +9,9 @@ router.register(r'', views.AuthViewSet, basename='auth')
 urlpatterns = [
     path('user/', include([
         path('me/', views.UserViewSet.as_view({'get': 'me'}), name='user-me'),
+        path('settings/', views.UserViewSet.as_view(
+            {'get': 'study_settings', 'patch': 'study_settings'}
+        ), name='user-settings'),
     ])),
     path('', include(router.urls)),
 ]
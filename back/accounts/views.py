@@ -4,8 +4,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import User
-from .serializers import UserRegistrationSerializer, UserSerializer
+from .models import User, UserProfile
+from .serializers import UserRegistrationSerializer, UserSerializer, StudySettingsSerializer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -54,3 +54,14 @@ class UserViewSet(viewsets.GenericViewSet):
     def me(self, request):
         serializer = self.get_serializer(request.user)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get', 'patch'])
+    def study_settings(self, request):
+        """Настройки обучения: дневной лимит новых карточек и часовой пояс."""
+        profile, _ = UserProfile.objects.get_or_create(user=request.user)
+        if request.method == 'GET':
+            return Response(StudySettingsSerializer(profile).data)
+        serializer = StudySettingsSerializer(profile, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Deck, Card, StudySession, CardReview
+from .models import Deck, Card, StudySession, CardReview, DailyActivity, DailyNewCards, DashboardStats, TagStat, SyncTombstone
 
 @admin.register(Deck)
 class DeckAdmin(admin.ModelAdmin):
@@ -15,4 +15,24 @@ class StudySessionAdmin(admin.ModelAdmin):
     
 @admin.register(CardReview)
 class CardReviewAdmin(admin.ModelAdmin):
-    list_display = ['card', 'rating', 'reviewed_at']
+    list_display = ['card', 'user', 'rating', 'reviewed_at', 'reviewed_on', 'is_practice']
+
+@admin.register(DailyActivity)
+class DailyActivityAdmin(admin.ModelAdmin):
+    list_display = ['user', 'date', 'reviews', 'cards_studied', 'sessions']
+
+@admin.register(DailyNewCards)
+class DailyNewCardsAdmin(admin.ModelAdmin):
+    list_display = ['deck', 'user', 'date', 'introduced']
+
+@admin.register(DashboardStats)
+class DashboardStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'cards_count', 'learned_count', 'due_count', 'week_cards', 'week_sessions']
+
+@admin.register(TagStat)
+class TagStatAdmin(admin.ModelAdmin):
+    list_display = ['name', 'user', 'cards_count', 'mastered_count']
+
+@admin.register(SyncTombstone)
+class SyncTombstoneAdmin(admin.ModelAdmin):
+    list_display = ['model', 'object_id', 'user', 'deleted_at']
@@ -0,0 +1,298 @@
+"""
+Импорт коллекций Anki (.apkg / .colpkg).
+
+Архив – zip с базой SQLite коллекции. База копируется из архива во временный файл
+кусками, дальше всё читается курсорами пачками (fetchmany): в памяти одновременно
+только текущая пачка и отображение id карточек Anki → наши id.
+
+- колоды Anki «Родитель::Дочерняя» → папки по пути и колода по последней части имени;
+- карточки Anki → Card (поля заметки без HTML, cloze раскрываются по номеру карточки),
+  состояние SM-2 переносится: factor → ease_factor, ivl → interval, due → next_review,
+  число успешных ответов после последнего «Again» (считается в самой базе Anki) → repetitions;
+- revlog → CardReview в одной сессии «Импорт из Anki», затем пересобирается DailyActivity.
+
+Медиафайлы не переносятся. Формат .anki21b (Anki 2.1.50+) сжат zstd и читается
+пакетом zstandard. Импорт идёт в одной транзакции – при ошибке ничего не создаётся.
+"""
+import html
+import json
+import re
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import NamedTuple
+
+from django.db import connection, transaction
+
+from .importing import BATCH_SIZE, CardWriter, ImportFormatError
+from .days import user_timezone
+from .models import Card, CardReview, DailyActivity, DashboardStats, Deck, Folder, StudySession
+from .sm2 import MAX_EASE_FACTOR, MIN_EASE_FACTOR
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Имена базы внутри архива в порядке предпочтения
+COLLECTION_NAMES = ('collection.anki21b', 'collection.anki21', 'collection.anki2')
+FIELD_SEPARATOR = '\x1f'
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Типы и очереди карточек Anki
+CARD_TYPE_NEW = 0
+CARD_TYPE_REVIEW = 2
+QUEUE_SUSPENDED = -1
+
+CARDS_SQL = """
+    SELECT c.id, CASE WHEN c.odid != 0 THEN c.odid ELSE c.did END, c.ord, c.type, c.queue,
+        c.due, c.ivl, c.factor, n.flds, n.tags,
+        (
+            SELECT COUNT(*) FROM revlog r
+            WHERE r.cid = c.id AND r.ease > 1 AND r.id > coalesce(
+                (SELECT MAX(l.id) FROM revlog l WHERE l.cid = c.id AND l.ease = 1), 0
+            )
+        ),
+        (SELECT MAX(r.id) FROM revlog r WHERE r.cid = c.id)
+    FROM cards c JOIN notes n ON n.id = c.nid
+    ORDER BY c.id
+"""
+# Поля CardReview в порядке значений, которые пишет _import_reviews
+REVIEW_FIELDS = (
+    'session', 'card', 'user', 'is_practice', 'rating', 'time_taken', 'reviewed_at', 'reviewed_on',
+    'ease_factor_before', 'interval_before', 'ease_factor_after', 'interval_after',
+)
+REVLOG_SQL = 'SELECT id, cid, ease, ivl, lastIvl, factor, time FROM revlog WHERE ease > 0 ORDER BY cid, id'
+
+_CLOZE = re.compile(r'\{\{c(\d+)::(.*?)(?:::(.*?))?\}\}', re.DOTALL)
+_BREAK = re.compile(r'<br\s*/?>|</div>|</p>', re.IGNORECASE)
+_TAG = re.compile(r'<[^>]+>')
+_SOUND = re.compile(r'\[sound:[^\]]*\]')
+
+
+class AnkiReport(NamedTuple):
+    decks: int
+    cards: int
+    reviews: int
+
+
+def html_to_text(value):
+    value = _SOUND.sub('', value)
+    value = _BREAK.sub('\n', value)
+    value = html.unescape(_TAG.sub('', value)).replace('\xa0', ' ')
+    return '\n'.join(line.strip() for line in value.splitlines() if line.strip())
+
+
+def card_sides(fields, ordinal):
+    """Вопрос и ответ карточки Anki с номером ordinal по полям заметки."""
+    if _CLOZE.search(fields[0]):
+        number = str(ordinal + 1)
+        front = _CLOZE.sub(
+            lambda m: f'[{m.group(3) or "..."}]' if m.group(1) == number else m.group(2), fields[0]
+        )
+        back = _CLOZE.sub(lambda m: m.group(2), fields[0])
+        extra = fields[1] if len(fields) > 1 else ''
+        return html_to_text(front), html_to_text(back + ('\n' + extra if extra else ''))
+    if ordinal == 0 or len(fields) < 2:
+        front, back = fields[0], fields[1] if len(fields) > 1 else ''
+    elif ordinal < len(fields):
+        front, back = fields[ordinal], fields[0]
+    else:
+        front, back = fields[1], fields[0]
+    return html_to_text(front), html_to_text(back)
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+
+@contextmanager
+def open_collection(archive):
+    """Распаковывает базу коллекции во временный файл и открывает её только для чтения."""
+    try:
+        bundle = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise ImportFormatError('Файл не является архивом Anki (.apkg/.colpkg)')
+    with bundle, tempfile.NamedTemporaryFile(suffix='.anki2') as target:
+        names = set(bundle.namelist())
+        name = next((n for n in COLLECTION_NAMES if n in names), None)
+        if name is None:
+            raise ImportFormatError('В архиве нет базы коллекции Anki')
+        # Рядом с collection.anki21b лежит collection.anki2 – заглушка «обновите Anki»,
+        # поэтому без zstandard импорт прерывается, а не берёт её
+        if name == 'collection.anki21b' and zstandard is None:
+            raise ImportFormatError(
+                'Коллекция сжата zstd: установите пакет zstandard или экспортируйте '
+                'из Anki с поддержкой старых версий'
+            )
+        with bundle.open(name) as source:
+            if name.endswith('anki21b'):
+                zstandard.ZstdDecompressor().copy_stream(source, target)
+            else:
+                shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+        target.flush()
+        connection = sqlite3.connect(f'file:{target.name}?mode=ro', uri=True)
+        try:
+            yield connection
+        except sqlite3.DatabaseError as error:
+            raise ImportFormatError(f'Повреждённая база коллекции: {error}')
+        finally:
+            connection.close()
+
+
+def _fetch(cursor, size):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+def read_decks(collection):
+    """{id колоды Anki: [части имени]} – из таблицы decks (новая схема) или JSON в col."""
+    tables = {row[0] for row in collection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if 'decks' in tables:
+        return {
+            deck_id: name.split(FIELD_SEPARATOR)
+            for deck_id, name in collection.execute('SELECT id, name FROM decks')
+        }
+    decks = json.loads(collection.execute('SELECT decks FROM col').fetchone()[0] or '{}')
+    return {int(deck_id): deck['name'].split('::') for deck_id, deck in decks.items()}
+
+
+class AnkiImporter:
+    def __init__(self, user, folder=None, batch_size=BATCH_SIZE):
+        self.user = user
+        self.folder = folder
+        self.batch_size = batch_size
+        self._folders = {}
+
+    def run(self, archive):
+        # Весь импорт – одна транзакция: при ошибке на середине не остаётся части колод и карточек
+        with transaction.atomic(), open_collection(archive) as collection:
+            created_at = collection.execute('SELECT crt FROM col').fetchone()[0]
+            decks = self._create_decks(collection)
+            card_ids = self._import_cards(collection, decks, created_at)
+            reviews = self._import_reviews(collection, card_ids)
+            DailyActivity.rebuild(user=self.user)
+            # История ответов записана в обход ORM – счётчики дашборда пересчитаются при чтении
+            DashboardStats.objects.filter(user=self.user).delete()
+        return AnkiReport(decks=len(decks), cards=len(card_ids), reviews=reviews)
+
+    def _folder(self, path):
+        """Папка по пути из частей имени колоды Anki, существующие папки переиспользуются."""
+        if not path:
+            return self.folder
+        key = tuple(path)
+        if key not in self._folders:
+            parent = self._folder(path[:-1])
+            name = path[-1][:100]
+            self._folders[key] = Folder.objects.filter(user=self.user, parent=parent, name=name).first() \
+                or Folder.objects.create(user=self.user, parent=parent, name=name)
+        return self._folders[key]
+
+    def _create_decks(self, collection):
+        names = read_decks(collection)
+        used = [row[0] for row in collection.execute(
+            'SELECT DISTINCT CASE WHEN odid != 0 THEN odid ELSE did END FROM cards'
+        )]
+        decks = {}
+        for anki_id in used:
+            parts = names.get(anki_id) or ['Anki']
+            decks[anki_id] = Deck.objects.create(
+                user=self.user, folder=self._folder(parts[:-1]), name=parts[-1][:200]
+            )
+        return decks
+
+    def _import_cards(self, collection, decks, created_at):
+        writer = CardWriter(self.user, batch_size=self.batch_size)
+        card_ids, pending, anki_ids = {}, [], []
+        try:
+            for row in _fetch(collection.execute(CARDS_SQL), self.batch_size):
+                anki_id, deck_id, ordinal, card_type, queue, due, ivl, factor, fields, tags, streak, last = row
+                front, back = card_sides(fields.split(FIELD_SEPARATOR), ordinal)
+                card = Card(
+                    deck=decks[deck_id],
+                    front=front or '—',
+                    back=back or '—',
+                    is_suspended=queue == QUEUE_SUSPENDED,
+                    last_reviewed=_timestamp(last / 1000) if last else None,
+                )
+                if card_type != CARD_TYPE_NEW:
+                    card.ease_factor = min(max(factor / 1000, MIN_EASE_FACTOR), MAX_EASE_FACTOR) if factor \
+                        else MAX_EASE_FACTOR
+                    card.interval = max(ivl, 0)
+                    # Карточка на повторении хотя бы раз успешно отвечена, даже если история удалена
+                    card.repetitions = max(streak, 1) if card_type == CARD_TYPE_REVIEW else streak
+                    # У карточек на повторении due – номер дня от создания коллекции, у изучаемых – unix-время
+                    card.next_review = _timestamp(created_at) + timedelta(days=due) \
+                        if card_type == CARD_TYPE_REVIEW else _timestamp(due)
+                pending.append((card, tags.split()))
+                anki_ids.append(anki_id)
+                if len(pending) >= self.batch_size:
+                    card_ids.update(zip(anki_ids, (card.id for card in writer.write(pending))))
+                    pending, anki_ids = [], []
+            card_ids.update(zip(anki_ids, (card.id for card in writer.write(pending))))
+        finally:
+            writer.finish()
+        return card_ids
+
+    def _import_reviews(self, collection, card_ids):
+        """
+        revlog пишется через executemany кортежами, без экземпляров моделей: на миллионе
+        строк создание и подготовка объектов ORM стоили бы дороже самой вставки.
+        """
+        session = StudySession.objects.create(user=self.user)
+        tz = user_timezone(self.user)
+        adapt = connection.ops.adapt_datetimefield_value
+        adapt_date = connection.ops.adapt_datefield_value
+        batch, total, correct = [], 0, 0
+        first = last = None
+        previous_card, ease_before = None, MAX_EASE_FACTOR
+        for review_id, anki_card_id, ease, ivl, last_ivl, factor, taken in _fetch(
+            collection.execute(REVLOG_SQL), self.batch_size
+        ):
+            card_id = card_ids.get(anki_card_id)
+            if card_id is None:
+                continue
+            if anki_card_id != previous_card:
+                previous_card, ease_before = anki_card_id, MAX_EASE_FACTOR
+            ease_after = factor / 1000 if factor else ease_before
+            reviewed_at = _timestamp(review_id / 1000)
+            batch.append((
+                session.id, card_id, self.user.id, False, ease, taken // 1000,
+                adapt(reviewed_at), adapt_date(reviewed_at.astimezone(tz).date()),
+                ease_before, max(last_ivl, 0), ease_after, max(ivl, 0),
+            ))
+            ease_before = ease_after
+            total += 1
+            correct += ease >= 3
+            first = min(first or reviewed_at, reviewed_at)
+            last = max(last or reviewed_at, reviewed_at)
+            if len(batch) >= self.batch_size:
+                self._write_reviews(batch)
+                batch = []
+        self._write_reviews(batch)
+        if not total:
+            session.delete()
+            return 0
+        StudySession.objects.filter(id=session.id).update(
+            started_at=first, ended_at=last, cards_studied=total, cards_correct=correct
+        )
+        return total
+
+    def _write_reviews(self, batch):
+        if not batch:
+            return
+        quote = connection.ops.quote_name
+        columns = [CardReview._meta.get_field(name).column for name in REVIEW_FIELDS]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(CardReview._meta.db_table),
+            ', '.join(quote(column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
@@ -0,0 +1,206 @@
+"""
+Денормализованные счётчики карточек в Deck и Folder.
+
+Deck хранит общее число карточек, новых и приостановленных; Folder – число подпапок,
+колод, карточек в своих колодах и карточек во всём поддереве. Заодно sync_cards
+сдвигает счётчики дашборда пользователя (dashboard.py). Одиночные изменения
+приходят через сигналы (см. конец models.py), пакетные пути (bulk_create/bulk_update)
+вызывают sync_cards/recount_decks сами. Расхождения чинит команда reconcile_counters.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .dashboard import adjust_cards, expire_week, recount_cards
+from .models import Card, Deck, Folder
+
+# Состояние ещё не сохранённой карточки: она пока не учтена в счётчиках
+NOT_COUNTED = object()
+
+
+def folder_chain_ids(folder_id):
+    """id папки и всех её предков (по материализованному пути)."""
+    path = Folder.objects.filter(id=folder_id).values_list('path', flat=True).first()
+    if not path:
+        return [folder_id]
+    return Folder.parse_path(path)
+
+
+def adjust_folder_cards(folder_id, delta):
+    """Сдвигает счётчики карточек папки и всех её предков."""
+    if not folder_id or not delta:
+        return
+    now = timezone.now()
+    Folder.objects.filter(id=folder_id).update(cards_count=F('cards_count') + delta, updated_at=now)
+    Folder.objects.filter(id__in=folder_chain_ids(folder_id)).update(
+        subtree_cards_count=F('subtree_cards_count') + delta, updated_at=now
+    )
+
+
+def adjust_folder_subtree(parent_id, subtree_cards, subfolders=0):
+    """Папка с subtree_cards карточками появилась (или исчезла) под parent_id."""
+    if not parent_id:
+        return
+    if subfolders:
+        Folder.objects.filter(id=parent_id).update(
+            subfolders_count=F('subfolders_count') + subfolders, updated_at=timezone.now()
+        )
+    if subtree_cards:
+        Folder.objects.filter(id__in=folder_chain_ids(parent_id)).update(
+            subtree_cards_count=F('subtree_cards_count') + subtree_cards, updated_at=timezone.now()
+        )
+
+
+def sync_cards(cards, deleted=False):
+    """
+    Применяет к счётчикам изменения карточек относительно запомненного состояния
+    (загрузка из БД или предыдущая синхронизация) и запоминает новое состояние.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0])
+    recount = set()
+    # Счётчики дашборда пользователя (dashboard.py): [карточек, изученных, [(было, стало), ...]]
+    users = defaultdict(lambda: [0, 0, []])
+    recount_users = set()
+    for card in cards:
+        old_due = getattr(card, '_due_state', NOT_COUNTED)
+        new_due = None if deleted else card.get_due_state()
+        if old_due != new_due:
+            if old_due is None or (new_due is None and not deleted):
+                recount_users.add(card.user_id)
+            else:
+                users[card.user_id][2].append((None if old_due is NOT_COUNTED else old_due, new_due))
+            card._due_state = new_due
+
+        old = getattr(card, '_counter_state', NOT_COUNTED)
+        new = None if deleted else card.get_counter_state()
+        if old == new:
+            continue
+        if old is None or (new is None and not deleted):
+            # Часть полей была отложена (.only/.defer) – пересчитываем колоду целиком
+            recount.add(card.deck_id)
+            recount_users.add(card.user_id)
+        else:
+            user = users[card.user_id]
+            if old is not NOT_COUNTED:
+                delta = deltas[old[0]]
+                delta[0] -= 1
+                delta[1] -= old[1]
+                delta[2] -= old[2]
+                user[0] -= 1
+                user[1] -= not old[1]
+            if new is not None:
+                delta = deltas[new[0]]
+                delta[0] += 1
+                delta[1] += new[1]
+                delta[2] += new[2]
+                user[0] += 1
+                user[1] += not new[1]
+        card._counter_state = new
+
+    deltas = {deck_id: delta for deck_id, delta in deltas.items() if any(delta) and deck_id not in recount}
+    moved = {deck_id: delta[0] for deck_id, delta in deltas.items() if delta[0]}
+    folders = dict(
+        Deck.objects.filter(id__in=moved, folder__isnull=False).values_list('id', 'folder_id')
+    ) if moved else {}
+    now = timezone.now()
+    for deck_id, (cards_delta, new_delta, suspended_delta) in deltas.items():
+        Deck.objects.filter(id=deck_id).update(
+            cards_count=F('cards_count') + cards_delta,
+            new_cards_count=F('new_cards_count') + new_delta,
+            suspended_cards_count=F('suspended_cards_count') + suspended_delta,
+            updated_at=now,
+        )
+    folder_deltas = defaultdict(int)
+    for deck_id, folder_id in folders.items():
+        folder_deltas[folder_id] += moved[deck_id]
+    for folder_id, delta in folder_deltas.items():
+        adjust_folder_cards(folder_id, delta)
+    if recount:
+        recount_decks(recount)
+    users = {user_id: change for user_id, change in users.items() if user_id not in recount_users and (
+        change[0] or change[1] or change[2]
+    )}
+    if users:
+        adjust_cards(users)
+    if recount_users:
+        recount_cards(recount_users)
+    if deleted:
+        # Ответы удалённых карточек уходят каскадом – недельный счётчик их больше не видит
+        reviewed = {card.user_id for card in cards if card.last_reviewed is not None}
+        if reviewed:
+            expire_week(reviewed)
+
+
+def recount_decks(deck_ids):
+    """Пересчитывает счётчики колод по таблице карточек и переносит разницу в папки."""
+    before = dict(Deck.objects.filter(id__in=deck_ids).values_list('id', 'cards_count'))
+    _update_deck_counts(Deck.objects.filter(id__in=deck_ids))
+    after = Deck.objects.filter(id__in=deck_ids, folder__isnull=False).values_list(
+        'id', 'folder_id', 'cards_count'
+    )
+    for deck_id, folder_id, cards_count in after:
+        adjust_folder_cards(folder_id, cards_count - before.get(deck_id, 0))
+
+
+def _count_cards(**filters):
+    return Coalesce(Subquery(
+        Card.objects.filter(deck=OuterRef('pk'), **filters)
+        .order_by().values('deck').annotate(c=Count('id')).values('c')
+    ), Value(0))
+
+
+def _update_deck_counts(decks):
+    decks.update(
+        cards_count=_count_cards(),
+        new_cards_count=_count_cards(repetitions=0),
+        suspended_cards_count=_count_cards(is_suspended=True),
+        updated_at=timezone.now(),
+    )
+
+
+def reconcile(user=None):
+    """Полностью пересчитывает счётчики колод и папок (всех или одного пользователя)."""
+    decks = Deck.objects.all()
+    folders = Folder.objects.all()
+    if user is not None:
+        decks = decks.filter(user=user)
+        folders = folders.filter(user=user)
+    _update_deck_counts(decks)
+
+    nodes = {
+        folder.id: folder
+        for folder in folders.annotate(
+            direct_subfolders=Count('subfolders', distinct=True),
+            direct_decks=Count('decks', distinct=True),
+        ).order_by()
+    }
+    direct_cards = defaultdict(int)
+    for folder_id, cards_count in decks.filter(folder__isnull=False).values_list('folder_id', 'cards_count'):
+        direct_cards[folder_id] += cards_count
+    subtree = defaultdict(int)
+    for folder in nodes.values():
+        # Поднимаемся от каждой папки к корню, добавляя её карточки всем предкам
+        current, seen = folder, set()
+        while current is not None and current.id not in seen:
+            seen.add(current.id)
+            subtree[current.id] += direct_cards[folder.id]
+            current = nodes.get(current.parent_id)
+
+    changed, now = [], timezone.now()
+    for folder in nodes.values():
+        values = (
+            folder.direct_subfolders, folder.direct_decks,
+            direct_cards[folder.id], subtree[folder.id],
+        )
+        if values != (folder.subfolders_count, folder.decks_count, folder.cards_count, folder.subtree_cards_count):
+            (folder.subfolders_count, folder.decks_count,
+             folder.cards_count, folder.subtree_cards_count) = values
+            folder.updated_at = now
+            changed.append(folder)
+    Folder.objects.bulk_update(
+        changed, ['subfolders_count', 'decks_count', 'cards_count', 'subtree_cards_count', 'updated_at'],
+        batch_size=500,
+    )
+    return len(changed)
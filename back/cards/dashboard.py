@@ -0,0 +1,175 @@
+"""
+Счётчики дашборда (DashboardStats): одна строка на пользователя.
+
+- cards_count, learned_count, decks_count сдвигаются вместе со счётчиками колод:
+  карточки – в sync_cards (counters.py), колоды – обработчиками в конце models.py;
+- due_count – карточки к повторению до границы due_until (конец текущего дня
+  пользователя). Изменения next_review/is_suspended сдвигают его, пока граница
+  не прошла; в новый день чтение пересчитывает его одним запросом по частичному
+  индексу cards_card_user_due_idx;
+- week_cards и week_sessions – различные карточки и сессии обучения за текущую
+  неделю (с понедельника, в часовом поясе пользователя). Записи ответов и
+  end_session прибавляют к ним; при смене недели счётчики начинаются с нуля.
+  Удаление отвеченной карточки или колоды уносит ответы каскадом – тогда
+  week_start сбрасывается (expire_week), и неделя пересчитывается при чтении.
+
+Строки нет – она считается целиком при первом чтении (stats_for). После
+массовых изменений (импорт Anki, reconcile_counters) строку достаточно удалить.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from .days import day_start, local_today, user_timezone
+from .models import Card, CardReview, DashboardStats, Deck, StudySession
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _is_due(state, until):
+    return state is not None and not state[0] and state[1] is not None and state[1] < until
+
+
+def adjust_cards(changes):
+    """
+    Применяет изменения карточек: changes – {user_id: [карточек, изученных, [(было, стало), ...]]},
+    где было/стало – состояния (is_suspended, next_review), None у новой или удалённой карточки.
+    """
+    due_users = [user_id for user_id, (_, _, moves) in changes.items() if moves]
+    watermarks = dict(
+        DashboardStats.objects.filter(user_id__in=due_users).values_list('user_id', 'due_until')
+    ) if due_users else {}
+    now = timezone.now()
+    for user_id, (cards, learned, moves) in changes.items():
+        updates = {}
+        if cards:
+            updates['cards_count'] = F('cards_count') + cards
+        if learned:
+            updates['learned_count'] = F('learned_count') + learned
+        until = watermarks.get(user_id)
+        if until is not None and until > now:
+            due = sum(_is_due(new, until) - _is_due(old, until) for old, new in moves)
+            if due:
+                # Граница могла смениться параллельным пересчётом – тогда разница уже не к месту
+                updates['due_count'] = Case(
+                    When(due_until=until, then=F('due_count') + due), default=F('due_count')
+                )
+        if updates:
+            DashboardStats.objects.filter(user_id=user_id).update(**updates)
+
+
+def recount_cards(user_ids):
+    """Пересчитывает карточки по счётчикам колод (после recount_decks), due_count – при следующем чтении."""
+    for user_id in user_ids:
+        totals = Deck.objects.filter(user_id=user_id).aggregate(
+            cards=Sum('cards_count'), new=Sum('new_cards_count')
+        )
+        cards, new = totals['cards'] or 0, totals['new'] or 0
+        DashboardStats.objects.filter(user_id=user_id).update(
+            cards_count=cards, learned_count=cards - new, due_until=None
+        )
+
+
+def adjust_decks(user_id, decks=0, cards=0, learned=0):
+    """Колода создана или удалена вместе с карточками; due_count тогда пересчитывается при чтении."""
+    updates = {'decks_count': F('decks_count') + decks}
+    if cards or learned:
+        updates.update(
+            cards_count=F('cards_count') + cards,
+            learned_count=F('learned_count') + learned,
+            due_until=None,
+        )
+    DashboardStats.objects.filter(user_id=user_id).update(**updates)
+
+
+def expire_week(user_ids):
+    """Счётчики недели пересчитаются при следующем чтении (stats_for)."""
+    DashboardStats.objects.filter(user_id__in=user_ids).update(week_start=None)
+
+
+def record_week(user, day, cards=0, sessions=0, tz=None):
+    """Прибавляет к счётчикам недели, если день day (локальный) – на текущей неделе."""
+    current = week_start(local_today(tz or user_timezone(user)))
+    if week_start(day) != current or not (cards or sessions):
+        return
+    # Сброшенную неделю не трогаем: её пересчёт при чтении учтёт и этот ответ
+    DashboardStats.objects.filter(user=user, week_start__isnull=False).update(
+        week_cards=Case(When(week_start=current, then=F('week_cards') + cards), default=Value(cards)),
+        week_sessions=Case(When(week_start=current, then=F('week_sessions') + sessions), default=Value(sessions)),
+        week_start=current,
+    )
+
+
+def count_due(user, until):
+    return Card.objects.filter(
+        user=user, is_suspended=False, next_review__isnull=False, next_review__lt=until
+    ).count()
+
+
+def count_week(user, begin, tz):
+    return {
+        'week_cards': CardReview.objects.filter(
+            user=user, is_practice=False, reviewed_on__gte=begin
+        ).values('card').distinct().count(),
+        'week_sessions': StudySession.objects.filter(
+            user=user, is_practice_mode=False, ended_at__isnull=False, started_at__gte=day_start(begin, tz)
+        ).count(),
+    }
+
+
+def compute(user, tz):
+    """Все счётчики запросами – для первой строки пользователя."""
+    today = local_today(tz)
+    begin = week_start(today)
+    cards = Card.objects.filter(user=user)
+    return {
+        'cards_count': cards.count(),
+        'learned_count': cards.filter(repetitions__gte=1).count(),
+        'decks_count': Deck.objects.filter(user=user).count(),
+        'due_count': count_due(user, day_start(today + timedelta(days=1), tz)),
+        'due_until': day_start(today + timedelta(days=1), tz),
+        'week_start': begin,
+        **count_week(user, begin, tz),
+    }
+
+
+def stats_for(user):
+    """
+    Строка счётчиков с профилем (user.profile) одним запросом. Устаревшие граница
+    due_count и неделя обновляются здесь же; строки нет – создаётся.
+    """
+    stats = DashboardStats.objects.select_related('user__profile').filter(user=user).first()
+    if stats is None:
+        values = compute(user, user_timezone(user))
+        try:
+            with transaction.atomic():
+                DashboardStats.objects.create(user=user, **values)
+        except IntegrityError:
+            pass
+        stats = DashboardStats.objects.select_related('user__profile').get(user=user)
+    tz = user_timezone(stats.user)
+    today = local_today(tz)
+    until = day_start(today + timedelta(days=1), tz)
+    if stats.due_until != until:
+        stats.due_count, stats.due_until = count_due(user, until), until
+        DashboardStats.objects.filter(id=stats.id).update(due_count=stats.due_count, due_until=until)
+    begin = week_start(today)
+    if stats.week_start is None:
+        week = count_week(user, begin, tz)
+        if DashboardStats.objects.filter(id=stats.id, week_start__isnull=True).update(week_start=begin, **week):
+            stats.week_start, stats.week_cards, stats.week_sessions = begin, week['week_cards'], week['week_sessions']
+        else:
+            stats.refresh_from_db(fields=['week_start', 'week_cards', 'week_sessions'])
+    elif stats.week_start != begin:
+        # Условие на старую неделю: если запись ответа уже начала новую, её не обнуляем
+        if DashboardStats.objects.filter(id=stats.id, week_start=stats.week_start).update(
+            week_start=begin, week_cards=0, week_sessions=0
+        ):
+            stats.week_start, stats.week_cards, stats.week_sessions = begin, 0, 0
+        else:
+            stats.refresh_from_db(fields=['week_start', 'week_cards', 'week_sessions'])
+    return stats
@@ -0,0 +1,37 @@
+"""
+Дни пользователя и их границы во времени.
+
+День считается в часовом поясе пользователя (UserProfile.timezone, по умолчанию
+TIME_ZONE). Фильтры по дню строятся не через __date (приведение колонки к дате
+не даёт использовать индекс), а полуинтервалом [начало первого дня, начало дня
+после последнего) в UTC – обычным диапазоном по индексированной колонке.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+
+def user_timezone(user):
+    """Часовой пояс пользователя из профиля; без профиля – часовой пояс сервера."""
+    profile = getattr(user, 'profile', None)
+    return profile.get_timezone() if profile is not None else timezone.get_default_timezone()
+
+
+def local_today(tz):
+    return timezone.localdate(timezone=tz)
+
+
+def day_start(day, tz):
+    """Начало дня day в поясе tz как момент в UTC (с учётом перехода на летнее время)."""
+    return timezone.make_aware(datetime.combine(day, time.min), tz).astimezone(dt_timezone.utc)
+
+
+def day_bounds(first, last, tz):
+    """Полуинтервал (начало, конец) в UTC для дней first..last включительно: поле >= начало и < конец."""
+    return day_start(first, tz), day_start(last + timedelta(days=1), tz)
+
+
+def day_filter(field, first, last, tz):
+    """Условия filter(**...) на поле-момент для дней first..last: {field__gte, field__lt}."""
+    start, end = day_bounds(first, last, tz)
+    return {f'{field}__gte': start, f'{field}__lt': end}
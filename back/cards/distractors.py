@@ -0,0 +1,55 @@
+"""
+Неправильные варианты ответа для режима «Тест».
+
+Вместо всех ответов колоды берётся небольшой случайный пул (sample_cards), который
+кэшируется на колоду и сбрасывается при изменении её карточек. Память и время
+на запрос не зависят от размера колоды.
+"""
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Card
+from .sampling import sample_cards
+
+POOL_SIZE = 60
+
+
+def _version_key(deck_id):
+    return f'distractors_version_{deck_id}'
+
+
+def invalidate_deck(deck_id):
+    """Сбрасывает кэшированные пулы колоды (новая версия ключа)."""
+    try:
+        cache.incr(_version_key(deck_id))
+    except ValueError:
+        cache.set(_version_key(deck_id), 1, None)
+
+
+def get_pool(deck_id, field):
+    """Список различных значений field (back/front) для случайных карточек колоды."""
+    version = cache.get(_version_key(deck_id), 0)
+    cache_key = f'distractors_{deck_id}_{field}_{version}'
+    pool = cache.get(cache_key)
+    if pool is None:
+        cards = sample_cards(
+            Card.objects.filter(deck_id=deck_id, is_suspended=False).only('id', 'shuffle_key', field),
+            POOL_SIZE,
+        )
+        pool = list(dict.fromkeys(getattr(card, field) for card in cards))
+        cache.set(cache_key, pool, getattr(settings, 'CACHE_DISTRACTORS_TTL', 300))
+    return pool
+
+
+def pick_distractors(correct, candidates, count, rng=random):
+    """
+    count различных неправильных ответов, предпочитая близкие по длине к правильному,
+    чтобы варианты не выдавали ответ своим видом.
+    """
+    options = [answer for answer in dict.fromkeys(candidates) if answer != correct]
+    rng.shuffle(options)
+    options.sort(key=lambda answer: abs(len(answer) - len(correct)))
+    nearest = options[:count * 2]
+    return rng.sample(nearest, min(count, len(nearest)))
@@ -0,0 +1,192 @@
+"""
+Потоковый экспорт колод, папок и всего аккаунта.
+
+Записи читаются QuerySet.iterator(chunk_size=...) и сразу превращаются в строки
+выбранного формата; при ?compress=gzip поток сжимается по кусочкам. Ни колода,
+ни аккаунт целиком в памяти не собираются.
+
+Форматы:
+- jsonl – по объекту JSON на строку; в экспорте аккаунта у каждой записи есть поле type;
+- csv   – карточки: front, back, tags, deck и поля SM-2;
+- anki  – текстовый файл с заголовками для импорта в Anki 2.1.55+ (Файл → Импорт):
+          вопрос, ответ, колода «Папка::Колода», теги.
+"""
+import csv
+import json
+import zlib
+
+from django.http import StreamingHttpResponse
+
+from .models import Card, CardReview, DailyActivity, Deck, Folder
+
+FORMATS = ('jsonl', 'csv', 'anki')
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'anki': 'text/tab-separated-values; charset=utf-8',
+}
+EXTENSIONS = {'jsonl': 'jsonl', 'csv': 'csv', 'anki': 'txt'}
+
+CARD_FIELDS = [
+    'id', 'deck', 'front', 'back', 'tags', 'card_type', 'ease_factor', 'interval',
+    'repetitions', 'next_review', 'last_reviewed', 'is_suspended', 'created_at',
+]
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: writerow возвращает готовую строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+def deck_paths(user):
+    """{id колоды: 'Папка::Подпапка::Колода'} – два запроса на всего пользователя."""
+    folders = dict(
+        (folder_id, (name, parent_id))
+        for folder_id, name, parent_id in Folder.objects.filter(user=user).values_list('id', 'name', 'parent_id')
+    )
+
+    def folder_path(folder_id):
+        parts, seen = [], set()
+        while folder_id in folders and folder_id not in seen:
+            seen.add(folder_id)
+            name, folder_id = folders[folder_id]
+            parts.append(name)
+        return parts[::-1]
+
+    return {
+        deck_id: '::'.join(folder_path(folder_id) + [name])
+        for deck_id, name, folder_id in Deck.objects.filter(user=user).values_list('id', 'name', 'folder_id')
+    }
+
+
+def iter_cards(cards, paths):
+    """Карточки как словари; теги подгружаются одним запросом на пачку."""
+    queryset = cards.order_by('deck_id', 'id').prefetch_related('tags')
+    for card in queryset.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'id': card.id,
+            'deck': paths.get(card.deck_id, ''),
+            'front': card.front,
+            'back': card.back,
+            'tags': [tag.name for tag in card.tags.all()],
+            'card_type': card.card_type,
+            'ease_factor': card.ease_factor,
+            'interval': card.interval,
+            'repetitions': card.repetitions,
+            'next_review': _iso(card.next_review),
+            'last_reviewed': _iso(card.last_reviewed),
+            'is_suspended': card.is_suspended,
+            'created_at': _iso(card.created_at),
+        }
+
+
+def iter_account(user, paths):
+    """Все данные пользователя записями с полем type: папки, колоды, карточки, ответы, активность."""
+    for folder in Folder.objects.filter(user=user).order_by('path').values(
+        'id', 'parent_id', 'name', 'color', 'icon', 'description'
+    ).iterator(chunk_size=CHUNK_SIZE):
+        yield {'type': 'folder', **folder}
+    for deck in Deck.objects.filter(user=user).order_by('id').values(
+        'id', 'folder_id', 'name', 'description', 'color', 'is_public', 'created_at'
+    ).iterator(chunk_size=CHUNK_SIZE):
+        deck['created_at'] = _iso(deck['created_at'])
+        yield {'type': 'deck', **deck}
+    for card in iter_cards(Card.objects.filter(user=user), paths):
+        yield {'type': 'card', **card}
+    for review in CardReview.objects.filter(user=user).order_by('id').values(
+        'card_id', 'rating', 'time_taken', 'reviewed_at',
+        'ease_factor_before', 'interval_before', 'ease_factor_after', 'interval_after',
+    ).iterator(chunk_size=CHUNK_SIZE):
+        review['reviewed_at'] = _iso(review['reviewed_at'])
+        yield {'type': 'review', **review}
+    for day in DailyActivity.objects.filter(user=user).values(
+        'date', 'reviews', 'cards_studied', 'cards_correct', 'sessions', 'time_spent'
+    ).iterator(chunk_size=CHUNK_SIZE):
+        day['date'] = day['date'].isoformat()
+        yield {'type': 'activity', **day}
+
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def csv_lines(cards):
+    writer = csv.writer(_Echo())
+    # BOM – чтобы Excel открыл UTF-8 без мастера импорта
+    yield '\ufeff' + writer.writerow(CARD_FIELDS)
+    for card in cards:
+        card['tags'] = ' '.join(card['tags'])
+        yield writer.writerow([card[name] for name in CARD_FIELDS])
+
+
+def anki_lines(cards):
+    # Заголовки текстового импорта Anki: разделитель, колонки колоды и тегов
+    yield '#separator:tab\n#html:false\n#notetype:Basic\n#deck column:3\n#tags column:4\n'
+    writer = csv.writer(_Echo(), delimiter='\t', lineterminator='\n')
+    for card in cards:
+        tags = ' '.join(tag.replace(' ', '_') for tag in card['tags'])
+        yield writer.writerow([card['front'], card['back'], card['deck'], tags])
+
+
+def gzip_chunks(lines, min_chunk=64 * 1024):
+    """Сжимает поток строк в gzip по мере поступления, отдавая куски не меньше min_chunk."""
+    compressor = zlib.compressobj(wbits=31)
+    pending = []
+    size = 0
+    for line in lines:
+        data = compressor.compress(line.encode())
+        if data:
+            pending.append(data)
+            size += len(data)
+        if size >= min_chunk:
+            yield b''.join(pending)
+            pending, size = [], 0
+    pending.append(compressor.flush())
+    yield b''.join(pending)
+
+
+def encoded_chunks(lines, min_chunk=64 * 1024):
+    """Склеивает строки в куски, чтобы не отдавать клиенту по строке за раз."""
+    pending, size = [], 0
+    for line in lines:
+        data = line.encode()
+        pending.append(data)
+        size += len(data)
+        if size >= min_chunk:
+            yield b''.join(pending)
+            pending, size = [], 0
+    if pending:
+        yield b''.join(pending)
+
+
+def export_response(user, fmt, filename, cards=None, compress=False):
+    """
+    StreamingHttpResponse с экспортом. cards – QuerySet карточек колоды/папки;
+    без него экспортируется весь аккаунт (только jsonl).
+    """
+    paths = deck_paths(user)
+    if cards is None:
+        lines = jsonl_lines(iter_account(user, paths))
+    elif fmt == 'csv':
+        lines = csv_lines(iter_cards(cards, paths))
+    elif fmt == 'anki':
+        lines = anki_lines(iter_cards(cards, paths))
+    else:
+        lines = jsonl_lines(iter_cards(cards, paths))
+
+    filename = f'{filename}.{EXTENSIONS[fmt]}'
+    if compress:
+        response = StreamingHttpResponse(gzip_chunks(lines), content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(encoded_chunks(lines), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
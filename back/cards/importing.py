@@ -0,0 +1,277 @@
+"""
+Пакетный импорт карточек из CSV/TSV/JSON.
+
+Файл читается потоково (iter_rows), строки проверяются и записываются пачками
+по batch_size: bulk_create карточек и связей с тегами. Весь импорт – одна
+транзакция: если файл оказывается битым на середине (ImportFormatError), уже
+записанные пачки откатываются. Денормализованные данные (счётчики колод и папок, индекс тегов,
+полнотекстовый индекс, пулы вариантов ответа) обновляются один раз на пачку.
+CardWriter используется и другими импортёрами (см. anki.py).
+"""
+import csv
+import io
+import json
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils.text import slugify
+from taggit.models import Tag, TaggedItem
+
+from .models import Card
+
+FORMATS = ('csv', 'tsv', 'json')
+BATCH_SIZE = 1000
+# Сколько ошибок по строкам хранить в отчёте – остальные только считаются
+MAX_REPORTED_ERRORS = 100
+MAX_TAG_LENGTH = 100
+
+FRONT_KEYS = ('front', 'question', 'вопрос')
+BACK_KEYS = ('back', 'answer', 'ответ')
+
+
+class ImportFormatError(ValueError):
+    """Файл не удаётся разобрать как целое (в отличие от ошибок в отдельных строках)."""
+
+
+def detect_format(filename, default='csv'):
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension in ('jsonl', 'ndjson'):
+        return 'json'
+    if extension == 'txt':
+        return 'tsv'
+    return extension if extension in FORMATS else default
+
+
+def iter_rows(stream, fmt):
+    """Строки файла как словари; stream – бинарный файл, читается кусками."""
+    if fmt not in FORMATS:
+        raise ImportFormatError(f'Неизвестный формат: {fmt}')
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'json':
+            yield from _iter_json(text)
+        else:
+            yield from _iter_delimited(text, '\t' if fmt == 'tsv' else ',')
+    except UnicodeDecodeError:
+        raise ImportFormatError('Файл должен быть в кодировке UTF-8')
+    finally:
+        text.detach()
+
+
+def _iter_delimited(text, delimiter):
+    """CSV/TSV с заголовком (front,back,tags) или без него – тогда колонки по порядку."""
+    reader = csv.reader(text, delimiter=delimiter)
+    header = next(reader, None)
+    if header is None:
+        return
+    keys = [name.strip().lower() for name in header]
+    if not (set(keys) & set(FRONT_KEYS)):
+        # Заголовка нет: первая строка – уже данные
+        keys = ['front', 'back', 'tags']
+        yield dict(zip(keys, header))
+    for values in reader:
+        yield dict(zip(keys, values))
+
+
+def _iter_json(text, chunk_size=64 * 1024):
+    """
+    JSON-массив объектов или JSON Lines. Объекты разбираются по мере чтения,
+    весь файл в память не загружается.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        # Пропускаем разделители между объектами
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and not started and buffer[position] == '[':
+                position += 1
+                started = True
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            if position < len(buffer):
+                break
+            chunk = text.read(chunk_size)
+            if not chunk:
+                return
+            buffer, position = buffer[position:] + chunk, 0
+        started = True
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            chunk = text.read(chunk_size)
+            if not chunk:
+                raise ImportFormatError(f'Некорректный JSON: {error.msg}')
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield value
+        position = end
+        if position > chunk_size:
+            buffer, position = buffer[position:], 0
+
+
+def parse_tags(value):
+    """Список тегов или строка: через запятую/точку с запятой, иначе через пробел."""
+    if isinstance(value, list):
+        names = value
+    else:
+        value = str(value or '').replace(';', ',')
+        names = value.split(',') if ',' in value else value.split()
+    result = []
+    for name in names:
+        name = str(name).strip()
+        if name and name not in result:
+            result.append(name[:MAX_TAG_LENGTH])
+    return result
+
+
+def _first(row, keys):
+    for key in keys:
+        if row.get(key) not in (None, ''):
+            return str(row[key]).strip()
+    return ''
+
+
+def clean_row(row):
+    """Проверяет строку и возвращает (Card без колоды, теги) или бросает ValueError."""
+    if not isinstance(row, dict):
+        raise ValueError('ожидался объект с полями front и back')
+    row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    front, back = _first(row, FRONT_KEYS), _first(row, BACK_KEYS)
+    if not front or not back:
+        raise ValueError('пустой вопрос или ответ')
+    card_type = row.get('card_type') or Card.CARD_TYPE_BASIC
+    if card_type not in dict(Card.CARD_TYPE_CHOICES):
+        raise ValueError(f'неизвестный тип карточки: {card_type}')
+    return Card(front=front, back=back, card_type=card_type), parse_tags(row.get('tags'))
+
+
+@dataclass
+class ImportReport:
+    total_rows: int = 0
+    created: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'error': message})
+
+    def as_dict(self):
+        return {
+            'total_rows': self.total_rows,
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+class CardWriter:
+    """
+    Записывает карточки пачками: bulk_create карточек и TaggedItem в одной транзакции,
+    затем обновляет счётчики, индекс тегов и полнотекстовый индекс для всей пачки.
+    """
+
+    def __init__(self, user, batch_size=BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self._tags = {}
+        self._content_type = ContentType.objects.get_for_model(Card)
+        self.touched_decks = set()
+
+    def write(self, items):
+        """items – список (Card, [имена тегов]); у карточек уже проставлена колода."""
+        from .counters import sync_cards
+        from .search import get_backend
+        from .tagstats import refresh_tag_stats
+
+        if not items:
+            return []
+        for card, _ in items:
+            card.user_id = self.user.id
+        with transaction.atomic():
+            cards = Card.objects.bulk_create([card for card, _ in items], batch_size=self.batch_size)
+            tag_ids = self._tag_ids({name for _, names in items for name in names})
+            TaggedItem.objects.bulk_create([
+                TaggedItem(content_type=self._content_type, object_id=card.id, tag_id=tag_ids[name])
+                for card, names in zip(cards, (names for _, names in items))
+                for name in names
+            ], batch_size=self.batch_size)
+            sync_cards(cards)
+            for card in cards:
+                card._tag_state = card.repetitions
+            refresh_tag_stats(self.user.id, tag_ids.values())
+            get_backend().index_cards([card.id for card in cards])
+        self.touched_decks.update(card.deck_id for card in cards)
+        return cards
+
+    def finish(self):
+        from .distractors import invalidate_deck
+        for deck_id in self.touched_decks:
+            invalidate_deck(deck_id)
+
+    def _tag_ids(self, names):
+        missing = [name for name in names if name not in self._tags]
+        if missing:
+            self._tags.update(Tag.objects.filter(name__in=missing).values_list('name', 'id'))
+            new = [name for name in missing if name not in self._tags]
+            if new:
+                Tag.objects.bulk_create(
+                    [Tag(name=name, slug=slugify(name, allow_unicode=True) or name) for name in new],
+                    ignore_conflicts=True,
+                )
+                self._tags.update(Tag.objects.filter(name__in=new).values_list('name', 'id'))
+                for name in new:
+                    if name not in self._tags:
+                        # Совпал slug с другим тегом – taggit сам подберёт уникальный при save()
+                        self._tags[name] = Tag.objects.get_or_create(name=name)[0].id
+        return {name: self._tags[name] for name in names}
+
+
+def import_cards(deck, rows, batch_size=BATCH_SIZE, progress=None):
+    """
+    Импортирует строки в колоду одной транзакцией. progress(report) вызывается после
+    каждой пачки. Ошибки в строках не прерывают импорт и попадают в отчёт с номером
+    строки; ошибка формата файла откатывает всё.
+    """
+    report = ImportReport()
+    writer = CardWriter(deck.user, batch_size=batch_size)
+    pending = []
+    try:
+        with transaction.atomic():
+            for row_number, row in enumerate(rows, start=1):
+                report.total_rows += 1
+                try:
+                    card, tags = clean_row(row)
+                except ValueError as error:
+                    report.add_error(row_number, str(error))
+                    continue
+                card.deck = deck
+                pending.append((card, tags))
+                if len(pending) >= batch_size:
+                    report.created += len(writer.write(pending))
+                    pending = []
+                    if progress:
+                        progress(report)
+            report.created += len(writer.write(pending))
+            if progress and pending:
+                progress(report)
+    finally:
+        writer.finish()
+    return report
+
+
+@contextmanager
+def open_upload(uploaded):
+    """Бинарный поток загруженного файла: временный файл открывается заново, без копии в памяти."""
+    if hasattr(uploaded, 'temporary_file_path'):
+        with open(uploaded.temporary_file_path(), 'rb') as stream:
+            yield stream
+    else:
+        uploaded.seek(0)
+        yield uploaded.file
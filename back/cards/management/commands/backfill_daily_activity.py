@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from cards.models import DailyActivity
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает дневную сводку DailyActivity из CardReview и StudySession'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Пересобрать только для пользователя с этим id')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        written = DailyActivity.rebuild(user=options['user'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'DailyActivity: записано {written} строк'))
@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'sqlite': 'config.cache.SQLiteCache',
+}
+
+
+def _make_cache(name, location, max_entries):
+    params = {'TIMEOUT': 300, 'OPTIONS': {'MAX_ENTRIES': max_entries}}
+    return import_string(BACKENDS[name])(location if name == 'sqlite' else f'bench-{os.getpid()}', params)
+
+
+def _worker(name, location, max_entries, users, requests, seed):
+    """Один «воркер»: запросы случайных пользователей, ключ на пользователя, промах – запись."""
+    cache = _make_cache(name, location, max_entries)
+    rng = random.Random(seed)
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        key = f'user_{rng.randrange(users)}'
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.set(key, {'cards': rng.randrange(1000)})
+    return hits, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк кэша: LocMemCache против общего SQLiteCache (config/cache.py) в одном и в нескольких процессах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=5000, help='Количество ключей')
+        parser.add_argument('--value-size', type=int, default=200, help='Размер значения, байт')
+        parser.add_argument('--max-entries', type=int, default=500, help='MAX_ENTRIES обоих кэшей')
+        parser.add_argument('--repeat', type=int, default=3, help='Количество прогонов')
+        parser.add_argument('--processes', type=int, default=4, help='Процессов для проверки попаданий (0 – не проверять)')
+        parser.add_argument('--users', type=int, default=300, help='Пользователей в проверке попаданий')
+        parser.add_argument('--requests', type=int, default=5000, help='Запросов на процесс в проверке попаданий')
+
+    def handle(self, *args, **options):
+        keys = [f'bench_{i}' for i in range(options['keys'])]
+        value = 'x' * options['value_size']
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, 'cache.sqlite3')
+            for name in BACKENDS:
+                # Операции на ключах в пределах лимита, чтобы мерить доступ, а не вытеснение
+                cache = _make_cache(name, location, max(options['max_entries'], 2 * len(keys) + 1))
+
+                def set_all():
+                    for key in keys:
+                        cache.set(key, value)
+
+                def get_all():
+                    for key in keys:
+                        cache.get(key)
+
+                def get_many():
+                    for start in range(0, len(keys), 100):
+                        cache.get_many(keys[start:start + 100])
+
+                def incr_all():
+                    for key in keys:
+                        cache.incr(key + '_n')
+
+                cache.clear()
+                cache.set_many({key + '_n': 0 for key in keys}, None)
+                for operation, func in (('set', set_all), ('get', get_all), ('get_many/100', get_many), ('incr', incr_all)):
+                    best = min(self._timeit(func) for _ in range(options['repeat']))
+                    self.stdout.write(
+                        f'{name:<7} {operation:<13} {best * 1000:10.1f} ms   {len(keys) / best:14,.0f} ops/s'
+                    )
+                cache.clear()
+
+            if options['processes']:
+                self._hit_rate(location, options)
+
+    def _hit_rate(self, location, options):
+        processes, requests = options['processes'], options['requests']
+        for name in BACKENDS:
+            if name == 'sqlite':
+                _make_cache(name, location, options['max_entries']).clear()
+            with multiprocessing.get_context('fork').Pool(processes) as pool:
+                results = pool.starmap(_worker, [
+                    (name, location, options['max_entries'], options['users'], requests, seed)
+                    for seed in range(processes)
+                ])
+            hits = sum(hits for hits, _ in results)
+            elapsed = max(elapsed for _, elapsed in results)
+            self.stdout.write(
+                f'{name:<7} процессов: {processes}, пользователей: {options["users"]}   '
+                f'попаданий {hits / (processes * requests):6.1%}   {processes * requests / elapsed:12,.0f} req/s'
+            )
+
+    @staticmethod
+    def _timeit(func):
+        started = time.perf_counter()
+        func()
+        return time.perf_counter() - started
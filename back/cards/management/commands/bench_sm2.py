@@ -0,0 +1,61 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cards.models import Card
+from cards.sm2 import apply_sm2, apply_sm2_bulk, sm2_schedule
+
+
+class Command(BaseCommand):
+    help = 'Микро-бенчмарк: SM-2 по одной карточке (apply_sm2) против векторных apply_sm2_bulk и sm2_schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100_000, help='Количество карточек')
+        parser.add_argument('--repeat', type=int, default=3, help='Количество прогонов')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        count = options['count']
+        rng = np.random.default_rng(options['seed'])
+        ease = rng.choice([1.3, 1.6, 2.0, 2.5], size=count)
+        interval = rng.integers(0, 200, size=count)
+        repetitions = rng.integers(0, 10, size=count)
+        rating = rng.integers(1, 5, size=count)
+
+        now = timezone.now()
+        ratings = rating.tolist()
+
+        def make_cards():
+            # Свежие карточки на каждый прогон: apply_sm2 и apply_sm2_bulk меняют их на месте
+            return [
+                Card(ease_factor=float(e), interval=int(i), repetitions=int(r))
+                for e, i, r in zip(ease, interval, repetitions)
+            ]
+
+        def per_card(cards):
+            for card, r in zip(cards, ratings):
+                apply_sm2(card, r, commit=False, now=now)
+
+        def bulk(cards):
+            apply_sm2_bulk(cards, ratings, now=now)
+
+        def vectorized(cards):
+            sm2_schedule(ease, interval, repetitions, rating)
+
+        for name, func in (
+            ('apply_sm2 (per card)', per_card),
+            ('apply_sm2_bulk (instances)', bulk),
+            ('sm2_schedule (arrays)', vectorized),
+        ):
+            best = min(self._timeit(func, make_cards()) for _ in range(options['repeat']))
+            self.stdout.write(
+                f'{name:<28} {best * 1000:10.1f} ms   {count / best:14,.0f} cards/s'
+            )
+
+    @staticmethod
+    def _timeit(func, cards):
+        started = time.perf_counter()
+        func(cards)
+        return time.perf_counter() - started
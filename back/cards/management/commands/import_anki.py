@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from cards.anki import AnkiImporter
+from cards.importing import BATCH_SIZE, ImportFormatError
+from cards.models import Folder
+
+
+class Command(BaseCommand):
+    help = 'Импортирует коллекцию Anki (.apkg/.colpkg) с историей ответов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к архиву')
+        parser.add_argument('--user', type=int, required=True, help='id пользователя')
+        parser.add_argument('--folder', type=int, help='id папки, в которую положить колоды')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(id=options['user']).first()
+        if user is None:
+            raise CommandError(f'Пользователь {options["user"]} не найден')
+        folder = None
+        if options['folder']:
+            folder = Folder.objects.filter(id=options['folder'], user=user).first()
+            if folder is None:
+                raise CommandError(f'Папка {options["folder"]} не найдена')
+
+        importer = AnkiImporter(user, folder=folder, batch_size=min(max(options['batch_size'], 1), 5000))
+        try:
+            with open(options['path'], 'rb') as archive:
+                report = importer.run(archive)
+        except (OSError, ImportFormatError) as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано колод: {report.decks}, карточек: {report.cards}, ответов: {report.reviews}'
+        ))
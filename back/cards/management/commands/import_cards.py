@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from cards.importing import BATCH_SIZE, ImportFormatError, detect_format, import_cards, iter_rows
+from cards.models import Deck
+
+
+class Command(BaseCommand):
+    help = 'Импортирует карточки из CSV/TSV/JSON в колоду'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу')
+        parser.add_argument('--deck', type=int, help='id существующей колоды')
+        parser.add_argument('--user', type=int, help='id пользователя для новой колоды')
+        parser.add_argument('--deck-name', help='Название новой колоды (вместе с --user)')
+        parser.add_argument('--format', choices=['csv', 'tsv', 'json'], help='Формат (по умолчанию – по расширению)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['deck']:
+            try:
+                deck = Deck.objects.select_related('user').get(id=options['deck'])
+            except Deck.DoesNotExist:
+                raise CommandError(f'Колода {options["deck"]} не найдена')
+        elif options['user'] and options['deck_name']:
+            user = get_user_model().objects.filter(id=options['user']).first()
+            if user is None:
+                raise CommandError(f'Пользователь {options["user"]} не найден')
+            deck = Deck.objects.create(user=user, name=options['deck_name'])
+        else:
+            raise CommandError('Укажите --deck или --user вместе с --deck-name')
+
+        fmt = options['format'] or detect_format(options['path'])
+        batch_size = min(max(options['batch_size'], 1), 5000)
+
+        def progress(report):
+            self.stdout.write(f'  строк: {report.total_rows}, создано: {report.created}, ошибок: {report.failed}')
+
+        try:
+            with open(options['path'], 'rb') as stream:
+                report = import_cards(deck, iter_rows(stream, fmt), batch_size=batch_size, progress=progress)
+        except (OSError, ImportFormatError) as error:
+            raise CommandError(str(error))
+
+        for error in report.errors:
+            self.stderr.write(f'  строка {error["row"]}: {error["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Колода "{deck.name}" (id={deck.id}): создано {report.created} из {report.total_rows}, ошибок {report.failed}'
+        ))
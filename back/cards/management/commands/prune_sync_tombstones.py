@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cards.models import SyncTombstone
+from cards.sync import tombstone_ttl
+
+
+class Command(BaseCommand):
+    help = 'Удаляет надгробия старше SYNC_TOMBSTONE_DAYS: клиенты с более старым токеном всё равно получат полную выгрузку'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Срок хранения в днях вместо SYNC_TOMBSTONE_DAYS')
+
+    def handle(self, *args, **options):
+        ttl = timedelta(days=options['days']) if options['days'] is not None else tombstone_ttl()
+        deleted, _ = SyncTombstone.objects.filter(deleted_at__lt=timezone.now() - ttl).delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено надгробий: {deleted}'))
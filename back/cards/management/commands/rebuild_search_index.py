@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cards.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс карточек и колод'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Пересобрать только для пользователя с этим id')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        with transaction.atomic():
+            backend.rebuild(user=options['user'])
+        self.stdout.write(self.style.SUCCESS(f'Индекс пересобран ({type(backend).__name__})'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cards.counters import reconcile
+from cards.models import DashboardStats
+from cards.tagstats import rebuild_tag_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики карточек в колодах и папках, индекс тегов и счётчики дашборда'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Пересчитать только для пользователя с этим id')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            changed = reconcile(user=options['user'])
+            tags_changed = rebuild_tag_stats(user=options['user'])
+            # Строки счётчиков дашборда пересчитываются целиком при следующем чтении
+            dashboard_rows = DashboardStats.objects.all()
+            if options['user']:
+                dashboard_rows = dashboard_rows.filter(user_id=options['user'])
+            dashboard_rows.delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны, исправлено папок: {changed}, строк индекса тегов: {tags_changed}'
+        ))
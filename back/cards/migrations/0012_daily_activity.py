@@ -0,0 +1,35 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0011_rename_cards_card_next_re_ix_cards_card_next_re_da4ff1_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='День')),
+                ('reviews', models.IntegerField(default=0, verbose_name='Ответов')),
+                ('cards_studied', models.IntegerField(default=0, verbose_name='Различных карточек')),
+                ('cards_correct', models.IntegerField(default=0, verbose_name='Правильных ответов')),
+                ('sessions', models.IntegerField(default=0, verbose_name='Завершённых сессий')),
+                ('time_spent', models.IntegerField(default=0, verbose_name='Время (сек)')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Активность за день',
+                'verbose_name_plural': 'Активность по дням',
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='cards_dailyactivity_user_date_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:19
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_counters(apps, schema_editor):
+    Deck = apps.get_model('cards', 'Deck')
+    Folder = apps.get_model('cards', 'Folder')
+    decks = Deck.objects.annotate(
+        total=Count('cards'),
+        new=Count('cards', filter=Q(cards__repetitions=0)),
+        suspended=Count('cards', filter=Q(cards__is_suspended=True)),
+    ).order_by()
+    direct_cards = defaultdict(int)
+    direct_decks = defaultdict(int)
+    for deck in decks:
+        Deck.objects.filter(id=deck.id).update(
+            cards_count=deck.total,
+            new_cards_count=deck.new,
+            suspended_cards_count=deck.suspended,
+        )
+        if deck.folder_id:
+            direct_cards[deck.folder_id] += deck.total
+            direct_decks[deck.folder_id] += 1
+
+    parents = dict(Folder.objects.values_list('id', 'parent_id'))
+    subfolders = defaultdict(int)
+    subtree = defaultdict(int)
+    for folder_id, parent_id in parents.items():
+        if parent_id:
+            subfolders[parent_id] += 1
+        current, seen = folder_id, set()
+        while current and current not in seen:
+            seen.add(current)
+            subtree[current] += direct_cards[folder_id]
+            current = parents.get(current)
+    for folder_id in parents:
+        Folder.objects.filter(id=folder_id).update(
+            subfolders_count=subfolders[folder_id],
+            decks_count=direct_decks[folder_id],
+            cards_count=direct_cards[folder_id],
+            subtree_cards_count=subtree[folder_id],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0012_daily_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deck',
+            name='cards_count',
+            field=models.IntegerField(default=0, verbose_name='Карточек'),
+        ),
+        migrations.AddField(
+            model_name='deck',
+            name='new_cards_count',
+            field=models.IntegerField(default=0, verbose_name='Новых карточек'),
+        ),
+        migrations.AddField(
+            model_name='deck',
+            name='suspended_cards_count',
+            field=models.IntegerField(default=0, verbose_name='Приостановленных карточек'),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='cards_count',
+            field=models.IntegerField(default=0, verbose_name='Карточек в колодах папки'),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='decks_count',
+            field=models.IntegerField(default=0, verbose_name='Колод'),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='subfolders_count',
+            field=models.IntegerField(default=0, verbose_name='Подпапок'),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='subtree_cards_count',
+            field=models.IntegerField(default=0, verbose_name='Карточек с подпапками'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
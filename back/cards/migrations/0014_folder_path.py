@@ -0,0 +1,44 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:20
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    Folder = apps.get_model('cards', 'Folder')
+    parents = dict(Folder.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def build(folder_id, seen=()):
+        if folder_id not in paths:
+            parent_id = parents.get(folder_id)
+            if parent_id and parent_id not in seen:
+                prefix = build(parent_id, seen + (folder_id,))
+            else:
+                prefix = '/'
+            paths[folder_id] = f'{prefix}{folder_id}/'
+        return paths[folder_id]
+
+    for folder_id in parents:
+        path = build(folder_id)
+        Folder.objects.filter(id=folder_id).update(path=path, depth=path.count('/') - 2)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0013_deck_folder_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='folder',
+            name='depth',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Глубина'),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=500, verbose_name='Путь'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
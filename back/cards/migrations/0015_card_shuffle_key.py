@@ -0,0 +1,33 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:22
+
+import cards.models
+from django.db import migrations, models
+
+
+def randomize_shuffle_keys(apps, schema_editor):
+    # AddField заполнил все строки одним значением default – раздаём каждой свой ключ
+    if schema_editor.connection.vendor == 'postgresql':
+        expression = 'random()'
+    else:
+        expression = '(abs(random()) % 1000000007) / 1000000007.0'
+    schema_editor.execute(f'UPDATE cards_card SET shuffle_key = {expression}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0014_folder_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='shuffle_key',
+            field=models.FloatField(default=cards.models.random_shuffle_key, editable=False),
+        ),
+        migrations.RunPython(randomize_shuffle_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['deck', 'shuffle_key'], name='cards_card_deck_id_e24346_idx'),
+        ),
+    ]
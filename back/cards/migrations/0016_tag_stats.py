@@ -0,0 +1,65 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_tag_stats(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    Card = apps.get_model('cards', 'Card')
+    TagStat = apps.get_model('cards', 'TagStat')
+    content_type = ContentType.objects.filter(app_label='cards', model='card').first()
+    if content_type is None:
+        return
+    repetitions = dict(Card.objects.values_list('id', 'repetitions'))
+    owners = dict(Card.objects.values_list('id', 'deck__user_id'))
+    stats = {}
+    items = TaggedItem.objects.filter(content_type=content_type).values_list('object_id', 'tag_id', 'tag__name')
+    for card_id, tag_id, name in items.iterator():
+        if card_id not in owners:
+            continue
+        stat = stats.setdefault((owners[card_id], tag_id), [name, 0, 0, 0])
+        stat[1] += 1
+        stat[2] += repetitions[card_id] >= 3
+        stat[3] += repetitions[card_id]
+    TagStat.objects.bulk_create([
+        TagStat(
+            user_id=user_id, tag_id=tag_id, name=name,
+            cards_count=total, mastered_count=mastered, repetitions_sum=repetitions_sum,
+        )
+        for (user_id, tag_id), (name, total, mastered, repetitions_sum) in stats.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0015_card_shuffle_key'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Тег')),
+                ('cards_count', models.IntegerField(default=0, verbose_name='Карточек')),
+                ('mastered_count', models.IntegerField(default=0, verbose_name='Освоено')),
+                ('repetitions_sum', models.IntegerField(default=0, verbose_name='Сумма повторений')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_stats', to='taggit.tag')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Статистика тега',
+                'verbose_name_plural': 'Статистика тегов',
+                'indexes': [models.Index(fields=['user', '-cards_count'], name='cards_tagst_user_id_098277_idx'), models.Index(fields=['user', 'name'], name='cards_tagst_user_id_a04cd3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'tag'), name='unique_tag_stat_per_user')],
+            },
+        ),
+        migrations.RunPython(fill_tag_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations
+
+
+SQLITE_CREATE = [
+    """CREATE VIRTUAL TABLE cards_card_fts USING fts5(
+        owner, front, back, tags, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    """CREATE VIRTUAL TABLE cards_deck_fts USING fts5(
+        owner, name, description, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+]
+SQLITE_DROP = ['DROP TABLE IF EXISTS cards_card_fts', 'DROP TABLE IF EXISTS cards_deck_fts']
+
+POSTGRES_CREATE = [
+    """CREATE TABLE cards_card_search (
+        card_id bigint PRIMARY KEY REFERENCES cards_card (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        user_id bigint NOT NULL,
+        document tsvector NOT NULL
+    )""",
+    'CREATE INDEX cards_card_search_document ON cards_card_search USING gin (document)',
+    'CREATE INDEX cards_card_search_user ON cards_card_search (user_id)',
+    """CREATE TABLE cards_deck_search (
+        deck_id bigint PRIMARY KEY REFERENCES cards_deck (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        user_id bigint NOT NULL,
+        document tsvector NOT NULL
+    )""",
+    'CREATE INDEX cards_deck_search_document ON cards_deck_search USING gin (document)',
+    'CREATE INDEX cards_deck_search_user ON cards_deck_search (user_id)',
+]
+POSTGRES_DROP = ['DROP TABLE IF EXISTS cards_card_search', 'DROP TABLE IF EXISTS cards_deck_search']
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in ('sqlite', 'postgresql'):
+        return
+    for sql in SQLITE_CREATE if vendor == 'sqlite' else POSTGRES_CREATE:
+        schema_editor.execute(sql)
+    from cards.search import get_backend
+    get_backend().rebuild()
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in ('sqlite', 'postgresql'):
+        return
+    for sql in SQLITE_DROP if vendor == 'sqlite' else POSTGRES_DROP:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0016_tag_stats'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
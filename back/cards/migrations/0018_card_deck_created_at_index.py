@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0017_search_index'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['deck', 'created_at'], name='cards_card_deck_id_1cbcd2_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:36
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0018_card_deck_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cardreview',
+            name='reviewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0019_review_time_default'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('folder', 'Папка'), ('deck', 'Колода'), ('card', 'Карточка')], max_length=10, verbose_name='Тип объекта')),
+                ('object_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Удалён')),
+            ],
+            options={
+                'verbose_name': 'Удалённый объект',
+                'verbose_name_plural': 'Удалённые объекты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['deck', 'updated_at'], name='cards_card_deck_id_7fd479_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deck',
+            index=models.Index(fields=['user', 'updated_at'], name='cards_deck_user_id_28f90a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='folder',
+            index=models.Index(fields=['user', 'updated_at'], name='cards_folde_user_id_079418_idx'),
+        ),
+        migrations.AddField(
+            model_name='synctombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['user', 'deleted_at'], name='cards_synct_user_id_09bc6e_idx'),
+        ),
+    ]
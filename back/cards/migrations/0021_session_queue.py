@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0020_sync_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studysession',
+            name='queue',
+            field=models.BinaryField(default=bytes, verbose_name='Очередь карточек'),
+        ),
+        migrations.AddField(
+            model_name='studysession',
+            name='queue_position',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Выдано из очереди'),
+        ),
+    ]
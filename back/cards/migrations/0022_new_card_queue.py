@@ -0,0 +1,56 @@
+# Generated by Django 5.2.10 on 2026-10-18 06:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0021_session_queue'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyNewCards',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='День')),
+                ('introduced', models.IntegerField(default=0, verbose_name='Введено новых карточек')),
+            ],
+            options={
+                'verbose_name': 'Новые карточки за день',
+                'verbose_name_plural': 'Новые карточки по дням',
+            },
+        ),
+        migrations.AddField(
+            model_name='deck',
+            name='new_cards_per_day',
+            field=models.IntegerField(default=20, verbose_name='Новых карточек в день'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(condition=models.Q(('is_suspended', False), ('next_review__isnull', True)), fields=['deck', 'created_at', 'id'], name='cards_card_new_queue_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailynewcards',
+            name='deck',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_new_cards', to='cards.deck'),
+        ),
+        migrations.AddField(
+            model_name='dailynewcards',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_new_cards', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='dailynewcards',
+            index=models.Index(fields=['user', 'date'], name='cards_daily_user_id_978f16_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailynewcards',
+            constraint=models.UniqueConstraint(fields=('deck', 'date'), name='unique_daily_new_cards_per_deck'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_card_user(apps, schema_editor):
+    Card = apps.get_model('cards', 'Card')
+    Deck = apps.get_model('cards', 'Deck')
+    Card.objects.update(user_id=Subquery(Deck.objects.filter(id=OuterRef('deck_id')).values('user_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0022_new_card_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='user',
+            field=models.ForeignKey(
+                editable=False, null=True, on_delete=django.db.models.deletion.CASCADE,
+                related_name='cards', to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(fill_card_user, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='card',
+            name='user',
+            field=models.ForeignKey(
+                editable=False, on_delete=django.db.models.deletion.CASCADE,
+                related_name='cards', to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['user', 'repetitions'], name='cards_card_user_id_75e020_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(
+                condition=models.Q(('is_suspended', False), ('next_review__isnull', False)),
+                fields=['user', 'next_review', 'deck'],
+                name='cards_card_user_due_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,73 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def fill_review_fields(apps, schema_editor):
+    # Часовых поясов в профилях ещё нет (accounts.0004 добавляет пустые) – дни считаются по TIME_ZONE
+    CardReview = apps.get_model('cards', 'CardReview')
+    StudySession = apps.get_model('cards', 'StudySession')
+    sessions = StudySession.objects.filter(id=OuterRef('session_id'))
+    CardReview.objects.update(
+        user_id=Subquery(sessions.values('user_id')[:1]),
+        is_practice=Subquery(sessions.values('is_practice_mode')[:1]),
+        reviewed_on=TruncDate('reviewed_at', tzinfo=timezone.get_default_timezone()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0023_card_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cardreview',
+            name='user',
+            field=models.ForeignKey(
+                editable=False, null=True, on_delete=django.db.models.deletion.CASCADE,
+                related_name='card_reviews', to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name='cardreview',
+            name='is_practice',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Ответ в режиме практики'),
+        ),
+        migrations.AddField(
+            model_name='cardreview',
+            name='reviewed_on',
+            field=models.DateField(editable=False, null=True, verbose_name='День ответа'),
+        ),
+        migrations.RunPython(fill_review_fields, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cardreview',
+            name='user',
+            field=models.ForeignKey(
+                editable=False, on_delete=django.db.models.deletion.CASCADE,
+                related_name='card_reviews', to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name='cardreview',
+            name='reviewed_on',
+            field=models.DateField(editable=False, verbose_name='День ответа'),
+        ),
+        migrations.AddIndex(
+            model_name='cardreview',
+            index=models.Index(
+                condition=models.Q(('is_practice', False)),
+                fields=['user', 'reviewed_on', 'card'],
+                name='cards_review_user_day_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='cardreview',
+            index=models.Index(fields=['card', 'reviewed_at'], name='cards_review_card_time_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0024_review_analytics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['user', 'started_at'], name='cards_session_user_start_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0025_session_user_started_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cards_count', models.IntegerField(default=0, verbose_name='Карточек')),
+                ('learned_count', models.IntegerField(default=0, verbose_name='Изученных карточек')),
+                ('decks_count', models.IntegerField(default=0, verbose_name='Колод')),
+                ('due_count', models.IntegerField(default=0, verbose_name='К повторению до конца дня')),
+                ('due_until', models.DateTimeField(blank=True, null=True, verbose_name='Граница due_count')),
+                ('week_start', models.DateField(blank=True, null=True, verbose_name='Начало недели')),
+                ('week_cards', models.IntegerField(default=0, verbose_name='Различных карточек за неделю')),
+                ('week_sessions', models.IntegerField(default=0, verbose_name='Сессий за неделю')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Счётчики дашборда',
+                'verbose_name_plural': 'Счётчики дашборда',
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.10 on 2026-10-18 07:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cards', '0026_dashboard_stats'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='card',
+            name='cards_card_deck_id_7fd479_idx',
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='cards_card_user_sync_idx'),
+        ),
+    ]
@@ -1,8 +1,20 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Concat, Substr, TruncDate
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
 from django.conf import settings
 from taggit.managers import TaggableManager
 from django.utils import timezone
+from collections import defaultdict
 from datetime import timedelta
+import random
+
+from .days import user_timezone
+
+
+def random_shuffle_key():
+    return random.random()
 
 
 class Folder(models.Model):
@@ -23,6 +35,14 @@ class Folder(models.Model):
     color = models.CharField('Цвет', max_length=7, default='#6366f1')
     icon = models.CharField('Иконка', max_length=50, default='📁')
     description = models.TextField('Описание', blank=True)
+    # Материализованный путь из id от корня, включая саму папку: "/1/5/9/"
+    path = models.CharField('Путь', max_length=500, default='', db_index=True, editable=False)
+    depth = models.IntegerField('Глубина', default=0, editable=False)
+    # Денормализованные счётчики, поддерживаются cards/counters.py
+    subfolders_count = models.IntegerField('Подпапок', default=0)
+    decks_count = models.IntegerField('Колод', default=0)
+    cards_count = models.IntegerField('Карточек в колодах папки', default=0)
+    subtree_cards_count = models.IntegerField('Карточек с подпапками', default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -31,30 +51,79 @@ class Folder(models.Model):
         verbose_name = 'Папка'
         verbose_name_plural = 'Папки'
         unique_together = ['user', 'name', 'parent']
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+        ]
 
     def __str__(self):
         return self.get_full_path()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_parent_id = instance.__dict__.get('parent_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        moved = not self.path or getattr(self, '_saved_parent_id', None) != self.parent_id
+        super().save(*args, **kwargs)
+        if moved:
+            self._update_path()
+
+    def _update_path(self):
+        """Пересчитывает путь папки и одним UPDATE переносит на него всё поддерево."""
+        parent_path = '/'
+        if self.parent_id:
+            parent_path = Folder.objects.values_list('path', flat=True).get(id=self.parent_id)
+        path = f'{parent_path}{self.id}/'
+        depth = path.count('/') - 2
+        if path == self.path:
+            return
+        if self.path:
+            Folder.objects.filter(user_id=self.user_id, path__startswith=self.path).update(
+                path=Concat(Value(path), Substr('path', len(self.path) + 1)),
+                depth=F('depth') + (depth - self.depth),
+                updated_at=timezone.now(),
+            )
+        else:
+            Folder.objects.filter(id=self.id).update(path=path, depth=depth, updated_at=timezone.now())
+        self.path, self.depth = path, depth
+
+    @staticmethod
+    def parse_path(path):
+        return [int(i) for i in path.strip('/').split('/') if i]
+
+    def get_ancestor_ids(self, include_self=True):
+        """id предков от корня по материализованному пути"""
+        ids = self.parse_path(self.path)
+        return ids if include_self else ids[:-1]
+
+    def is_descendant_of(self, other, include_self=True):
+        return self.path.startswith(other.path) and (include_self or self.id != other.id)
+
+    def get_descendants(self, include_self=True):
+        """Все папки поддерева одним запросом по префиксу пути"""
+        queryset = Folder.objects.filter(user_id=self.user_id, path__startswith=self.path)
+        if not include_self:
+            queryset = queryset.exclude(id=self.id)
+        return queryset
+
     def get_full_path(self):
         """Полный путь: Родительская папка / Папка"""
-        if self.parent:
-            return f"{self.parent.get_full_path()} / {self.name}"
-        return self.name
+        return ' / '.join(crumb['name'] for crumb in self.get_breadcrumbs())
 
     def get_all_decks(self):
         """Получить все колоды из этой папки и подпапок"""
-        decks = list(self.decks.all())
-        for subfolder in self.subfolders.all():
-            decks.extend(subfolder.get_all_decks())
-        return decks
+        return list(Deck.objects.filter(
+            user_id=self.user_id, folder__path__startswith=self.path
+        ))
 
     def get_breadcrumbs(self):
         """Хлебные крошки для навигации"""
-        breadcrumbs = [{'id': self.id, 'name': self.name}]
-        current = self.parent
-        while current:
-            breadcrumbs.insert(0, {'id': current.id, 'name': current.name})
-            current = current.parent
+        ancestor_ids = self.get_ancestor_ids(include_self=False)
+        names = dict(Folder.objects.filter(id__in=ancestor_ids).values_list('id', 'name')) if ancestor_ids else {}
+        breadcrumbs = [{'id': i, 'name': names[i]} for i in ancestor_ids if i in names]
+        breadcrumbs.append({'id': self.id, 'name': self.name})
         return breadcrumbs
 
 
@@ -75,6 +144,11 @@ class Deck(models.Model):
     description = models.TextField('Описание', blank=True)
     color = models.CharField('Цвет', max_length=7, default='#3b82f6')
     is_public = models.BooleanField('Публичная', default=False)
+    # Денормализованные счётчики, поддерживаются cards/counters.py
+    cards_count = models.IntegerField('Карточек', default=0)
+    new_cards_count = models.IntegerField('Новых карточек', default=0)
+    suspended_cards_count = models.IntegerField('Приостановленных карточек', default=0)
+    new_cards_per_day = models.IntegerField('Новых карточек в день', default=20)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -82,10 +156,32 @@ class Deck(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Колода'
         verbose_name_plural = 'Колоды'
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counter_folder_id = instance.__dict__.get('folder_id')
+        return instance
+
+
+class CardQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # save() здесь не вызывается – владельца из колоды проставляем сами, одним запросом
+        objs = list(objs)
+        missing = {card.deck_id for card in objs if card.user_id is None}
+        if missing:
+            owners = dict(Deck.objects.filter(id__in=missing).values_list('id', 'user_id'))
+            for card in objs:
+                if card.user_id is None:
+                    card.user_id = owners.get(card.deck_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
 
 class Card(models.Model):
     CARD_TYPE_BASIC = 'basic'
@@ -96,6 +192,13 @@ class Card(models.Model):
     ]
 
     deck = models.ForeignKey(Deck, on_delete=models.CASCADE, related_name='cards')
+    # Владелец колоды, денормализован для индексов без JOIN с Deck; проставляется в save() и CardWriter
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='cards',
+        editable=False
+    )
     front = models.TextField('Вопрос')
     back = models.TextField('Ответ')
     image = models.ImageField('Изображение', upload_to='cards/images/', null=True, blank=True)
@@ -113,9 +216,13 @@ class Card(models.Model):
     last_reviewed = models.DateTimeField('Последнее повторение', null=True, blank=True)
     
     is_suspended = models.BooleanField('Приостановлена', default=False)
+    # Случайный ключ для выборки без ORDER BY RANDOM() (см. sampling.py)
+    shuffle_key = models.FloatField(default=random_shuffle_key, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CardQuerySet.as_manager()
+
     class Meta:
         ordering = ['next_review']
         verbose_name = 'Карточка'
@@ -123,11 +230,60 @@ class Card(models.Model):
         indexes = [
             models.Index(fields=['next_review']),
             models.Index(fields=['deck', 'next_review']),
+            models.Index(fields=['deck', 'shuffle_key']),
+            models.Index(fields=['deck', 'created_at']),
+            models.Index(fields=['user', 'repetitions']),
+            # Выдача изменений синхронизации: user = ... AND updated_at >= ... ORDER BY updated_at, id
+            models.Index(fields=['user', 'updated_at', 'id'], name='cards_card_user_sync_idx'),
+            # Очередь повторений пользователя: due_cards, счётчики дашборда, расписание.
+            # deck в индексе делает группировку расписания по колодам index-only
+            models.Index(
+                fields=['user', 'next_review', 'deck'],
+                condition=Q(next_review__isnull=False, is_suspended=False),
+                name='cards_card_user_due_idx',
+            ),
+            # Очередь новых карточек колоды (см. newcards.py)
+            models.Index(
+                fields=['deck', 'created_at', 'id'],
+                condition=Q(next_review__isnull=True, is_suspended=False),
+                name='cards_card_new_queue_idx',
+            ),
         ]
 
     def __str__(self):
         return f"{self.front[:50]}..."
 
+    def save(self, *args, **kwargs):
+        saved_deck_id = self._counter_state[0] if getattr(self, '_counter_state', None) else None
+        if self.deck_id is not None and (self.user_id is None or self.deck_id != saved_deck_id):
+            self.user_id = self.deck.user_id
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'user' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'user']
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._counter_state = instance.get_counter_state()
+        instance._tag_state = instance.__dict__.get('repetitions')
+        instance._due_state = instance.get_due_state()
+        return instance
+
+    def get_counter_state(self):
+        """(колода, новая, приостановлена) – то, что учитывают счётчики Deck и Folder."""
+        fields = self.__dict__
+        if not {'deck_id', 'repetitions', 'is_suspended'} <= fields.keys():
+            return None
+        return (fields['deck_id'], fields['repetitions'] == 0, fields['is_suspended'])
+
+    def get_due_state(self):
+        """(приостановлена, next_review) – то, от чего зависит due_count в DashboardStats."""
+        fields = self.__dict__
+        if not {'is_suspended', 'next_review'} <= fields.keys():
+            return None
+        return (fields['is_suspended'], fields['next_review'])
+
 
 class StudySession(models.Model):
     user = models.ForeignKey(
@@ -149,17 +305,39 @@ class StudySession(models.Model):
     points_earned = models.IntegerField('Заработано очков', default=0)
     is_practice_mode = models.BooleanField('Режим практики', default=False)
     is_reversed = models.BooleanField('Реверс (ответ → вопрос)', default=False)
+    # Очередь карточек учебной сессии: id подряд как int64, см. session_queue.py
+    queue = models.BinaryField('Очередь карточек', default=bytes, editable=False)
+    queue_position = models.IntegerField('Выдано из очереди', default=0, editable=False)
 
     class Meta:
         ordering = ['-started_at']
         verbose_name = 'Сессия обучения'
         verbose_name_plural = 'Сессии обучения'
+        indexes = [
+            # Сессии пользователя за период (dashboard) – диапазоном по started_at
+            models.Index(fields=['user', 'started_at'], name='cards_session_user_start_idx'),
+        ]
 
     def __str__(self):
         mode = "Практика" if self.is_practice_mode else "Обучение"
         return f"{self.user.username} - {mode} - {self.started_at}"
 
 
+class CardReviewQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # Как у карточек: save() не вызывается, поэтому недостающие user/is_practice/reviewed_on
+        # берём из сессий и профилей одним проходом
+        objs = list(objs)
+        missing = [review for review in objs if review.user_id is None]
+        if missing:
+            sessions = StudySession.objects.select_related('user__profile').in_bulk(
+                {review.session_id for review in missing}
+            )
+            for review in missing:
+                review.fill_from_session(sessions[review.session_id])
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class CardReview(models.Model):
     session = models.ForeignKey(
         StudySession, 
@@ -167,21 +345,527 @@ class CardReview(models.Model):
         related_name='reviews'
     )
     card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name='reviews')
+    # Денормализовано из сессии для статистики без JOIN: владелец, режим и день ответа
+    # в часовом поясе пользователя на момент ответа (по нему считаются дневные сводки)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='card_reviews',
+        editable=False,
+    )
+    is_practice = models.BooleanField('Ответ в режиме практики', default=False, editable=False)
+    reviewed_on = models.DateField('День ответа', editable=False)
     rating = models.IntegerField('Оценка (1-4)')
     time_taken = models.IntegerField('Время (сек)', default=0)
-    reviewed_at = models.DateTimeField(auto_now_add=True)
+    # default вместо auto_now_add: импорт истории (anki.py) задаёт время ответа сам
+    reviewed_at = models.DateTimeField(default=timezone.now)
     
     ease_factor_before = models.FloatField('EF до', default=2.5)
     interval_before = models.IntegerField('Интервал до', default=0)
     ease_factor_after = models.FloatField('EF после', default=2.5)
     interval_after = models.IntegerField('Интервал после', default=0)
 
+    objects = CardReviewQuerySet.as_manager()
+
     class Meta:
         ordering = ['-reviewed_at']
         verbose_name = 'Отзыв о карточке'
         verbose_name_plural = 'Отзывы о карточках'
+        indexes = [
+            # Ответы за период (dashboard, DailyActivity.rebuild): различные карточки
+            # считаются по индексу, без чтения таблицы
+            models.Index(
+                fields=['user', 'reviewed_on', 'card'],
+                condition=Q(is_practice=False),
+                name='cards_review_user_day_idx',
+            ),
+            # История карточки по времени и поиск уже принятых ответов в sync.apply_reviews
+            models.Index(fields=['card', 'reviewed_at'], name='cards_review_card_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.card.front[:30]} - Rating {self.rating}"
 
+    def save(self, *args, **kwargs):
+        if self.user_id is None:
+            self.fill_from_session(self.session)
+        super().save(*args, **kwargs)
+
+    def fill_from_session(self, session, tz=None):
+        """Проставляет владельца, режим и день ответа по сессии; tz – если уже известен."""
+        self.user_id = session.user_id
+        self.is_practice = session.is_practice_mode
+        if tz is None:
+            tz = user_timezone(session.user)
+        self.reviewed_on = timezone.localtime(self.reviewed_at, tz).date()
+
+
+class DailyActivity(models.Model):
+    """Дневная сводка активности пользователя (только режим обучения, без практики)"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_activity'
+    )
+    date = models.DateField('День')
+    reviews = models.IntegerField('Ответов', default=0)
+    cards_studied = models.IntegerField('Различных карточек', default=0)
+    cards_correct = models.IntegerField('Правильных ответов', default=0)
+    sessions = models.IntegerField('Завершённых сессий', default=0)
+    time_spent = models.IntegerField('Время (сек)', default=0)
+
+    COUNTERS = ['reviews', 'cards_studied', 'cards_correct', 'sessions', 'time_spent']
+
+    class Meta:
+        ordering = ['date']
+        verbose_name = 'Активность за день'
+        verbose_name_plural = 'Активность по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='cards_dailyactivity_user_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.date}"
+
+    @classmethod
+    def increment(cls, user, date, **counters):
+        """Атомарно прибавляет счётчики к строке за день, создавая её при необходимости."""
+        updates = {name: F(name) + value for name, value in counters.items() if value}
+        if not updates:
+            return
+        if cls.objects.filter(user=user, date=date).update(**updates):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user=user, date=date, **counters)
+        except IntegrityError:
+            cls.objects.filter(user=user, date=date).update(**updates)
+
+    @classmethod
+    def subtract_reviews(cls, reviews):
+        """
+        Снимает со сводки ответы, которые сейчас удалятся каскадом вместе с карточками:
+        после удаления сводка совпадает с тем, что посчитал бы rebuild. Дни, где не
+        осталось ни ответов, ни сессий, удаляются.
+        """
+        totals = reviews.filter(is_practice=False).values('user_id', 'reviewed_on').annotate(
+            reviews=Count('id'),
+            cards_studied=Count('card_id', distinct=True),
+            cards_correct=Count('id', filter=Q(rating__gte=3)),
+            time_spent=Sum('time_taken'),
+        ).order_by()
+        days = defaultdict(list)
+        for total in totals:
+            cls.objects.filter(user_id=total['user_id'], date=total['reviewed_on']).update(**{
+                name: F(name) - (total[name] or 0)
+                for name in ('reviews', 'cards_studied', 'cards_correct', 'time_spent')
+            })
+            days[total['user_id']].append(total['reviewed_on'])
+        for user_id, dates in days.items():
+            cls.objects.filter(user_id=user_id, date__in=dates, reviews__lte=0, sessions=0).delete()
+
+    @classmethod
+    def rebuild(cls, user=None, batch_size=1000):
+        """Пересобирает сводку из CardReview и StudySession (всех или одного пользователя)."""
+        from accounts.models import UserProfile
+
+        reviews = CardReview.objects.filter(is_practice=False)
+        sessions = StudySession.objects.filter(is_practice_mode=False, ended_at__isnull=False)
+        existing = cls.objects.all()
+        if user is not None:
+            reviews = reviews.filter(user=user)
+            sessions = sessions.filter(user=user)
+            existing = existing.filter(user=user)
+
+        rows = {}
+        # Дни ответов уже посчитаны при записи (reviewed_on) – группировка идёт по индексу
+        review_totals = reviews.values('user_id', 'reviewed_on').annotate(
+            reviews=Count('id'),
+            cards_studied=Count('card_id', distinct=True),
+            cards_correct=Count('id', filter=Q(rating__gte=3)),
+            time_spent=Sum('time_taken'),
+        ).order_by()
+        for total in review_totals.iterator():
+            rows[(total['user_id'], total['reviewed_on'])] = cls(
+                user_id=total['user_id'],
+                date=total['reviewed_on'],
+                reviews=total['reviews'],
+                cards_studied=total['cards_studied'],
+                cards_correct=total['cards_correct'],
+                time_spent=total['time_spent'] or 0,
+            )
+
+        # Дни сессий – в часовом поясе пользователя: по группировке на каждый пояс,
+        # пользователи без своего пояса – одной группой в поясе сервера
+        profiles = UserProfile.objects.exclude(timezone='')
+        if user is not None:
+            profiles = profiles.filter(user=user)
+        zones = defaultdict(list)
+        for profile in profiles.only('user_id', 'timezone'):
+            zones[profile.get_timezone()].append(profile.user_id)
+        groups = [(tz, sessions.filter(user_id__in=user_ids)) for tz, user_ids in zones.items()]
+        groups.append((timezone.get_default_timezone(), sessions.exclude(
+            user_id__in=[user_id for user_ids in zones.values() for user_id in user_ids]
+        )))
+        for tz, group in groups:
+            session_totals = group.annotate(
+                day=TruncDate('started_at', tzinfo=tz)
+            ).values('user_id', 'day').annotate(count=Count('id')).order_by()
+            for total in session_totals.iterator():
+                key = (total['user_id'], total['day'])
+                if key not in rows:
+                    rows[key] = cls(user_id=total['user_id'], date=total['day'])
+                rows[key].sessions = total['count']
+
+        with transaction.atomic():
+            existing.delete()
+            cls.objects.bulk_create(rows.values(), batch_size=batch_size)
+        return len(rows)
+
+
+class DailyNewCards(models.Model):
+    """Сколько новых карточек колоды введено в изучение за день – для дневных лимитов"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_new_cards'
+    )
+    deck = models.ForeignKey(Deck, on_delete=models.CASCADE, related_name='daily_new_cards')
+    date = models.DateField('День')
+    introduced = models.IntegerField('Введено новых карточек', default=0)
+
+    class Meta:
+        verbose_name = 'Новые карточки за день'
+        verbose_name_plural = 'Новые карточки по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['deck', 'date'], name='unique_daily_new_cards_per_deck'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.deck_id} - {self.date}: {self.introduced}"
+
+    @classmethod
+    def increment(cls, user, deck_id, date, introduced):
+        """Атомарно прибавляет введённые карточки к строке колоды за день, как DailyActivity.increment."""
+        if not introduced:
+            return
+        rows = cls.objects.filter(deck_id=deck_id, date=date)
+        if rows.update(introduced=F('introduced') + introduced):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user=user, deck_id=deck_id, date=date, introduced=introduced)
+        except IntegrityError:
+            rows.update(introduced=F('introduced') + introduced)
+
+
+class TagStat(models.Model):
+    """Индекс тегов пользователя: число карточек и освоенность, поддерживается cards/tagstats.py"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='tag_stats'
+    )
+    tag = models.ForeignKey('taggit.Tag', on_delete=models.CASCADE, related_name='user_stats')
+    name = models.CharField('Тег', max_length=100)
+    cards_count = models.IntegerField('Карточек', default=0)
+    mastered_count = models.IntegerField('Освоено', default=0)
+    repetitions_sum = models.IntegerField('Сумма повторений', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика тега'
+        verbose_name_plural = 'Статистика тегов'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tag'], name='unique_tag_stat_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-cards_count']),
+            models.Index(fields=['user', 'name']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} – {self.name} ({self.cards_count})"
+
+
+class DashboardStats(models.Model):
+    """Счётчики дашборда пользователя, поддерживаются инкрементально (см. dashboard.py)"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='dashboard_stats'
+    )
+    cards_count = models.IntegerField('Карточек', default=0)
+    learned_count = models.IntegerField('Изученных карточек', default=0)
+    decks_count = models.IntegerField('Колод', default=0)
+    due_count = models.IntegerField('К повторению до конца дня', default=0)
+    # Конец дня, для которого посчитан due_count; после него счётчик пересчитывается при чтении
+    due_until = models.DateTimeField('Граница due_count', null=True, blank=True)
+    week_start = models.DateField('Начало недели', null=True, blank=True)
+    week_cards = models.IntegerField('Различных карточек за неделю', default=0)
+    week_sessions = models.IntegerField('Сессий за неделю', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики дашборда'
+        verbose_name_plural = 'Счётчики дашборда'
+
+    def __str__(self):
+        return f"{self.user_id}: {self.cards_count} карточек"
+
+
+class SyncTombstone(models.Model):
+    """Отметка об удалении объекта для дельта-синхронизации (см. sync.py)"""
+    MODEL_FOLDER = 'folder'
+    MODEL_DECK = 'deck'
+    MODEL_CARD = 'card'
+    MODEL_CHOICES = [
+        (MODEL_FOLDER, 'Папка'),
+        (MODEL_DECK, 'Колода'),
+        (MODEL_CARD, 'Карточка'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='sync_tombstones'
+    )
+    model = models.CharField('Тип объекта', max_length=10, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField('ID объекта')
+    deleted_at = models.DateTimeField('Удалён', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Удалённый объект'
+        verbose_name_plural = 'Удалённые объекты'
+        indexes = [
+            models.Index(fields=['user', 'deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id}"
+
+
+# Поддержка денормализованных счётчиков Deck/Folder (см. counters.py)
+def _deleted_directly(origin, model):
+    """Удаление инициировано самим объектом этой модели или её QuerySet, а не каскадом."""
+    return isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+@receiver(post_save, sender=Card)
+def sync_card_counters(sender, instance, **kwargs):
+    from .counters import sync_cards
+    sync_cards([instance])
+
+
+# Поля, от которых зависят кэшированные пулы вариантов ответа (distractors.py)
+DISTRACTOR_FIELDS = {'deck', 'deck_id', 'front', 'back', 'is_suspended'}
+
+
+@receiver(post_save, sender=Card)
+@receiver(post_delete, sender=Card)
+def invalidate_distractors(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or DISTRACTOR_FIELDS & set(update_fields):
+        from .distractors import invalidate_deck
+        invalidate_deck(instance.deck_id)
+
+
+@receiver(post_delete, sender=Card)
+def drop_card_counters(sender, instance, origin=None, **kwargs):
+    # При удалении колоды её карточки учитывает обработчик колоды
+    if _deleted_directly(origin, Card):
+        from .counters import sync_cards
+        sync_cards([instance], deleted=True)
+
+
+@receiver(post_save, sender=Deck)
+def sync_deck_counters(sender, instance, created, **kwargs):
+    from .counters import adjust_folder_cards
+    old_folder_id = None if created else getattr(instance, '_counter_folder_id', None)
+    if old_folder_id != instance.folder_id:
+        cards_count = 0 if created else Deck.objects.values_list('cards_count', flat=True).get(id=instance.id)
+        if old_folder_id:
+            Folder.objects.filter(id=old_folder_id).update(decks_count=F('decks_count') - 1, updated_at=timezone.now())
+            adjust_folder_cards(old_folder_id, -cards_count)
+        if instance.folder_id:
+            Folder.objects.filter(id=instance.folder_id).update(decks_count=F('decks_count') + 1, updated_at=timezone.now())
+            adjust_folder_cards(instance.folder_id, cards_count)
+    instance._counter_folder_id = instance.folder_id
+
+
+@receiver(post_delete, sender=Deck)
+def drop_deck_counters(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(origin, Deck) and instance.folder_id:
+        from .counters import adjust_folder_cards
+        Folder.objects.filter(id=instance.folder_id).update(decks_count=F('decks_count') - 1, updated_at=timezone.now())
+        adjust_folder_cards(instance.folder_id, -instance.cards_count)
+
+
+@receiver(post_save, sender=Deck)
+def count_dashboard_deck(sender, instance, created, **kwargs):
+    if created:
+        from .dashboard import adjust_decks
+        adjust_decks(instance.user_id, decks=1)
+
+
+@receiver(pre_delete, sender=Deck)
+def drop_deck_activity(sender, instance, origin=None, **kwargs):
+    # При удалении пользователя его сводка удаляется каскадом
+    if _deleted_directly(origin, Deck) or _deleted_directly(origin, Folder):
+        DailyActivity.subtract_reviews(CardReview.objects.filter(card__deck_id=instance.id))
+
+
+@receiver(post_delete, sender=Deck)
+def drop_dashboard_deck(sender, instance, **kwargs):
+    # Карточки колоды удаляются каскадом и в sync_cards не попадают – снимаем их по счётчикам колоды,
+    # а неделю пересчитываем: вместе с карточками ушли их ответы
+    # (при удалении пользователя строка счётчиков удаляется вместе с ним)
+    from .dashboard import adjust_decks, expire_week
+    adjust_decks(
+        instance.user_id, decks=-1,
+        cards=-instance.cards_count, learned=instance.new_cards_count - instance.cards_count,
+    )
+    expire_week([instance.user_id])
+
+
+@receiver(post_save, sender=Folder)
+def sync_folder_counters(sender, instance, created, **kwargs):
+    from .counters import adjust_folder_subtree
+    old_parent_id = None if created else getattr(instance, '_saved_parent_id', None)
+    if old_parent_id != instance.parent_id:
+        subtree_cards = 0 if created else Folder.objects.values_list(
+            'subtree_cards_count', flat=True
+        ).get(id=instance.id)
+        adjust_folder_subtree(old_parent_id, -subtree_cards, subfolders=-1)
+        adjust_folder_subtree(instance.parent_id, subtree_cards, subfolders=1)
+    instance._saved_parent_id = instance.parent_id
+
+
+@receiver(post_delete, sender=Folder)
+def drop_folder_counters(sender, instance, origin=None, **kwargs):
+    # Вложенные папки удаляются каскадом вместе с родителем – учитываем только верхнюю
+    if _deleted_directly(origin, Folder) and instance.parent_id \
+            and Folder.objects.filter(id=instance.parent_id).exists():
+        from .counters import adjust_folder_subtree
+        adjust_folder_subtree(instance.parent_id, -instance.subtree_cards_count, subfolders=-1)
+
+
+# Поддержка индекса тегов TagStat (см. tagstats.py)
+@receiver(post_save, sender=Card)
+def sync_card_tag_stats(sender, instance, **kwargs):
+    from .tagstats import sync_card_tags
+    sync_card_tags([instance])
+
+
+@receiver(pre_delete, sender=Card)
+def drop_card_tag_stats(sender, instance, origin=None, **kwargs):
+    # До удаления, пока связи с тегами ещё на месте; карточки удаляемых колод учитывает обработчик колоды
+    if _deleted_directly(origin, Card):
+        from .tagstats import sync_card_tags
+        sync_card_tags([instance], deleted=True)
+
+
+@receiver(pre_delete, sender=Card)
+def drop_card_activity(sender, instance, origin=None, **kwargs):
+    # Ответы удаляются каскадом – снимаем их со сводки, пока они ещё есть; колоды – обработчик колоды
+    if _deleted_directly(origin, Card):
+        DailyActivity.subtract_reviews(CardReview.objects.filter(card_id=instance.id))
+
+
+@receiver(m2m_changed, sender=Card.tags.through)
+def sync_tag_set(sender, instance, action, pk_set=None, **kwargs):
+    if not isinstance(instance, Card):
+        return
+    if action == 'pre_clear':
+        instance._cleared_tag_ids = set(instance.tags.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        tag_ids = pk_set if action != 'post_clear' else getattr(instance, '_cleared_tag_ids', set())
+        from .tagstats import refresh_tag_stats
+        refresh_tag_stats(instance.user_id, tag_ids)
+
+
+@receiver(pre_delete, sender=Deck)
+def remember_deck_tags(sender, instance, origin=None, **kwargs):
+    # При удалении пользователя его TagStat удаляется каскадом
+    if _deleted_directly(origin, Deck) or _deleted_directly(origin, Folder):
+        from .tagstats import deck_tag_ids
+        instance._deleted_tag_ids = deck_tag_ids([instance.id])
+
+
+@receiver(post_delete, sender=Deck)
+def drop_deck_tag_stats(sender, instance, **kwargs):
+    tag_ids = getattr(instance, '_deleted_tag_ids', None)
+    if tag_ids:
+        from .tagstats import refresh_tag_stats
+        refresh_tag_stats(instance.user_id, tag_ids)
+
+
+# Поддержка полнотекстового индекса (см. search.py)
+SEARCH_CARD_FIELDS = {'front', 'back', 'deck', 'deck_id'}
+SEARCH_DECK_FIELDS = {'name', 'description'}
+
+
+@receiver(post_save, sender=Card)
+def index_card(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_CARD_FIELDS & set(update_fields):
+        from .search import get_backend
+        get_backend().index_cards([instance.id])
+
+
+@receiver(post_delete, sender=Card)
+def unindex_card(sender, instance, origin=None, **kwargs):
+    # Карточки удаляемых колод убирает из индекса обработчик колоды
+    if _deleted_directly(origin, Card):
+        from .search import get_backend
+        get_backend().remove_cards([instance.id])
+
+
+@receiver(m2m_changed, sender=Card.tags.through)
+def index_card_tags(sender, instance, action, **kwargs):
+    if isinstance(instance, Card) and action in ('post_add', 'post_remove', 'post_clear'):
+        from .search import get_backend
+        get_backend().index_cards([instance.id])
+
+
+@receiver(post_save, sender=Deck)
+def index_deck(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_DECK_FIELDS & set(update_fields):
+        from .search import get_backend
+        get_backend().index_decks([instance.id])
+
+
+@receiver(pre_delete, sender=Deck)
+def unindex_deck(sender, instance, **kwargs):
+    from .search import get_backend
+    backend = get_backend()
+    backend.remove_deck_cards(instance.id)
+    backend.remove_decks([instance.id])
+
+
+# Надгробия для дельта-синхронизации (см. sync.py). Записываются только для объектов,
+# удалённых напрямую: карточки удалённой колоды клиент убирает сам, а при удалении
+# пользователя его надгробия не нужны.
+@receiver(post_delete, sender=Card)
+def bury_card(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(origin, Card):
+        SyncTombstone.objects.create(user_id=instance.user_id, model=SyncTombstone.MODEL_CARD, object_id=instance.id)
+
+
+@receiver(post_delete, sender=Deck)
+def bury_deck(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(origin, Deck):
+        SyncTombstone.objects.create(user_id=instance.user_id, model=SyncTombstone.MODEL_DECK, object_id=instance.id)
+
+
+@receiver(pre_delete, sender=Folder)
+def touch_folder_decks(sender, instance, origin=None, **kwargs):
+    # Колоды удаляемой папки переезжают в корень через SET_NULL без save() – отмечаем их изменёнными
+    if _deleted_directly(origin, Folder):
+        Deck.objects.filter(folder_id=instance.id).update(updated_at=timezone.now())
+
 
+@receiver(post_delete, sender=Folder)
+def bury_folder(sender, instance, origin=None, **kwargs):
+    # Вложенные папки удаляются каскадом с тем же origin – надгробие получает каждая
+    if _deleted_directly(origin, Folder):
+        SyncTombstone.objects.create(user_id=instance.user_id, model=SyncTombstone.MODEL_FOLDER, object_id=instance.id)
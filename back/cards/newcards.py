@@ -0,0 +1,83 @@
+"""
+Очередь новых карточек с дневными лимитами.
+
+Новая карточка – без next_review (ещё ни разу не отвечена в режиме обучения).
+Новые карточки колоды выбираются по частичному индексу cards_card_new_queue_idx
+(deck, created_at, id) WHERE next_review IS NULL AND NOT is_suspended – в порядке
+добавления, запросом с LIMIT на колоду, поэтому стоимость не зависит от того,
+сколько непросмотренных карточек лежит в колоде.
+
+Лимиты: Deck.new_cards_per_day на колоду и UserProfile.new_cards_per_day на все
+колоды пользователя. Сколько уже введено сегодня – читается из DailyNewCards
+(одна строка на колоду и день), которую пополняют пути ответа на карточки
+через record_introduced.
+"""
+from collections import Counter
+
+from django.db.models import Sum
+
+from accounts.models import UserProfile
+
+from .days import local_today, user_timezone
+from .models import Card, DailyNewCards, Deck
+
+DEFAULT_USER_LIMIT = 50
+
+
+def user_limit(user):
+    limit = UserProfile.objects.filter(user=user).values_list('new_cards_per_day', flat=True).first()
+    return DEFAULT_USER_LIMIT if limit is None else limit
+
+
+def introduced_today(user, today=None):
+    """{id колоды: введено сегодня} – одна выборка по индексу (user, date)."""
+    today = today or local_today(user_timezone(user))
+    return dict(
+        DailyNewCards.objects.filter(user=user, date=today).values_list('deck_id', 'introduced')
+    )
+
+
+def new_card_ids(user, decks=None, limit=None, today=None):
+    """
+    id новых карточек, которые можно ввести сейчас: по колодам области decks
+    (QuerySet, по умолчанию все колоды пользователя) в порядке их создания,
+    с учётом дневных лимитов колоды и пользователя; limit дополнительно
+    ограничивает общее число (например, размер сессии).
+    """
+    introduced = introduced_today(user, today)
+    allowance = user_limit(user) - sum(introduced.values())
+    if limit is not None:
+        allowance = min(allowance, limit)
+    if allowance <= 0:
+        return []
+    scope = Deck.objects.filter(user=user, new_cards_count__gt=0)
+    if decks is not None:
+        scope = scope.filter(id__in=decks.values('id'))
+    result = []
+    for deck_id, deck_limit in scope.order_by('created_at', 'id').values_list('id', 'new_cards_per_day'):
+        count = min(deck_limit - introduced.get(deck_id, 0), allowance - len(result))
+        if count <= 0:
+            continue
+        result.extend(
+            Card.objects.filter(deck_id=deck_id, next_review__isnull=True, is_suspended=False)
+            .order_by('created_at', 'id').values_list('id', flat=True)[:count]
+        )
+        if len(result) >= allowance:
+            break
+    return result
+
+
+def record_introduced(user, cards, day=None):
+    """Учитывает карточки, впервые отвеченные в режиме обучения (до применения SM-2 у них не было next_review)."""
+    per_deck = Counter(card.deck_id for card in cards)
+    day = day or local_today(user_timezone(user))
+    for deck_id, count in per_deck.items():
+        DailyNewCards.increment(user, deck_id, day, count)
+
+
+def limits_summary(user, today=None):
+    """Лимит и сколько введено сегодня – для ответа API."""
+    today = today or local_today(user_timezone(user))
+    introduced = DailyNewCards.objects.filter(user=user, date=today).aggregate(total=Sum('introduced'))['total']
+    limit = user_limit(user)
+    return {'limit': limit, 'introduced_today': introduced or 0, 'remaining': max(limit - (introduced or 0), 0)}
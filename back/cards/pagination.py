@@ -0,0 +1,176 @@
+"""
+Keyset-пагинация (по курсору) для списков карточек.
+
+Страница выбирается условием по ключу сортировки (поле, id) последней/первой
+записи предыдущей страницы, поэтому её стоимость не зависит от глубины: нет ни
+OFFSET, ни COUNT(*). Курсор непрозрачен для клиента – это base64 от JSON
+с ключом и направлением. Число записей отдаётся только по ?with_count=1:
+у представления можно определить approximate_count(queryset), иначе считается
+не дальше COUNT_LIMIT.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+    count_query_param = 'with_count'
+    page_size = 50
+    max_page_size = 200
+    COUNT_LIMIT = 10000
+    # Поля сортировки с индексами (deck, поле); вторым ключом всегда идёт id в том же направлении
+    ordering_fields = ('next_review', 'created_at')
+    default_ordering = 'next_review'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, view)
+        self.model_field = queryset.model._meta.get_field(self.field)
+        cursor = self.decode_cursor(request)
+        self.count = self.get_count(queryset, request, view)
+
+        backwards = bool(cursor and cursor['back'])
+        rows = self._fetch(queryset, cursor and cursor['key'], backwards, self.page_size + 1)
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response['count'] = self.count
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_ordering(self, request, view):
+        ordering = request.query_params.get(self.ordering_query_param) \
+            or getattr(view, 'keyset_ordering', self.default_ordering)
+        field = ordering.lstrip('-')
+        if field not in self.ordering_fields:
+            ordering = field = self.default_ordering
+        return field, ordering.startswith('-')
+
+    def get_count(self, queryset, request, view):
+        if request.query_params.get(self.count_query_param) not in ('1', 'true'):
+            return None
+        approximate = getattr(view, 'approximate_count', None)
+        count = approximate(queryset) if approximate else None
+        if count is None:
+            count = queryset.order_by()[:self.COUNT_LIMIT].count()
+        return count
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], back=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], back=True)
+
+    # Курсор
+
+    def _link(self, obj, back):
+        value = getattr(obj, self.field)
+        key = [value.isoformat() if hasattr(value, 'isoformat') else value, obj.pk]
+        raw = json.dumps({'k': key, 'b': int(back), 'o': self.field}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+        url = self.request.build_absolute_uri()
+        return replace_query_param(remove_query_param(url, self.count_query_param), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            value, pk = data['k']
+            if data['o'] != self.field:
+                raise ValueError('cursor was issued for another ordering')
+            value = None if value is None else self.model_field.to_python(value)
+            return {'key': (value, int(pk)), 'back': bool(data['b'])}
+        except (TypeError, ValueError, KeyError, binascii.Error, ValidationError):
+            raise NotFound('Invalid cursor')
+
+    # Выборка страницы
+
+    def _fetch(self, queryset, key, reverse, limit):
+        """
+        До limit записей строго после key в порядке обхода (reverse – обратном).
+        У nullable-поля NULL и значения выбираются отдельными запросами, каждый из
+        которых идёт по индексу от своей границы, без OR в условии.
+        """
+        descending = self.descending != reverse
+        order = [f'-{self.field}' if descending else self.field, '-pk' if descending else 'pk']
+        pk_after = Q(pk__lt=key[1]) if key and descending else Q(pk__gt=key[1]) if key else Q()
+        if not self.model_field.null:
+            queryset = queryset.order_by(*order)
+            if key:
+                queryset = queryset.filter(self._after_value(key[0], pk_after, descending))
+            return list(queryset[:limit])
+
+        # Где СУБД ставит NULL при таком направлении: в конце обхода или в начале
+        nulls_last = connections[queryset.db].features.nulls_order_largest != descending
+        nulls, values = Q(**{f'{self.field}__isnull': True}), Q(**{f'{self.field}__isnull': False})
+        segments = [(values, False), (nulls, True)] if nulls_last else [(nulls, True), (values, False)]
+        rows, started = [], key is None
+        for condition, is_null in segments:
+            segment = queryset.filter(condition).order_by(*order)
+            if not started:
+                if (key[0] is None) != is_null:
+                    continue
+                started = True
+                if is_null:
+                    segment = segment.filter(pk_after)
+                else:
+                    segment = segment.filter(self._after_value(key[0], pk_after, descending))
+            rows.extend(segment[:limit - len(rows)])
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def _after_value(self, value, pk_after, descending):
+        """(поле, id) строго после (value, pk); ведущая граница поле >= value позволяет идти по индексу."""
+        bound, strict = ('lte', 'lt') if descending else ('gte', 'gt')
+        return Q(**{f'{self.field}__{bound}': value}) & (Q(**{f'{self.field}__{strict}': value}) | pk_after)
@@ -0,0 +1,52 @@
+"""
+Случайная выборка карточек без ORDER BY RANDOM().
+
+У каждой карточки есть случайный shuffle_key из [0, 1) и индекс (deck, shuffle_key).
+Выборка делает несколько проб: случайная точка на оси ключей и короткое чтение
+по индексу вперёд. Стоимость зависит от limit, а не от размера колоды.
+"""
+import math
+import random
+
+MAX_PROBES = 4
+
+
+def sample_cards(queryset, limit, seed=None):
+    """
+    limit случайных карточек из queryset. С одинаковым seed результат воспроизводим,
+    пока не меняется содержимое колоды.
+    """
+    if limit <= 0:
+        return []
+    rng = random.Random(seed)
+    probes = min(limit, MAX_PROBES)
+    per_probe = math.ceil(limit / probes)
+    queryset = queryset.order_by('shuffle_key', 'id')
+
+    picked = {}
+    exhausted = False
+    for _ in range(probes):
+        pivot = rng.random()
+        chunk = list(queryset.filter(shuffle_key__gte=pivot)[:per_probe])
+        if len(chunk) < per_probe:
+            # Дошли до конца оси – продолжаем с начала
+            chunk += list(queryset.filter(shuffle_key__lt=pivot)[:per_probe - len(chunk)])
+        for card in chunk:
+            picked.setdefault(card.id, card)
+        if len(chunk) < per_probe:
+            # Вся выборка меньше одной пробы – прочитали её целиком
+            exhausted = True
+            break
+        if len(picked) >= limit:
+            break
+
+    if len(picked) < limit and not exhausted:
+        # Пробы пересеклись или колода меньше limit – добираем недостающие
+        picked.update(
+            (card.id, card)
+            for card in queryset.exclude(id__in=list(picked))[:limit - len(picked)]
+        )
+
+    cards = sorted(picked.values(), key=lambda card: (card.shuffle_key, card.id))
+    rng.shuffle(cards)
+    return cards[:limit]
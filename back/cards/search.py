@@ -0,0 +1,298 @@
+"""
+Полнотекстовый поиск по карточкам и колодам.
+
+Индекс лежит в отдельных таблицах, которые создаёт миграция 0017_search_index:
+на SQLite – виртуальные таблицы FTS5, на Postgres – tsvector с GIN-индексом.
+Оба бэкенда реализуют общий интерфейс SearchBackend: обновление индекса по id
+(index_cards/index_decks/remove_cards/remove_decks), полная пересборка (rebuild)
+и фильтрация QuerySet с ранжированием (search_cards/search_decks).
+Каждое слово запроса ищется как префикс, все слова должны совпасть.
+
+Одиночные изменения приходят через сигналы (см. конец models.py), пакетные пути
+вызывают index_cards сами. Полная пересборка: python manage.py rebuild_search_index.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+MAX_QUERY_TERMS = 10
+
+# Текст тегов карточки одной строкой – общая часть SQL для обоих бэкендов
+_CARD_TAGS_SQL = """
+    SELECT {aggregate}
+    FROM taggit_taggeditem ti
+    JOIN taggit_tag t ON t.id = ti.tag_id
+    WHERE ti.object_id = c.id AND ti.content_type_id = (
+        SELECT id FROM django_content_type WHERE app_label = 'cards' AND model = 'card'
+    )
+"""
+
+
+def parse_query(query):
+    """Слова запроса в нижнем регистре; пунктуация и операторы движков отбрасываются."""
+    return re.findall(r'\w+', (query or '').lower())[:MAX_QUERY_TERMS]
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+class SearchBackend:
+    """Общий интерфейс; подклассы реализуют индекс для конкретной СУБД."""
+
+    def index_cards(self, card_ids):
+        raise NotImplementedError
+
+    def remove_cards(self, card_ids):
+        raise NotImplementedError
+
+    def remove_deck_cards(self, deck_id):
+        raise NotImplementedError
+
+    def index_decks(self, deck_ids):
+        raise NotImplementedError
+
+    def remove_decks(self, deck_ids):
+        raise NotImplementedError
+
+    def rebuild(self, user=None):
+        """Пересобирает индекс (весь или одного пользователя)."""
+        raise NotImplementedError
+
+    def search_cards(self, queryset, query, user):
+        """Карточки queryset, подходящие под запрос, от самых релевантных."""
+        raise NotImplementedError
+
+    def search_decks(self, queryset, query, user):
+        raise NotImplementedError
+
+    def _execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+
+class SqliteSearchBackend(SearchBackend):
+    """FTS5. Владелец хранится токеном u<id> в отдельной колонке, чтобы фильтр по нему шёл через индекс."""
+
+    # Веса bm25 по колонкам (owner, front, back, tags) и (owner, name, description)
+    CARD_WEIGHTS = '0, 10.0, 5.0, 2.0'
+    DECK_WEIGHTS = '0, 10.0, 3.0'
+
+    def _card_rows_sql(self, where):
+        tags = _CARD_TAGS_SQL.format(aggregate="group_concat(t.name, ' ')")
+        return f"""
+            INSERT INTO cards_card_fts (rowid, owner, front, back, tags)
+            SELECT c.id, 'u' || d.user_id, c.front, c.back, coalesce(({tags}), '')
+            FROM cards_card c JOIN cards_deck d ON d.id = c.deck_id
+            WHERE {where}
+        """
+
+    def _deck_rows_sql(self, where):
+        return f"""
+            INSERT INTO cards_deck_fts (rowid, owner, name, description)
+            SELECT d.id, 'u' || d.user_id, d.name, d.description
+            FROM cards_deck d
+            WHERE {where}
+        """
+
+    def index_cards(self, card_ids):
+        card_ids = list(card_ids)
+        if card_ids:
+            self.remove_cards(card_ids)
+            self._execute(self._card_rows_sql(f'c.id IN ({_placeholders(card_ids)})'), card_ids)
+
+    def remove_cards(self, card_ids):
+        card_ids = list(card_ids)
+        if card_ids:
+            self._execute(f'DELETE FROM cards_card_fts WHERE rowid IN ({_placeholders(card_ids)})', card_ids)
+
+    def remove_deck_cards(self, deck_id):
+        self._execute(
+            'DELETE FROM cards_card_fts WHERE rowid IN (SELECT id FROM cards_card WHERE deck_id = %s)',
+            [deck_id],
+        )
+
+    def index_decks(self, deck_ids):
+        deck_ids = list(deck_ids)
+        if deck_ids:
+            self.remove_decks(deck_ids)
+            self._execute(self._deck_rows_sql(f'd.id IN ({_placeholders(deck_ids)})'), deck_ids)
+
+    def remove_decks(self, deck_ids):
+        deck_ids = list(deck_ids)
+        if deck_ids:
+            self._execute(f'DELETE FROM cards_deck_fts WHERE rowid IN ({_placeholders(deck_ids)})', deck_ids)
+
+    def rebuild(self, user=None):
+        if user is None:
+            self._execute('DELETE FROM cards_card_fts')
+            self._execute('DELETE FROM cards_deck_fts')
+            self._execute(self._card_rows_sql('1'))
+            self._execute(self._deck_rows_sql('1'))
+            return
+        owner = self._owner(user)
+        self._execute('DELETE FROM cards_card_fts WHERE cards_card_fts MATCH %s', [f'owner:{owner}'])
+        self._execute('DELETE FROM cards_deck_fts WHERE cards_deck_fts MATCH %s', [f'owner:{owner}'])
+        self._execute(self._card_rows_sql('d.user_id = %s'), [self._user_id(user)])
+        self._execute(self._deck_rows_sql('d.user_id = %s'), [self._user_id(user)])
+
+    def search_cards(self, queryset, query, user):
+        return self._search(
+            queryset, query, user, 'cards_card_fts', 'cards_card', 'front back tags', self.CARD_WEIGHTS
+        )
+
+    def search_decks(self, queryset, query, user):
+        return self._search(
+            queryset, query, user, 'cards_deck_fts', 'cards_deck', 'name description', self.DECK_WEIGHTS
+        )
+
+    def _search(self, queryset, query, user, fts_table, table, columns, weights):
+        terms = parse_query(query)
+        if not terms:
+            return queryset.none()
+        words = ' AND '.join(f'"{term}"*' for term in terms)
+        match = f'owner:{self._owner(user)} AND {{{columns}}}: ({words})'
+        return queryset.extra(
+            tables=[fts_table],
+            where=[f'{fts_table}.rowid = {table}.id', f'{fts_table} MATCH %s'],
+            params=[match],
+            select={'search_rank': f'bm25({fts_table}, {weights})'},
+            order_by=['search_rank'],
+        )
+
+    @staticmethod
+    def _user_id(user):
+        return getattr(user, 'pk', user)
+
+    def _owner(self, user):
+        return f'u{self._user_id(user)}'
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector с весами A/B/C и GIN-индексом; конфигурация 'simple' – без стемминга, для любых языков."""
+
+    def _card_rows_sql(self, where):
+        tags = _CARD_TAGS_SQL.format(aggregate="string_agg(t.name, ' ')")
+        return f"""
+            INSERT INTO cards_card_search (card_id, user_id, document)
+            SELECT c.id, d.user_id,
+                setweight(to_tsvector('simple', c.front), 'A')
+                || setweight(to_tsvector('simple', c.back), 'B')
+                || setweight(to_tsvector('simple', coalesce(({tags}), '')), 'C')
+            FROM cards_card c JOIN cards_deck d ON d.id = c.deck_id
+            WHERE {where}
+            ON CONFLICT (card_id) DO UPDATE SET user_id = EXCLUDED.user_id, document = EXCLUDED.document
+        """
+
+    def _deck_rows_sql(self, where):
+        return f"""
+            INSERT INTO cards_deck_search (deck_id, user_id, document)
+            SELECT d.id, d.user_id,
+                setweight(to_tsvector('simple', d.name), 'A')
+                || setweight(to_tsvector('simple', d.description), 'B')
+            FROM cards_deck d
+            WHERE {where}
+            ON CONFLICT (deck_id) DO UPDATE SET user_id = EXCLUDED.user_id, document = EXCLUDED.document
+        """
+
+    def index_cards(self, card_ids):
+        card_ids = list(card_ids)
+        if card_ids:
+            self._execute(self._card_rows_sql('c.id = ANY(%s)'), [card_ids])
+
+    def remove_cards(self, card_ids):
+        card_ids = list(card_ids)
+        if card_ids:
+            self._execute('DELETE FROM cards_card_search WHERE card_id = ANY(%s)', [card_ids])
+
+    def remove_deck_cards(self, deck_id):
+        # Строки индекса удаляются каскадом по внешнему ключу на cards_card
+        pass
+
+    def index_decks(self, deck_ids):
+        deck_ids = list(deck_ids)
+        if deck_ids:
+            self._execute(self._deck_rows_sql('d.id = ANY(%s)'), [deck_ids])
+
+    def remove_decks(self, deck_ids):
+        deck_ids = list(deck_ids)
+        if deck_ids:
+            self._execute('DELETE FROM cards_deck_search WHERE deck_id = ANY(%s)', [deck_ids])
+
+    def rebuild(self, user=None):
+        if user is None:
+            self._execute('TRUNCATE cards_card_search, cards_deck_search')
+            self._execute(self._card_rows_sql('TRUE'))
+            self._execute(self._deck_rows_sql('TRUE'))
+            return
+        user_id = getattr(user, 'pk', user)
+        self._execute('DELETE FROM cards_card_search WHERE user_id = %s', [user_id])
+        self._execute('DELETE FROM cards_deck_search WHERE user_id = %s', [user_id])
+        self._execute(self._card_rows_sql('d.user_id = %s'), [user_id])
+        self._execute(self._deck_rows_sql('d.user_id = %s'), [user_id])
+
+    def search_cards(self, queryset, query, user):
+        return self._search(queryset, query, user, 'cards_card_search', 'card_id', 'cards_card')
+
+    def search_decks(self, queryset, query, user):
+        return self._search(queryset, query, user, 'cards_deck_search', 'deck_id', 'cards_deck')
+
+    def _search(self, queryset, query, user, search_table, key, table):
+        terms = parse_query(query)
+        if not terms:
+            return queryset.none()
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.extra(
+            tables=[search_table],
+            where=[
+                f'{search_table}.{key} = {table}.id',
+                f'{search_table}.user_id = %s',
+                f"{search_table}.document @@ to_tsquery('simple', %s)",
+            ],
+            params=[getattr(user, 'pk', user), tsquery],
+            select={'search_rank': f"ts_rank({search_table}.document, to_tsquery('simple', %s))"},
+            select_params=[tsquery],
+            order_by=['-search_rank'],
+        )
+
+
+class IcontainsSearchBackend(SearchBackend):
+    """Запасной вариант для прочих СУБД: поиск подстрокой без индекса, как было раньше."""
+
+    def index_cards(self, card_ids):
+        pass
+
+    def remove_cards(self, card_ids):
+        pass
+
+    def remove_deck_cards(self, deck_id):
+        pass
+
+    def index_decks(self, deck_ids):
+        pass
+
+    def remove_decks(self, deck_ids):
+        pass
+
+    def rebuild(self, user=None):
+        pass
+
+    def search_cards(self, queryset, query, user):
+        return queryset.filter(
+            Q(front__icontains=query) | Q(back__icontains=query) | Q(tags__name__icontains=query)
+        ).distinct()
+
+    def search_decks(self, queryset, query, user):
+        return queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+
+
+_BACKENDS = {
+    'sqlite': SqliteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend():
+    """Бэкенд поиска для СУБД основного подключения."""
+    return _BACKENDS.get(connection.vendor, IcontainsSearchBackend)()
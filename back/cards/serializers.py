@@ -23,35 +23,53 @@ class CardSerializer(serializers.ModelSerializer):
 
 
 class FolderSerializer(serializers.ModelSerializer):
-    subfolders_count = serializers.SerializerMethodField()
-    decks_count = serializers.SerializerMethodField()
-    total_cards = serializers.SerializerMethodField()
+    total_cards = serializers.IntegerField(source='cards_count', read_only=True)
     breadcrumbs = serializers.SerializerMethodField()
     
     class Meta:
         model = Folder
         fields = [
             'id', 'name', 'parent', 'color', 'icon', 'description',
-            'subfolders_count', 'decks_count', 'total_cards', 'breadcrumbs',
+            'subfolders_count', 'decks_count', 'total_cards', 'subtree_cards_count',
+            'breadcrumbs', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'subfolders_count', 'decks_count', 'subtree_cards_count',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
-    
-    def get_subfolders_count(self, obj):
-        return obj.subfolders.count()
-    
-    def get_decks_count(self, obj):
-        return obj.decks.count()
-    
-    def get_total_cards(self, obj):
-        return sum(deck.cards.count() for deck in obj.decks.all())
     
     def get_breadcrumbs(self, obj):
         return obj.get_breadcrumbs()
+    
+    def validate_parent(self, value):
+        if value is None:
+            return value
+        request = self.context.get('request')
+        if request is not None and value.user_id != request.user.id:
+            raise serializers.ValidationError('Папка не найдена')
+        if self.instance is not None and value.is_descendant_of(self.instance):
+            raise serializers.ValidationError('Нельзя переместить папку в саму себя или в дочернюю')
+        return value
+
+
+class FolderSyncSerializer(serializers.ModelSerializer):
+    """Папка для дельта-синхронизации: без хлебных крошек, клиент строит дерево сам по parent."""
+    
+    class Meta:
+        model = Folder
+        fields = [
+            'id', 'name', 'parent', 'color', 'icon', 'description',
+            'subfolders_count', 'decks_count', 'cards_count', 'subtree_cards_count',
+            'created_at', 'updated_at'
+        ]
 
 
 class FolderTreeSerializer(serializers.ModelSerializer):
-    """Рекурсивный сериализатор для дерева папок"""
+    """
+    Рекурсивный сериализатор для дерева папок.
+    Если в context переданы заранее загруженные children/decks (см. FolderViewSet.tree),
+    дерево собирается в памяти без запросов на каждый узел.
+    """
     subfolders = serializers.SerializerMethodField()
     decks = serializers.SerializerMethodField()
     
@@ -59,33 +77,36 @@ class FolderTreeSerializer(serializers.ModelSerializer):
         model = Folder
         fields = [
             'id', 'name', 'color', 'icon', 'description',
+            'subfolders_count', 'decks_count', 'subtree_cards_count',
             'subfolders', 'decks', 'created_at'
         ]
     
     def get_subfolders(self, obj):
-        subfolders = obj.subfolders.all()
-        return FolderTreeSerializer(subfolders, many=True).data
+        children = self.context.get('children')
+        subfolders = obj.subfolders.all() if children is None else children.get(obj.id, [])
+        return FolderTreeSerializer(subfolders, many=True, context=self.context).data
     
     def get_decks(self, obj):
-        from .serializers import DeckSerializer
-        decks = obj.decks.all()
+        decks_by_folder = self.context.get('decks')
+        decks = obj.decks.all() if decks_by_folder is None else decks_by_folder.get(obj.id, [])
         return DeckSerializer(decks, many=True).data
 
 
 class DeckSerializer(serializers.ModelSerializer):
-    cards_count = serializers.SerializerMethodField()
     folder_name = serializers.CharField(source='folder.name', read_only=True)
     
     class Meta:
         model = Deck
         fields = [
             'id', 'name', 'description', 'color', 'folder', 'folder_name',
-            'is_public', 'cards_count', 'created_at', 'updated_at'
+            'is_public', 'cards_count', 'new_cards_count', 'suspended_cards_count',
+            'new_cards_per_day', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
-    
-    def get_cards_count(self, obj):
-        return obj.cards.count()
+        read_only_fields = [
+            'cards_count', 'new_cards_count', 'suspended_cards_count',
+            'created_at', 'updated_at'
+        ]
+        extra_kwargs = {'new_cards_per_day': {'min_value': 0}}
 
 
 class CardReviewSerializer(serializers.ModelSerializer):
@@ -101,9 +122,11 @@ class CardReviewSerializer(serializers.ModelSerializer):
             'ease_factor_after',
             'interval_before',
             'interval_after',
-            'reviewed_at'
+            'reviewed_at',
+            'reviewed_on',
+            'is_practice'
         ]
-        read_only_fields = ['id', 'reviewed_at']
+        read_only_fields = ['id', 'reviewed_at', 'reviewed_on', 'is_practice']
 
 class StudySessionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,90 @@
+"""
+Очередь карточек учебной сессии.
+
+start_session один раз выбирает карточки к повторению (по индексу next_review)
+и новые карточки в пределах дневных лимитов – в колоде, папке с подпапками или по всем
+колодам – и сохраняет их id в самой сессии (StudySession.queue, int64 подряд:
+4 КБ на 500 карточек). Дальше submit_review/submit_reviews отдают следующие
+карточки из очереди вместе с ответом: клиенту не нужно снова запрашивать
+due_cards, когда пачка кончается, а база не сортирует очередь заново.
+
+Карточка с оценкой «Снова» возвращается в конец очереди и будет показана
+ещё раз в этой же сессии.
+"""
+import numpy as np
+from django.utils import timezone
+
+from .models import Card
+from .newcards import new_card_ids
+
+DEFAULT_QUEUE_SIZE = 100
+MAX_QUEUE_SIZE = 500
+DEFAULT_NEW_CARDS = 20
+DEFAULT_PREFETCH = 3
+MAX_PREFETCH = 10
+FAILED_RATING = 1
+
+
+def pack(card_ids):
+    return np.asarray(card_ids, dtype='<i8').tobytes()
+
+
+def unpack(blob):
+    return np.frombuffer(bytes(blob or b''), dtype='<i8').tolist()
+
+
+def build_queue(user, decks=None, limit=DEFAULT_QUEUE_SIZE, new_limit=DEFAULT_NEW_CARDS, now=None):
+    """
+    id карточек для сессии: сначала просроченные по next_review, затем новые в пределах
+    дневных лимитов (newcards.py). decks – QuerySet колод для ограничения области
+    (по умолчанию все колоды).
+    """
+    cards = Card.objects.filter(user=user, is_suspended=False)
+    if decks is not None:
+        cards = cards.filter(deck__in=decks)
+    due = list(
+        cards.filter(next_review__isnull=False, next_review__lte=now or timezone.now())
+        .order_by('next_review').values_list('id', flat=True)[:limit]
+    )
+    new_limit = min(new_limit, limit - len(due))
+    new = new_card_ids(user, decks, limit=new_limit) if new_limit > 0 else []
+    return due + new
+
+
+def take(session, count, failed=()):
+    """
+    Следующие count id из очереди сессии; failed – карточки с оценкой «Снова»,
+    они дописываются в конец, если ещё не ждут своей очереди. Сессия меняется
+    на месте, сохраняет её вызывающий код (см. queue_fields).
+    """
+    card_ids = unpack(session.queue)
+    if not card_ids:
+        return []
+    pending = set(card_ids[session.queue_position:])
+    requeued = [card_id for card_id in dict.fromkeys(failed) if card_id not in pending]
+    if requeued:
+        card_ids.extend(requeued)
+        session.queue = pack(card_ids)
+    result = card_ids[session.queue_position:session.queue_position + count]
+    session.queue_position += len(result)
+    session._queue_changed = True
+    return result
+
+
+def remaining(session):
+    return max(len(session.queue or b'') // 8 - session.queue_position, 0)
+
+
+def queue_fields(session):
+    """Поля очереди для UPDATE сессии, если take() их менял."""
+    if not getattr(session, '_queue_changed', False):
+        return {}
+    return {'queue': session.queue, 'queue_position': session.queue_position}
+
+
+def queue_cards(user, card_ids):
+    """Карточки в порядке очереди; удалённые и приостановленные за время сессии пропускаются."""
+    if not card_ids:
+        return []
+    cards = Card.objects.filter(user=user, is_suspended=False).in_bulk(card_ids)
+    return [cards[card_id] for card_id in card_ids if card_id in cards]
@@ -1,25 +1,123 @@
-from django.utils import timezone
+from collections import defaultdict, namedtuple
 from datetime import timedelta
 
+import numpy as np
+from django.utils import timezone
+
+MIN_EASE_FACTOR = 1.3
+MAX_EASE_FACTOR = 2.5
+EASE_STEP = 0.15
+RELEARN_DELAY_SECONDS = 10 * 60
+SECONDS_PER_DAY = 24 * 60 * 60
+
+SM2_FIELDS = ['ease_factor', 'interval', 'repetitions', 'next_review', 'last_reviewed', 'updated_at']
+
+SM2State = namedtuple('SM2State', ['ease_factor', 'interval', 'repetitions', 'due_in_seconds'])
+
+
+def sm2_schedule(ease_factor, interval, repetitions, rating):
+    """
+    Чистое ядро SM-2 над массивами: состояния карточек и оценки на входе,
+    новые состояния на выходе. Модели не создаются и не сохраняются.
+    due_in_seconds – через сколько секунд от момента ответа карточка снова к повторению.
+    """
+    ease_factor = np.asarray(ease_factor, dtype=np.float64)
+    interval = np.asarray(interval, dtype=np.int64)
+    repetitions = np.asarray(repetitions, dtype=np.int64)
+    rating = np.asarray(rating, dtype=np.int64)
 
-def apply_sm2(card, rating):
-    if rating == 1:
-        card.repetitions = 0
-        card.interval = 0
-        card.next_review = timezone.now() + timedelta(minutes=10)
-    else:
-        if card.repetitions == 0:
-            card.interval = 1
-        elif card.repetitions == 1:
-            card.interval = 6
-        else:
-            card.interval = int(card.interval * card.ease_factor)
-        card.repetitions += 1
-        card.next_review = timezone.now() + timedelta(days=card.interval)
-        if rating == 2:
-            card.ease_factor = max(1.3, card.ease_factor - 0.15)
-        elif rating == 4:
-            card.ease_factor = min(2.5, card.ease_factor + 0.15)
-    card.last_reviewed = timezone.now()
-    card.save()
+    failed = rating == 1
+    grown = np.select(
+        [repetitions == 0, repetitions == 1],
+        [1, 6],
+        (interval * ease_factor).astype(np.int64),
+    )
+    new_interval = np.where(failed, 0, grown)
+    new_repetitions = np.where(failed, 0, repetitions + 1)
+    new_ease_factor = np.select(
+        [failed, rating == 2, rating == 4],
+        [
+            ease_factor,
+            np.maximum(MIN_EASE_FACTOR, ease_factor - EASE_STEP),
+            np.minimum(MAX_EASE_FACTOR, ease_factor + EASE_STEP),
+        ],
+        ease_factor,
+    )
+    due_in_seconds = np.where(failed, RELEARN_DELAY_SECONDS, new_interval * SECONDS_PER_DAY)
+    return SM2State(new_ease_factor, new_interval, new_repetitions, due_in_seconds)
+
+
+def apply_sm2(card, rating, commit=True, now=None):
+    """Применяет SM-2 к одной карточке – тонкая обёртка над sm2_schedule."""
+    now = now or timezone.now()
+    state = sm2_schedule(card.ease_factor, card.interval, card.repetitions, rating)
+    card.ease_factor = float(state.ease_factor)
+    card.interval = int(state.interval)
+    card.repetitions = int(state.repetitions)
+    card.next_review = now + timedelta(seconds=int(state.due_in_seconds))
+    card.last_reviewed = now
+    if commit:
+        card.save(update_fields=SM2_FIELDS)
     return card
+
+
+def apply_sm2_bulk(cards, ratings, now=None):
+    """
+    Векторный вариант apply_sm2 для списка различных карточек.
+    Карточки изменяются на месте и не сохраняются – это делает вызывающий код (bulk_update).
+    now – момент ответа: общий для всех или список по карточкам (офлайн-ответы, см. sync.py).
+    """
+    now = now or timezone.now()
+    moments = now if isinstance(now, (list, tuple)) else [now] * len(cards)
+    state = sm2_schedule(
+        [card.ease_factor for card in cards],
+        [card.interval for card in cards],
+        [card.repetitions for card in cards],
+        ratings,
+    )
+    for card, moment, ease_factor, interval, repetitions, due_in in zip(
+        cards,
+        moments,
+        state.ease_factor.tolist(),
+        state.interval.tolist(),
+        state.repetitions.tolist(),
+        state.due_in_seconds.tolist(),
+    ):
+        card.ease_factor = ease_factor
+        card.interval = interval
+        card.repetitions = repetitions
+        card.next_review = moment + timedelta(seconds=due_in)
+        card.last_reviewed = moment
+    return cards
+
+
+def apply_sm2_sequence(cards, ratings, now=None, applies=None):
+    """
+    SM-2 для последовательности ответов, в которой карточка может встречаться несколько раз
+    (cards – по экземпляру на ответ, повторы – тот же объект). Ответы делятся на раунды
+    с различными карточками, каждый раунд считается векторно (apply_sm2_bulk).
+    applies(index, card) – применять ли ответ к карточке; неприменённый только записывается в историю.
+    Возвращает (ease_before, interval_before, ease_after, interval_after) по каждому ответу.
+    """
+    now = now or timezone.now()
+    moments = now if isinstance(now, (list, tuple)) else [now] * len(cards)
+    rounds, occurrences = [], defaultdict(int)
+    for index, card in enumerate(cards):
+        occurrence = occurrences[card.pk]
+        occurrences[card.pk] += 1
+        if occurrence == len(rounds):
+            rounds.append([])
+        rounds[occurrence].append(index)
+    states = [None] * len(cards)
+    for indexes in rounds:
+        for index in indexes:
+            states[index] = (cards[index].ease_factor, cards[index].interval)
+        applied = [index for index in indexes if applies is None or applies(index, cards[index])]
+        apply_sm2_bulk(
+            [cards[index] for index in applied],
+            [ratings[index] for index in applied],
+            now=[moments[index] for index in applied],
+        )
+        for index in indexes:
+            states[index] += (cards[index].ease_factor, cards[index].interval)
+    return states
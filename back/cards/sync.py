@@ -0,0 +1,257 @@
+"""
+Дельта-синхронизация для офлайн-клиентов.
+
+GET /api/sync/?token=... отдаёт папки, колоды и карточки, изменённые (updated_at)
+после отметки из токена, и id объектов, удалённых с тех пор (SyncTombstone).
+Токен непрозрачен для клиента – это base64 от JSON с отметкой времени. Если
+изменённых карточек больше SYNC_PAGE_SIZE, в токен добавляется курсор по
+(updated_at, id), в ответе more=true, и клиент сразу запрашивает следующую порцию.
+
+Без токена или с токеном старше срока хранения надгробий отдаётся всё и reset=true:
+клиент заменяет локальные данные целиком.
+
+Что клиент делает сам:
+- записи, пришедшие повторно, просто перезаписывает – отметка следующего токена
+  сдвинута назад на SYNC_OVERLAP, чтобы не терять изменения из транзакций,
+  закоммиченных уже после запроса;
+- при удалении колоды удаляет и её карточки (отдельных надгробий у них нет);
+- удаления применяет после обновлений.
+
+Ответы, накопленные офлайн, отправляются пачкой в POST /api/study/sync_reviews/
+и применяются apply_reviews.
+"""
+import base64
+import binascii
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import dashboard
+from .days import local_today, user_timezone
+from .models import Card, CardReview, DailyActivity, DailyNewCards, Deck, Folder, StudySession, SyncTombstone
+from .sm2 import SM2_FIELDS, apply_sm2_sequence
+
+SYNC_PAGE_SIZE = 1000
+SYNC_OVERLAP = timedelta(seconds=30)
+
+DELETED_KEYS = {
+    SyncTombstone.MODEL_FOLDER: 'folders',
+    SyncTombstone.MODEL_DECK: 'decks',
+    SyncTombstone.MODEL_CARD: 'cards',
+}
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+class Changes(NamedTuple):
+    folders: list
+    decks: list
+    cards: list
+    deleted: dict
+    token: str
+    more: bool
+    reset: bool
+
+
+class ReviewSync(NamedTuple):
+    session: StudySession
+    cards: list
+    reviews: list
+    skipped: int
+
+
+def tombstone_ttl():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_DAYS', 90))
+
+
+def encode_token(since, until=None, cursor=None):
+    data = {'s': since.isoformat() if since is not None else None}
+    if cursor is not None:
+        data['u'] = until.isoformat()
+        data['c'] = [cursor[0].isoformat(), cursor[1]]
+    raw = json.dumps(data, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """
+    (since, until, cursor); since None – полная выгрузка, until и cursor есть только
+    в середине многостраничной выгрузки.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        since = datetime.fromisoformat(data['s']) if data['s'] is not None else None
+        if 'c' not in data:
+            return since, None, None
+        moment, pk = data['c']
+        return since, datetime.fromisoformat(data['u']), (datetime.fromisoformat(moment), int(pk))
+    except (TypeError, ValueError, KeyError, binascii.Error):
+        raise InvalidSyncToken('Invalid sync token')
+
+
+def changes(user, token=None, limit=SYNC_PAGE_SIZE):
+    """Изменения пользователя после отметки из токена (без токена – всё)."""
+    since, until, cursor = decode_token(token) if token else (None, None, None)
+    folders, decks, deleted, reset = [], [], {}, False
+    if cursor is None:
+        # Папки, колоды и надгробия отдаются в первой порции, дальше – только карточки
+        until = timezone.now()
+        if since is not None and since < until - tombstone_ttl():
+            since = None
+        reset = since is None
+        folders = Folder.objects.filter(user=user)
+        decks = Deck.objects.filter(user=user).select_related('folder')
+        if since is not None:
+            folders = folders.filter(updated_at__gte=since)
+            decks = decks.filter(updated_at__gte=since)
+            deleted = defaultdict(list)
+            for model, object_id in SyncTombstone.objects.filter(
+                user=user, deleted_at__gte=since
+            ).values_list('model', 'object_id'):
+                deleted[DELETED_KEYS[model]].append(object_id)
+        folders, decks = list(folders.order_by('path')), list(decks.order_by('id'))
+
+    cards = Card.objects.filter(user=user)
+    if since is not None:
+        cards = cards.filter(updated_at__gte=since)
+    if cursor is not None:
+        # Ведущая граница updated_at >= позволяет идти по индексу (user, updated_at, id)
+        moment, pk = cursor
+        cards = cards.filter(Q(updated_at__gte=moment) & (Q(updated_at__gt=moment) | Q(id__gt=pk)))
+    cards = list(cards.order_by('updated_at', 'id')[:limit + 1])
+    more = len(cards) > limit
+    cards = cards[:limit]
+
+    if more:
+        token = encode_token(since, until, (cards[-1].updated_at, cards[-1].id))
+    else:
+        token = encode_token(until - SYNC_OVERLAP)
+    return Changes(folders, decks, cards, dict(deleted), token, more, reset)
+
+
+def apply_reviews(user, items):
+    """
+    Применяет офлайн-ответы [(card_id, rating, time_taken, reviewed_at), ...] одной пачкой
+    в новой сессии. Вызывается внутри транзакции; бросает Card.DoesNotExist, если
+    какой-то карточки у пользователя нет.
+
+    Ответы идут по времени. SM-2 меняет карточку, только если ответ новее её last_reviewed –
+    иначе на другом устройстве уже был более поздний ответ; в историю попадают все.
+    Повторно присланные ответы (та же карточка и то же время) пропускаются, поэтому
+    клиент может безопасно повторить отправку после обрыва связи.
+    """
+    from .counters import sync_cards
+    from .tagstats import sync_card_tags
+
+    items = sorted(items, key=lambda item: item[3])
+    card_ids = {card_id for card_id, _, _, _ in items}
+    cards = Card.objects.select_for_update(of=('self',)).filter(user=user).in_bulk(card_ids)
+    if len(cards) != len(card_ids):
+        raise Card.DoesNotExist('Card not found')
+
+    seen = set(CardReview.objects.filter(
+        card_id__in=card_ids, reviewed_at__in={reviewed_at for _, _, _, reviewed_at in items}
+    ).values_list('card_id', 'reviewed_at'))
+    fresh = []
+    for item in items:
+        if (item[0], item[3]) not in seen:
+            seen.add((item[0], item[3]))
+            fresh.append(item)
+    skipped = len(items) - len(fresh)
+    if not fresh:
+        return ReviewSync(None, [], [], skipped)
+    session = StudySession.objects.create(user=user)
+    tz = user_timezone(user)
+
+    # Дневная сводка по локальным дням ответов; карточка считается изученной в день,
+    # если в этот день на неё ещё не отвечали. Офлайн-ответы бывают старше уже записанных,
+    # поэтому отвеченные пары (карточка, день) берутся из CardReview, как в DailyActivity.rebuild.
+    # Так же – различные карточки текущей недели для счётчика дашборда
+    current_week = dashboard.week_start(local_today(tz))
+    studied = set(CardReview.objects.filter(card_id__in=card_ids, is_practice=False).filter(
+        Q(reviewed_on__in={timezone.localdate(item[3], tz) for item in fresh}) | Q(reviewed_on__gte=current_week)
+    ).values_list('card_id', 'reviewed_on'))
+    studied_this_week = {card_id for card_id, day in studied if day >= current_week}
+    days = defaultdict(lambda: defaultdict(int))
+    week_cards = 0
+    for card_id, rating, time_taken, reviewed_at in fresh:
+        day = timezone.localdate(reviewed_at, tz)
+        counters = days[day]
+        counters['reviews'] += 1
+        counters['cards_correct'] += rating >= 3
+        counters['time_spent'] += time_taken
+        if (card_id, day) not in studied:
+            studied.add((card_id, day))
+            counters['cards_studied'] += 1
+        if dashboard.week_start(day) == current_week and card_id not in studied_this_week:
+            studied_this_week.add(card_id)
+            week_cards += 1
+
+    # Впервые отвеченные карточки учитываются в дневных лимитах новых (newcards.py) в день первого ответа
+    first_day = {}
+    for card_id, _, _, reviewed_at in fresh:
+        if cards[card_id].next_review is None:
+            first_day.setdefault(card_id, timezone.localdate(reviewed_at, tz))
+    introduced = defaultdict(int)
+    for card_id, day in first_day.items():
+        introduced[cards[card_id].deck_id, day] += 1
+    for (deck_id, day), count in introduced.items():
+        DailyNewCards.increment(user, deck_id, day, count)
+
+    # Ответ меняет карточку, только если он новее её last_reviewed (см. выше);
+    # изменённые карточки – те, у которых сдвинулся last_reviewed
+    last_reviewed = {card.id: card.last_reviewed for card in cards.values()}
+    states = apply_sm2_sequence(
+        [cards[card_id] for card_id, _, _, _ in fresh],
+        [rating for _, rating, _, _ in fresh],
+        now=[reviewed_at for _, _, _, reviewed_at in fresh],
+        applies=lambda index, card: card.last_reviewed is None or fresh[index][3] > card.last_reviewed,
+    )
+    changed = {card.id: card for card in cards.values() if card.last_reviewed != last_reviewed[card.id]}
+
+    now = timezone.now()
+    for card in changed.values():
+        # updated_at – серверное время изменения, по нему работает выдача изменений
+        card.updated_at = now
+    Card.objects.bulk_update(changed.values(), SM2_FIELDS)
+    sync_cards(changed.values())
+    sync_card_tags(changed.values())
+
+    reviews = CardReview.objects.bulk_create([
+        CardReview(
+            session=session,
+            card_id=card_id,
+            user=user,
+            rating=rating,
+            time_taken=time_taken,
+            reviewed_at=reviewed_at,
+            reviewed_on=timezone.localdate(reviewed_at, tz),
+            ease_factor_before=ease_before,
+            interval_before=interval_before,
+            ease_factor_after=ease_after,
+            interval_after=interval_after,
+        )
+        for (card_id, rating, time_taken, reviewed_at), (ease_before, interval_before, ease_after, interval_after)
+        in zip(fresh, states)
+    ])
+    StudySession.objects.filter(id=session.id).update(
+        started_at=fresh[0][3],
+        ended_at=fresh[-1][3],
+        cards_studied=F('cards_studied') + len(reviews),
+        cards_correct=F('cards_correct') + sum(1 for _, rating, _, _ in fresh if rating >= 3),
+        points_earned=F('points_earned') + sum(rating for _, rating, _, _ in fresh),
+    )
+    days[timezone.localdate(fresh[0][3], tz)]['sessions'] += 1
+    for day, counters in days.items():
+        DailyActivity.increment(user, day, **counters)
+    week_sessions = int(dashboard.week_start(timezone.localdate(fresh[0][3], tz)) == current_week)
+    dashboard.record_week(user, local_today(tz), cards=week_cards, sessions=week_sessions, tz=tz)
+    session.refresh_from_db()
+    return ReviewSync(session, list(changed.values()), reviews, skipped)
@@ -0,0 +1,151 @@
+"""
+Индекс тегов пользователя (TagStat).
+
+taggit хранит теги через generic-связь TaggedItem, поэтому популярные теги и статистика
+по тегам требовали сканирования всех карточек пользователя. TagStat держит по каждому
+тегу пользователя число карточек, число освоенных и сумму повторений. Изменения набора
+тегов и удаления приходят через сигналы (см. конец models.py), изменения повторений –
+через sync_card_tags из сигнала сохранения карточки и пакетных путей.
+Расхождения чинит команда reconcile_counters.
+"""
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F, Q, Sum
+from taggit.models import TaggedItem
+
+from .models import Card, TagStat
+
+# Карточка считается освоенной после стольких успешных повторений подряд
+MASTERED_REPETITIONS = 3
+
+
+def _tagged_items(card_ids):
+    return TaggedItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(Card),
+        object_id__in=card_ids,
+    )
+
+
+def sync_card_tags(cards, deleted=False):
+    """
+    Переносит в TagStat изменения повторений карточек относительно запомненного
+    состояния (_tag_state). Для удаляемых карточек (deleted=True) вызывается до удаления,
+    пока их TaggedItem ещё не удалены каскадом, и вычитает карточки из тегов.
+    """
+    changed = {}
+    for card in cards:
+        old = getattr(card, '_tag_state', None)
+        new = None if deleted else card.__dict__.get('repetitions')
+        if old is None or old == new:
+            card._tag_state = new
+            continue
+        changed[card.id] = (card.user_id, old, new)
+        card._tag_state = new
+    if not changed:
+        return
+
+    items = _tagged_items(changed)
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for card_id, tag_id in items.values_list('object_id', 'tag_id'):
+        user_id, old, new = changed[card_id]
+        delta = deltas[(user_id, tag_id)]
+        if new is None:
+            delta[0] -= 1
+            delta[1] -= old >= MASTERED_REPETITIONS
+            delta[2] -= old
+        else:
+            delta[1] += (new >= MASTERED_REPETITIONS) - (old >= MASTERED_REPETITIONS)
+            delta[2] += new - old
+    for (user_id, tag_id), (cards_delta, mastered_delta, repetitions_delta) in deltas.items():
+        if not any((cards_delta, mastered_delta, repetitions_delta)):
+            continue
+        TagStat.objects.filter(user_id=user_id, tag_id=tag_id).update(
+            cards_count=F('cards_count') + cards_delta,
+            mastered_count=F('mastered_count') + mastered_delta,
+            repetitions_sum=F('repetitions_sum') + repetitions_delta,
+        )
+    if deleted and deltas:
+        TagStat.objects.filter(tag_id__in={tag_id for _, tag_id in deltas}, cards_count__lte=0).delete()
+
+
+def refresh_tag_stats(user_id, tag_ids):
+    """Пересчитывает строки TagStat пользователя для указанных тегов одним агрегатом."""
+    tag_ids = set(tag_ids)
+    if not tag_ids:
+        return
+    rows = (
+        Card.objects.filter(user_id=user_id, tags__id__in=tag_ids)
+        .order_by()
+        .values('tags__id', 'tags__name')
+        .annotate(
+            total=Count('id'),
+            mastered=Count('id', filter=Q(repetitions__gte=MASTERED_REPETITIONS)),
+            repetitions=Sum('repetitions'),
+        )
+    )
+    stats = TagStat.objects.filter(user_id=user_id, tag_id__in=tag_ids)
+    _store(user_id, {row['tags__id']: row for row in rows}, stats)
+
+
+def rebuild_tag_stats(user=None):
+    """Полностью пересобирает индекс тегов (всех или одного пользователя). Возвращает число изменённых строк."""
+    cards = Card.objects.filter(tags__isnull=False)
+    stats = TagStat.objects.all()
+    if user is not None:
+        cards = cards.filter(user=user)
+        stats = stats.filter(user=user)
+    rows = defaultdict(dict)
+    for row in cards.order_by().values('user_id', 'tags__id', 'tags__name').annotate(
+        total=Count('id'),
+        mastered=Count('id', filter=Q(repetitions__gte=MASTERED_REPETITIONS)),
+        repetitions=Sum('repetitions'),
+    ):
+        rows[row['user_id']][row['tags__id']] = row
+    existing = defaultdict(list)
+    for stat in stats:
+        existing[stat.user_id].append(stat)
+    return sum(
+        _store(user_id, rows.get(user_id, {}), existing.get(user_id, []))
+        for user_id in rows.keys() | existing.keys()
+    )
+
+
+def _store(user_id, rows, stats):
+    """Приводит строки TagStat пользователя к посчитанным значениям rows {tag_id: row}."""
+    changed, stale = [], []
+    for stat in stats:
+        row = rows.pop(stat.tag_id, None)
+        if row is None:
+            stale.append(stat.id)
+            continue
+        values = (row['tags__name'], row['total'], row['mastered'], row['repetitions'] or 0)
+        if values != (stat.name, stat.cards_count, stat.mastered_count, stat.repetitions_sum):
+            stat.name, stat.cards_count, stat.mastered_count, stat.repetitions_sum = values
+            changed.append(stat)
+    created = [
+        TagStat(
+            user_id=user_id,
+            tag_id=tag_id,
+            name=row['tags__name'],
+            cards_count=row['total'],
+            mastered_count=row['mastered'],
+            repetitions_sum=row['repetitions'] or 0,
+        )
+        for tag_id, row in rows.items()
+    ]
+    if stale:
+        TagStat.objects.filter(id__in=stale).delete()
+    if changed:
+        TagStat.objects.bulk_update(
+            changed, ['name', 'cards_count', 'mastered_count', 'repetitions_sum'], batch_size=500
+        )
+    if created:
+        TagStat.objects.bulk_create(created, batch_size=500, ignore_conflicts=True)
+    return len(stale) + len(changed) + len(created)
+
+
+def deck_tag_ids(deck_ids):
+    """Теги карточек колод – запоминаются перед удалением колод, чтобы потом пересчитать их."""
+    items = _tagged_items(Card.objects.filter(deck_id__in=deck_ids).values('id'))
+    return set(items.values_list('tag_id', flat=True))
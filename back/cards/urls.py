@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DeckViewSet, CardViewSet, StudyViewSet, StatisticsViewSet, FolderViewSet
+from .views import DeckViewSet, CardViewSet, StudyViewSet, StatisticsViewSet, FolderViewSet, ExportViewSet, SyncViewSet
 
 router = DefaultRouter()
 router.register(r'folders', FolderViewSet, basename='folder')
@@ -8,6 +8,8 @@ router.register(r'decks', DeckViewSet, basename='deck')
 router.register(r'cards', CardViewSet, basename='card')
 router.register(r'study', StudyViewSet, basename='study')
 router.register(r'statistics', StatisticsViewSet, basename='statistics')
+router.register(r'export', ExportViewSet, basename='export')
+router.register(r'sync', SyncViewSet, basename='sync')
 
 urlpatterns = [
     path('', include(router.urls)),
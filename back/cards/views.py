@@ -1,45 +1,66 @@
-from rest_framework import viewsets, filters
+from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import MultiPartParser
 from django.utils import timezone
-from django.core.cache import cache
-from django.conf import settings as django_settings
-from django.db.models import Q, Count, Avg
-from datetime import date, timedelta, datetime
+from django.utils.dateparse import parse_datetime
+from django.db import transaction
+from django.db.models import Q, F, Count, Sum, Case, When, Value, DateField
+from django.db.models.functions import TruncDate, Greatest
+from datetime import date, timedelta
 from calendar import monthrange
-from taggit.models import Tag
 from collections import defaultdict
 import random
 
-from .models import Deck, Card, StudySession, CardReview, Folder
-from .sm2 import apply_sm2
+from .models import Deck, Card, StudySession, CardReview, Folder, DailyActivity, TagStat
+from .days import day_bounds, day_filter, day_start, local_today, user_timezone
+from .sm2 import apply_sm2, apply_sm2_sequence, SM2_FIELDS
+from .counters import sync_cards
+from .tagstats import sync_card_tags
+from .sampling import sample_cards
+from .search import get_backend as get_search_backend
+from .pagination import KeysetPagination
+from .importing import ImportFormatError, detect_format, import_cards, iter_rows, open_upload
+from .anki import AnkiImporter
+from .exporting import FORMATS as EXPORT_FORMATS, export_response
+from .sync import InvalidSyncToken, apply_reviews, changes as sync_changes
+from . import dashboard, newcards, session_queue
+from .distractors import get_pool as get_distractor_pool, pick_distractors
 from .serializers import (
     DeckSerializer, CardSerializer, StudySessionSerializer,
-    CardReviewSerializer, FolderTreeSerializer, FolderSerializer
+    CardReviewSerializer, FolderTreeSerializer, FolderSerializer, FolderSyncSerializer
 )
 from accounts.models import UserProfile
 from pet.models import StudyPet
 
 
+def _export(request, cards, filename):
+    """Ответ экспорта по параметрам запроса (?format= занят DRF, поэтому ?file_format=)."""
+    fmt = request.query_params.get('file_format', 'jsonl')
+    if fmt not in EXPORT_FORMATS:
+        raise ValidationError({'file_format': f'Доступные форматы: {", ".join(EXPORT_FORMATS)}'})
+    compress = request.query_params.get('compress') == 'gzip'
+    return export_response(request.user, fmt, filename, cards=cards, compress=compress)
+
+
 class DeckViewSet(viewsets.ModelViewSet):
     serializer_class = DeckSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = Deck.objects.filter(user=self.request.user)
-        
-        sort_by = self.request.query_params.get('sort_by', '-created_at')
-        if sort_by in ['name', '-name', 'created_at', '-created_at']:
-            queryset = queryset.order_by(sort_by)
+        queryset = Deck.objects.filter(user=self.request.user).select_related('folder')
         
+        # При поиске колоды по умолчанию упорядочены по релевантности
         search = self.request.query_params.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | Q(description__icontains=search)
-            )
+            queryset = get_search_backend().search_decks(queryset, search, self.request.user)
+        
+        sort_by = self.request.query_params.get('sort_by', None if search else '-created_at')
+        if sort_by in ['name', '-name', 'created_at', '-created_at']:
+            queryset = queryset.order_by(sort_by)
         
         return queryset
     
@@ -50,8 +71,8 @@ class DeckViewSet(viewsets.ModelViewSet):
     def cards(self, request, pk=None):
         deck = self.get_object()
         qs = self._apply_card_filters(deck.cards.all())
-        use_pagination = 'page' in request.query_params or 'page_size' in request.query_params
-        if use_pagination:
+        if 'page' in request.query_params:
+            # Постраничный режим оставлен для совместимости; новые клиенты используют курсор
             paginator = PageNumberPagination()
             paginator.page_size = min(int(request.query_params.get('page_size', 50)), 200)
             page = paginator.paginate_queryset(qs, request)
@@ -63,6 +84,18 @@ class DeckViewSet(viewsets.ModelViewSet):
                 'next': paginator.get_next_link(),
                 'previous': paginator.get_previous_link(),
             })
+        if 'cursor' in request.query_params or 'page_size' in request.query_params:
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(qs, request, view=self)
+            data = {
+                'deck': DeckSerializer(deck).data,
+                'cards': CardSerializer(page, many=True, context={'request': request}).data,
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+            }
+            if paginator.count is not None:
+                data['count'] = paginator.count
+            return Response(data)
         cards_list = list(qs[:500])
         serializer = CardSerializer(cards_list, many=True, context={'request': request})
         return Response({
@@ -71,6 +104,55 @@ class DeckViewSet(viewsets.ModelViewSet):
             'count': len(serializer.data),
         })
     
+    @action(detail=True, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_cards(self, request, pk=None):
+        """
+        Импорт карточек из файла (поле file): CSV/TSV с колонками front, back, tags
+        или JSON (массив объектов / JSON Lines). Формат – из поля формы format (csv, tsv, json)
+        или по расширению файла.
+        """
+        deck = self.get_object()
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=400)
+        fmt = request.data.get('format') or detect_format(upload.name)
+        try:
+            with open_upload(upload) as stream:
+                report = import_cards(deck, iter_rows(stream, fmt))
+        except ImportFormatError as error:
+            return Response({'error': str(error)}, status=400)
+        return Response(report.as_dict(), status=201 if report.created else 200)
+    
+    @action(detail=False, methods=['post'], url_path='import_anki', parser_classes=[MultiPartParser])
+    def import_anki(self, request):
+        """Импорт коллекции Anki (.apkg/.colpkg, поле file) с историей ответов; folder_id – куда положить колоды."""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=400)
+        folder = None
+        if request.data.get('folder_id'):
+            folder = Folder.objects.filter(id=request.data['folder_id'], user=request.user).first()
+            if folder is None:
+                return Response({'error': 'Folder not found'}, status=404)
+        try:
+            with open_upload(upload) as stream:
+                report = AnkiImporter(request.user, folder=folder).run(stream)
+        except ImportFormatError as error:
+            return Response({'error': str(error)}, status=400)
+        return Response(report._asdict(), status=201)
+    
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """Потоковый экспорт карточек колоды: ?file_format=jsonl|csv|anki, ?compress=gzip."""
+        deck = self.get_object()
+        return _export(request, deck.cards.all(), f'deck-{deck.id}')
+    
+    def approximate_count(self, queryset):
+        """Для карточек колоды без фильтров число берётся из счётчика колоды."""
+        if self.request.query_params.get('status') or self.request.query_params.get('tag'):
+            return None
+        return self.get_object().cards_count
+    
     def _apply_card_filters(self, queryset):
         status_filter = self.request.query_params.get('status')
         if status_filter == 'new':
@@ -90,12 +172,32 @@ class DeckViewSet(viewsets.ModelViewSet):
 class CardViewSet(viewsets.ModelViewSet):
     serializer_class = CardSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['front', 'back', 'tags__name']
-    ordering_fields = ['created_at', 'next_review', 'repetitions']
+    # Поиск по ?search= идёт через полнотекстовый индекс в get_queryset,
+    # сортировку (?ordering=) и курсор обрабатывает KeysetPagination
+    filter_backends = []
+    pagination_class = KeysetPagination
+    
+    @property
+    def paginator(self):
+        # Результаты поиска упорядочены по релевантности – у них нет ключа для курсора
+        if self.request.query_params.get('search'):
+            if not hasattr(self, '_search_paginator'):
+                self._search_paginator = PageNumberPagination()
+            return self._search_paginator
+        return super().paginator
+    
+    def approximate_count(self, queryset):
+        """Без фильтров число карточек берётся из счётчиков колод."""
+        params = self.request.query_params
+        if any(params.get(name) for name in ('tag', 'status', 'search')):
+            return None
+        decks = Deck.objects.filter(user=self.request.user)
+        if params.get('deck_id'):
+            decks = decks.filter(id=params['deck_id'])
+        return decks.aggregate(total=Sum('cards_count'))['total'] or 0
     
     def get_queryset(self):
-        queryset = Card.objects.filter(deck__user=self.request.user)
+        queryset = Card.objects.filter(user=self.request.user)
         
         deck_id = self.request.query_params.get('deck_id')
         if deck_id:
@@ -115,11 +217,7 @@ class CardViewSet(viewsets.ModelViewSet):
         
         search = self.request.query_params.get('search')
         if search:
-            queryset = queryset.filter(
-                Q(front__icontains=search) | 
-                Q(back__icontains=search) |
-                Q(tags__name__icontains=search)
-            ).distinct()
+            queryset = get_search_backend().search_cards(queryset, search, self.request.user)
         
         return queryset
     
@@ -143,27 +241,44 @@ class CardViewSet(viewsets.ModelViewSet):
 
         serializer.save(deck=deck)
     
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Последние ответы на карточку (?limit=, до 500), новые первыми – по индексу (card, reviewed_at)."""
+        card = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 100)), 1), 500)
+        except ValueError:
+            limit = 100
+        reviews = card.reviews.order_by('-reviewed_at')[:limit]
+        return Response(CardReviewSerializer(reviews, many=True).data)
+    
     @action(detail=False, methods=['get'])
     def popular_tags(self, request):
-        cache_key = f'popular_tags_{request.user.id}'
-        data = cache.get(cache_key)
-        if data is not None:
-            return Response(data)
-        tags = Tag.objects.filter(
-            taggit_taggeditem_items__content_type__model='card',
-            taggit_taggeditem_items__object_id__in=Card.objects.filter(
-                deck__user=request.user
-            ).values_list('id', flat=True)
-        ).annotate(
-            count=Count('taggit_taggeditem_items')
-        ).order_by('-count')[:20]
-        data = [{'name': tag.name, 'count': tag.count} for tag in tags]
-        cache.set(cache_key, data, getattr(django_settings, 'CACHE_TAGS_TTL', 300))
-        return Response(data)
+        tags = TagStat.objects.filter(
+            user=request.user, cards_count__gt=0
+        ).order_by('-cards_count', 'name')[:20]
+        return Response([{'name': tag.name, 'count': tag.cards_count} for tag in tags])
+    
+    @action(detail=False, methods=['get'])
+    def tags_autocomplete(self, request):
+        """Теги пользователя, начинающиеся с ?q=, самые используемые первыми."""
+        prefix = request.query_params.get('q', '').strip()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        tags = TagStat.objects.filter(user=request.user, cards_count__gt=0)
+        if prefix:
+            tags = tags.filter(name__istartswith=prefix)
+        tags = tags.order_by('-cards_count', 'name')[:limit]
+        return Response([{'name': tag.name, 'count': tag.cards_count} for tag in tags])
 
 
 class StudyViewSet(viewsets.GenericViewSet):
     permission_classes = [IsAuthenticated]
+    MAX_BATCH_REVIEWS = 500
+    # Насколько reviewed_at офлайн-ответа может опережать часы сервера
+    MAX_CLOCK_SKEW = timedelta(minutes=5)
     
     @action(detail=False, methods=['get'])
     def due_cards(self, request):
@@ -172,7 +287,7 @@ class StudyViewSet(viewsets.GenericViewSet):
         now = timezone.now()
         
         queryset = Card.objects.filter(
-            deck__user=request.user,
+            user=request.user,
             is_suspended=False,
             next_review__isnull=False,
             next_review__lte=now
@@ -188,6 +303,39 @@ class StudyViewSet(viewsets.GenericViewSet):
         serializer = CardSerializer(cards, many=True, context={'request': request})
         return Response({'cards': serializer.data, 'count': len(serializer.data)})
     
+    @action(detail=False, methods=['get'])
+    def new_cards(self, request):
+        """
+        Новые карточки, которые можно ввести сегодня (newcards.py): в порядке добавления,
+        с учётом дневных лимитов колоды и пользователя. ?deck_id= или ?folder_id= – область.
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({'error': 'Invalid limit'}, status=400)
+        decks = None
+        deck_id = request.query_params.get('deck_id')
+        folder_id = request.query_params.get('folder_id')
+        if deck_id:
+            try:
+                decks = Deck.objects.filter(id=int(deck_id), user=request.user)
+            except ValueError:
+                return Response({'error': 'Invalid deck_id'}, status=400)
+        elif folder_id:
+            try:
+                folder = Folder.objects.get(id=folder_id, user=request.user)
+            except (Folder.DoesNotExist, ValueError):
+                return Response({'error': 'Папка не найдена'}, status=404)
+            decks = Deck.objects.filter(folder__in=folder.get_descendants(include_self=True))
+        card_ids = newcards.new_card_ids(request.user, decks, limit=limit)
+        cards = session_queue.queue_cards(request.user, card_ids)
+        serializer = CardSerializer(cards, many=True, context={'request': request})
+        return Response({
+            'cards': serializer.data,
+            'count': len(serializer.data),
+            'limits': newcards.limits_summary(request.user),
+        })
+    
     @action(detail=False, methods=['get'])
     def all_cards(self, request):
         deck_id = request.query_params.get('deck_id')
@@ -196,11 +344,11 @@ class StudyViewSet(viewsets.GenericViewSet):
         if not deck_id:
             return Response({'error': 'deck_id is required'}, status=400)
         
-        cards = Card.objects.filter(
-            deck__user=request.user,
+        cards = sample_cards(Card.objects.filter(
+            user=request.user,
             deck_id=deck_id,
             is_suspended=False
-        ).order_by('?')[:limit]
+        ), limit, seed=request.query_params.get('seed'))
         
         serializer = CardSerializer(cards, many=True, context={'request': request})
         return Response({
@@ -217,11 +365,11 @@ class StudyViewSet(viewsets.GenericViewSet):
         reverse = request.query_params.get('reverse', 'false').lower() == 'true'
         if not deck_id:
             return Response({'error': 'deck_id is required'}, status=400)
-        cards = Card.objects.filter(
-            deck__user=request.user,
+        cards = sample_cards(Card.objects.filter(
+            user=request.user,
             deck_id=deck_id,
             is_suspended=False,
-        ).order_by('?')[:limit]
+        ), limit, seed=request.query_params.get('seed'))
         serializer = CardSerializer(cards, many=True, context={'request': request})
         out = []
         for c in serializer.data:
@@ -241,31 +389,24 @@ class StudyViewSet(viewsets.GenericViewSet):
         num_wrong = 3
         if not deck_id:
             return Response({'error': 'deck_id is required'}, status=400)
-        cards = list(Card.objects.filter(
-            deck__user=request.user,
+        cards = sample_cards(Card.objects.filter(
+            user=request.user,
             deck_id=deck_id,
             is_suspended=False,
-        ).order_by('?')[:limit])
-        other_answers = list(
-            Card.objects.filter(deck_id=deck_id, is_suspended=False)
-            .exclude(id__in=[c.id for c in cards])
-            .values_list('back' if not reverse else 'front', flat=True)
-        )
-        if not other_answers:
-            other_answers = list(
-                Card.objects.filter(deck_id=deck_id)
-                .values_list('back' if not reverse else 'front', flat=True)
-            )
+        ), limit, seed=request.query_params.get('seed'))
+        answer_field = 'front' if reverse else 'back'
+        rng = random.Random(request.query_params.get('seed'))
+        candidates = get_distractor_pool(deck_id, answer_field) if cards else []
+        # Ответы других карточек теста дополняют пул в маленьких колодах
+        candidates = candidates + [getattr(card, answer_field) for card in cards]
         serializer = CardSerializer(cards, many=True, context={'request': request})
         result = []
         for card_data in serializer.data:
             correct = card_data['back'] if not reverse else card_data['front']
             question = card_data['front'] if not reverse else card_data['back']
-            wrong = [a for a in other_answers if a != correct][:num_wrong]
-            while len(wrong) < num_wrong and other_answers:
-                wrong = list(set(wrong + [random.choice(other_answers)]))[:num_wrong]
+            wrong = pick_distractors(correct, candidates, num_wrong, rng)
             options = [correct] + wrong
-            random.shuffle(options)
+            rng.shuffle(options)
             result.append({
                 **card_data,
                 'question': question,
@@ -276,20 +417,63 @@ class StudyViewSet(viewsets.GenericViewSet):
     
     @action(detail=False, methods=['post'])
     def start_session(self, request):
+        """
+        Создаёт сессию. В режиме обучения сразу строится очередь карточек (session_queue.py):
+        deck_id или folder_id (с подпапками) ограничивают область, limit – размер очереди,
+        new_limit – сколько новых карточек добавить, prefetch – сколько карточек вернуть сразу.
+        Следующие карточки приходят в ответах submit_review/submit_reviews.
+        """
         deck_id = request.data.get('deck_id')
+        folder_id = request.data.get('folder_id')
         mode = request.data.get('mode', 'learning')
         reverse = request.data.get('reverse', False)
         is_practice = mode in ('practice', 'matching', 'test')
-        session = StudySession.objects.create(
+        try:
+            limit = min(max(int(request.data.get('limit', session_queue.DEFAULT_QUEUE_SIZE)), 1),
+                        session_queue.MAX_QUEUE_SIZE)
+            new_limit = max(int(request.data.get('new_limit', session_queue.DEFAULT_NEW_CARDS)), 0)
+            prefetch = min(max(int(request.data.get('prefetch', session_queue.DEFAULT_PREFETCH)), 1),
+                           session_queue.MAX_PREFETCH)
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid queue parameters'}, status=400)
+        if deck_id:
+            try:
+                deck_id = int(deck_id)
+            except (TypeError, ValueError):
+                return Response({'error': 'Invalid deck_id'}, status=400)
+            if not Deck.objects.filter(id=deck_id, user=request.user).exists():
+                return Response({'error': 'Колода не найдена'}, status=404)
+        
+        session = StudySession(
             user=request.user,
             deck_id=deck_id if deck_id else None,
             is_practice_mode=is_practice,
             is_reversed=bool(reverse),
         )
+        first = []
+        if not is_practice:
+            decks = None
+            if deck_id:
+                decks = Deck.objects.filter(id=deck_id, user=request.user)
+            elif folder_id:
+                try:
+                    folder = Folder.objects.get(id=folder_id, user=request.user)
+                except (Folder.DoesNotExist, ValueError):
+                    return Response({'error': 'Папка не найдена'}, status=404)
+                decks = Deck.objects.filter(folder__in=folder.get_descendants(include_self=True))
+            session.queue = session_queue.pack(
+                session_queue.build_queue(request.user, decks, limit=limit, new_limit=new_limit)
+            )
+            first = session_queue.take(session, prefetch)
+        session.save()
         return Response({
             'session_id': session.id,
             'mode': mode,
             'reverse': session.is_reversed,
+            'cards': CardSerializer(
+                session_queue.queue_cards(request.user, first), many=True, context={'request': request}
+            ).data,
+            'remaining': session_queue.remaining(session),
         }, status=201)
     
     @action(detail=False, methods=['post'])
@@ -299,61 +483,279 @@ class StudyViewSet(viewsets.GenericViewSet):
         rating = int(request.data.get('rating'))
         time_taken = int(request.data.get('time_taken', 0))
         
-        try:
-            card = Card.objects.get(id=card_id, deck__user=request.user)
-            session = StudySession.objects.get(id=session_id, user=request.user)
-        except (Card.DoesNotExist, StudySession.DoesNotExist):
-            return Response({'error': 'Card or Session not found'}, status=404)
-        
-        ease_before = card.ease_factor
-        interval_before = card.interval
-        
-        if not session.is_practice_mode:
-            card = apply_sm2(card, rating)
-        
-        CardReview.objects.create(
-            session=session,
-            card=card,
-            rating=rating,
-            time_taken=time_taken,
-            ease_factor_before=ease_before,
-            interval_before=interval_before,
-            ease_factor_after=card.ease_factor,
-            interval_after=card.interval
-        )
-        
-        session.cards_studied += 1
-        if rating >= 3:
-            session.cards_correct += 1
-        session.points_earned += rating
-        session.save()
-        
-        if not session.is_practice_mode:
-            self._update_user_profile(request.user, rating)
+        with transaction.atomic():
+            try:
+                card = Card.objects.select_for_update(of=('self',)).get(
+                    id=card_id, user=request.user
+                )
+                session = StudySession.objects.select_for_update().get(id=session_id, user=request.user)
+            except (Card.DoesNotExist, StudySession.DoesNotExist):
+                return Response({'error': 'Card or Session not found'}, status=404)
+            
+            ease_before = card.ease_factor
+            interval_before = card.interval
+            reviewed_on = local_today(user_timezone(request.user))
+            
+            if not session.is_practice_mode:
+                self._record_daily_activity(request.user, [(card.id, rating, time_taken)], [card])
+                if card.next_review is None:
+                    newcards.record_introduced(request.user, [card])
+                card = apply_sm2(card, rating)
+            
+            CardReview.objects.create(
+                session=session,
+                card=card,
+                user=request.user,
+                is_practice=session.is_practice_mode,
+                reviewed_on=reviewed_on,
+                rating=rating,
+                time_taken=time_taken,
+                ease_factor_before=ease_before,
+                interval_before=interval_before,
+                ease_factor_after=card.ease_factor,
+                interval_after=card.interval
+            )
+            # Следующая карточка из очереди сессии взамен отвеченной
+            next_ids = session_queue.take(
+                session, 1, failed=[card.id] if rating == session_queue.FAILED_RATING else ()
+            )
+            self._increment_session(session, 1, int(rating >= 3), rating, **session_queue.queue_fields(session))
+            
+            current_streak = 0
+            if not session.is_practice_mode:
+                current_streak = self._update_user_profile(request.user, 1, rating)
         
         return Response({
             'card': CardSerializer(card, context={'request': request}).data,
             'points_earned': rating if not session.is_practice_mode else 0,
-            'current_streak': request.user.profile.current_streak if not session.is_practice_mode else 0
+            'current_streak': current_streak,
+            'next_cards': CardSerializer(
+                session_queue.queue_cards(request.user, next_ids), many=True, context={'request': request}
+            ).data,
+            'remaining': session_queue.remaining(session),
         })
     
-    def _update_user_profile(self, user, rating):
-        profile, _ = UserProfile.objects.get_or_create(user=user)
-        profile.total_cards_studied += 1
-        profile.total_points += rating
+    @action(detail=False, methods=['post'])
+    def submit_reviews(self, request):
+        """
+        Пакетная отправка оценок за сессию: [{card_id, rating, time_taken}, ...].
+        Все оценки применяются в одной транзакции, сессия и профиль обновляются один раз.
+        """
+        session_id = request.data.get('session_id')
+        items = request.data.get('reviews')
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'reviews must be a non-empty list'}, status=400)
+        if len(items) > self.MAX_BATCH_REVIEWS:
+            return Response(
+                {'error': f'Too many reviews, max {self.MAX_BATCH_REVIEWS}'}, status=400
+            )
         
-        today = timezone.now().date()
-        if profile.last_study_date != today:
-            if profile.last_study_date == today - timedelta(days=1):
-                profile.current_streak += 1
+        parsed = []
+        for item in items:
+            try:
+                card_id = int(item['card_id'])
+                rating = int(item['rating'])
+                time_taken = int(item.get('time_taken', 0))
+            except (KeyError, TypeError, ValueError, AttributeError):
+                return Response({'error': 'Invalid review item'}, status=400)
+            if rating not in (1, 2, 3, 4):
+                return Response({'error': 'rating must be between 1 and 4'}, status=400)
+            parsed.append((card_id, rating, time_taken))
+        
+        with transaction.atomic():
+            try:
+                session = StudySession.objects.select_for_update().get(id=session_id, user=request.user)
+            except (StudySession.DoesNotExist, ValueError, TypeError):
+                return Response({'error': 'Session not found'}, status=404)
+            
+            cards = Card.objects.select_for_update(of=('self',)).filter(
+                user=request.user
+            ).in_bulk(
+                {card_id for card_id, _, _ in parsed}
+            )
+            if len(cards) != len({card_id for card_id, _, _ in parsed}):
+                return Response({'error': 'Card not found'}, status=404)
+            
+            now = timezone.now()
+            reviewed_on = timezone.localdate(now, user_timezone(request.user))
+            states = [(cards[card_id].ease_factor, cards[card_id].interval) for card_id, _, _ in parsed]
+            if not session.is_practice_mode:
+                self._record_daily_activity(request.user, parsed, cards.values())
+                newcards.record_introduced(
+                    request.user, [card for card in cards.values() if card.next_review is None]
+                )
+                # Карточка может встретиться в пакете несколько раз – оценки применяются по порядку
+                states = apply_sm2_sequence(
+                    [cards[card_id] for card_id, _, _ in parsed], [rating for _, rating, _ in parsed], now=now
+                )
+                for card in cards.values():
+                    card.updated_at = now
+                Card.objects.bulk_update(cards.values(), SM2_FIELDS)
+                sync_cards(cards.values())
+                sync_card_tags(cards.values())
             else:
-                profile.current_streak = 1
-            profile.last_study_date = today
+                states = [state * 2 for state in states]
+            
+            reviews = [
+                CardReview(
+                    session=session,
+                    card=cards[card_id],
+                    user=request.user,
+                    is_practice=session.is_practice_mode,
+                    rating=rating,
+                    time_taken=time_taken,
+                    reviewed_at=now,
+                    reviewed_on=reviewed_on,
+                    ease_factor_before=ease_before,
+                    interval_before=interval_before,
+                    ease_factor_after=ease_after,
+                    interval_after=interval_after
+                )
+                for (card_id, rating, time_taken), (ease_before, interval_before, ease_after, interval_after)
+                in zip(parsed, states)
+            ]
+            cards_correct = sum(1 for _, rating, _ in parsed if rating >= 3)
+            points = sum(rating for _, rating, _ in parsed)
+            CardReview.objects.bulk_create(reviews)
+            
+            next_ids = session_queue.take(session, len(reviews), failed=[
+                card_id for card_id, rating, _ in parsed if rating == session_queue.FAILED_RATING
+            ])
+            self._increment_session(
+                session, len(reviews), cards_correct, points, **session_queue.queue_fields(session)
+            )
             
-            if profile.current_streak > profile.longest_streak:
-                profile.longest_streak = profile.current_streak
+            current_streak = 0
+            if not session.is_practice_mode:
+                current_streak = self._update_user_profile(request.user, len(reviews), points)
+        
+        return Response({
+            'cards': CardSerializer(cards.values(), many=True, context={'request': request}).data,
+            'reviewed': len(reviews),
+            'points_earned': points if not session.is_practice_mode else 0,
+            'current_streak': current_streak,
+            'next_cards': CardSerializer(
+                session_queue.queue_cards(request.user, next_ids), many=True, context={'request': request}
+            ).data,
+            'remaining': session_queue.remaining(session),
+        })
+    
+    @action(detail=False, methods=['post'])
+    def sync_reviews(self, request):
+        """
+        Ответы, накопленные офлайн: [{card_id, rating, time_taken, reviewed_at}, ...].
+        Применяются одной транзакцией в порядке reviewed_at (см. sync.apply_reviews);
+        повторная отправка тех же ответов ничего не меняет. reviewed_at позже часов
+        сервера больше чем на MAX_CLOCK_SKEW – 400.
+        """
+        items = request.data.get('reviews')
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'reviews must be a non-empty list'}, status=400)
+        if len(items) > self.MAX_BATCH_REVIEWS:
+            return Response(
+                {'error': f'Too many reviews, max {self.MAX_BATCH_REVIEWS}'}, status=400
+            )
+        
+        now = timezone.now()
+        parsed = []
+        for item in items:
+            try:
+                card_id = int(item['card_id'])
+                rating = int(item['rating'])
+                time_taken = int(item.get('time_taken', 0))
+                reviewed_at = parse_datetime(item['reviewed_at'])
+            except (KeyError, TypeError, ValueError, AttributeError):
+                return Response({'error': 'Invalid review item'}, status=400)
+            if rating not in (1, 2, 3, 4):
+                return Response({'error': 'rating must be between 1 and 4'}, status=400)
+            if reviewed_at is None:
+                return Response({'error': 'Invalid review item'}, status=400)
+            if timezone.is_naive(reviewed_at):
+                reviewed_at = timezone.make_aware(reviewed_at)
+            # Время из будущего не подрезается до now: повтор той же пачки пришёл бы с другим
+            # reviewed_at и не распознался бы как повтор – такие ответы отклоняются целиком
+            if reviewed_at > now + self.MAX_CLOCK_SKEW:
+                return Response({'error': 'reviewed_at is in the future'}, status=400)
+            parsed.append((card_id, rating, time_taken, reviewed_at))
+        
+        with transaction.atomic():
+            try:
+                result = apply_reviews(request.user, parsed)
+            except Card.DoesNotExist:
+                return Response({'error': 'Card not found'}, status=404)
+            points = sum(review.rating for review in result.reviews)
+            current_streak = None
+            if result.reviews:
+                current_streak = self._update_user_profile(request.user, len(result.reviews), points)
         
-        profile.save()
+        return Response({
+            'cards': CardSerializer(result.cards, many=True, context={'request': request}).data,
+            'reviewed': len(result.reviews),
+            'skipped': result.skipped,
+            'session_id': result.session.id if result.session else None,
+            'points_earned': points,
+            'current_streak': current_streak,
+        })
+    
+    def _record_daily_activity(self, user, items, cards):
+        """
+        Добавляет оценки [(card_id, rating, time_taken), ...] в дневную сводку и счётчики недели.
+        cards – карточки до применения SM-2: по last_reviewed видно, отвечали ли на них сегодня.
+        """
+        tz = user_timezone(user)
+        today = local_today(tz)
+        today_start = day_start(today, tz)
+        week_begin = day_start(dashboard.week_start(today), tz)
+        reviewed_today = {
+            card.id for card in cards
+            if card.last_reviewed is not None and card.last_reviewed >= today_start
+        }
+        reviewed_this_week = {
+            card.id for card in cards
+            if card.last_reviewed is not None and card.last_reviewed >= week_begin
+        }
+        card_ids = {card_id for card_id, _, _ in items}
+        DailyActivity.increment(
+            user, today,
+            reviews=len(items),
+            cards_studied=len(card_ids - reviewed_today),
+            cards_correct=sum(1 for _, rating, _ in items if rating >= 3),
+            time_spent=sum(time_taken for _, _, time_taken in items),
+        )
+        dashboard.record_week(user, today, cards=len(card_ids - reviewed_this_week), tz=tz)
+    
+    def _increment_session(self, session, cards_studied, cards_correct, points, **fields):
+        StudySession.objects.filter(id=session.id).update(
+            cards_studied=F('cards_studied') + cards_studied,
+            cards_correct=F('cards_correct') + cards_correct,
+            points_earned=F('points_earned') + points,
+            **fields,
+        )
+    
+    def _update_user_profile(self, user, cards_studied, points):
+        """
+        Начисляет ответы и очки и продлевает серию одним UPDATE с F()-выражениями,
+        чтобы параллельные запросы не теряли обновления. Возвращает текущую серию.
+        """
+        today = timezone.now().date()
+        streak = Case(
+            When(last_study_date=today, then=F('current_streak')),
+            When(last_study_date=today - timedelta(days=1), then=F('current_streak') + 1),
+            default=Value(1),
+        )
+        updates = {
+            'total_cards_studied': F('total_cards_studied') + cards_studied,
+            'total_points': F('total_points') + points,
+            'current_streak': streak,
+            'longest_streak': Greatest(F('longest_streak'), streak),
+            'last_study_date': today,
+            'updated_at': timezone.now(),
+        }
+        profiles = UserProfile.objects.filter(user=user)
+        if not profiles.update(**updates):
+            UserProfile.objects.get_or_create(user=user)
+            profiles.update(**updates)
+        return profiles.values_list('current_streak', flat=True).get()
     
     @action(detail=False, methods=['post'])
     def end_session(self, request):
@@ -362,8 +764,14 @@ class StudyViewSet(viewsets.GenericViewSet):
             session = StudySession.objects.get(id=session_id, user=request.user)
         except StudySession.DoesNotExist:
             return Response({'error': 'Session not found'}, status=404)
-        session.ended_at = timezone.now()
-        session.save()
+        # Закрывает сессию только один из параллельных вызовов – он и засчитывает её
+        closed = StudySession.objects.filter(id=session.id, ended_at__isnull=True).update(ended_at=timezone.now())
+        if closed and not session.is_practice_mode:
+            tz = user_timezone(request.user)
+            started_on = timezone.localdate(session.started_at, tz)
+            DailyActivity.increment(request.user, started_on, sessions=1)
+            dashboard.record_week(request.user, started_on, sessions=1, tz=tz)
+        session.refresh_from_db()
         data = StudySessionSerializer(session).data
         if session.cards_studied > 0:
             accuracy = session.cards_correct / session.cards_studied
@@ -389,7 +797,8 @@ class StudyViewSet(viewsets.GenericViewSet):
         year = request.query_params.get('year')
         month = request.query_params.get('month')
         user = request.user
-        today = timezone.now().date()
+        tz = user_timezone(user)
+        today = local_today(tz)
         
         if year and month:
             try:
@@ -403,76 +812,55 @@ class StudyViewSet(viewsets.GenericViewSet):
             start_date = today
             end_date = today + timedelta(days=days - 1)
         
-        schedule_by_date = defaultdict(lambda: {'count': 0, 'by_deck': defaultdict(int)})
-        
-        overdue_cards = Card.objects.filter(
-            deck__user=user,
-            is_suspended=False,
-            next_review__lt=start_date
-        ).select_related('deck')
-        
-        for card in overdue_cards:
-            date_str = start_date.isoformat()
-            deck_id = card.deck.id
-            schedule_by_date[date_str]['count'] += 1
-            schedule_by_date[date_str]['by_deck'][deck_id] += 1
+        start_dt, end_dt = day_bounds(start_date, end_date, tz)
         
-        cards_due = Card.objects.filter(
-            deck__user=user,
+        # Одна группировка по (день, колода): просроченные карточки относим к первому дню,
+        # имя и цвет колоды приходят через JOIN. Фильтр – диапазоном по next_review
+        # (частичный индекс cards_card_user_due_idx), день – в часовом поясе пользователя.
+        rows = Card.objects.filter(
+            user=user,
             is_suspended=False,
-            next_review__date__range=[start_date, end_date]
-        ).select_related('deck').order_by('next_review')
+            next_review__isnull=False,
+            next_review__lt=end_dt
+        ).annotate(
+            due_date=Case(
+                When(next_review__lt=start_dt, then=Value(start_date)),
+                default=TruncDate('next_review', tzinfo=tz),
+                output_field=DateField(),
+            )
+        ).values(
+            'due_date', 'deck_id', 'deck__name', 'deck__color'
+        ).annotate(count=Count('id')).order_by('due_date', 'deck_id')
         
-        for card in cards_due:
-            due_date = card.next_review.date().isoformat()
-            deck_id = card.deck.id
-            schedule_by_date[due_date]['count'] += 1
-            schedule_by_date[due_date]['by_deck'][deck_id] += 1
+        schedule_by_date = defaultdict(list)
+        for row in rows:
+            schedule_by_date[row['due_date']].append({
+                'deck_id': row['deck_id'],
+                'deck_name': row['deck__name'],
+                'color': row['deck__color'] or '#6366f1',
+                'count': row['count']
+            })
         
         schedule = []
         current_date = start_date
         while current_date <= end_date:
-            date_str = current_date.isoformat()
-            day_data = schedule_by_date.get(date_str, {'count': 0, 'by_deck': {}})
-            
-            by_deck_list = []
-            for deck_id, cnt in day_data['by_deck'].items():
-                try:
-                    deck = Deck.objects.get(id=deck_id)
-                    by_deck_list.append({
-                        'deck_id': deck_id,
-                        'deck_name': deck.name,
-                        'color': deck.color or '#6366f1',
-                        'count': cnt
-                    })
-                except Deck.DoesNotExist:
-                    continue
-            
+            by_deck_list = schedule_by_date.get(current_date, [])
             schedule.append({
-                'date': date_str,
-                'count': day_data['count'],
+                'date': current_date.isoformat(),
+                'count': sum(item['count'] for item in by_deck_list),
                 'by_deck': by_deck_list
             })
-            
             current_date += timedelta(days=1)
         
-        stats = {
-            'today': Card.objects.filter(
-                deck__user=user,
-                is_suspended=False,
-                next_review__lte=timezone.now()
-            ).count(),
-            'week': Card.objects.filter(
-                deck__user=user,
-                is_suspended=False,
-                next_review__date__range=[today, today + timedelta(days=6)]
-            ).count(),
-            'total_due': Card.objects.filter(
-                deck__user=user,
-                is_suspended=False,
-                next_review__lte=timezone.now()
-            ).count(),
-        }
+        stats = Card.objects.filter(
+            user=user,
+            is_suspended=False,
+            next_review__isnull=False
+        ).aggregate(
+            today=Count('id', filter=Q(next_review__lte=timezone.now())),
+            week=Count('id', filter=Q(**day_filter('next_review', today, today + timedelta(days=6), tz))),
+        )
+        stats['total_due'] = stats['today']
         
         return Response({'schedule': schedule, 'stats': stats})
     
@@ -481,15 +869,17 @@ class StudyViewSet(viewsets.GenericViewSet):
         user = request.user
         now = timezone.now()
         
+        cards = Card.objects.filter(user=user)
+        
+        # Три отдельных счёта по индексам (user), (user, repetitions) и частичному
+        # cards_card_user_due_idx – без чтения строк таблицы, в отличие от одного агрегата с filter=
         return Response({
-            'cards_due_today': Card.objects.filter(
-                deck__user=user,
-                is_suspended=False,
-                next_review__lte=now
+            'cards_due_today': cards.filter(
+                is_suspended=False, next_review__isnull=False, next_review__lte=now
             ).count(),
             'total_decks': Deck.objects.filter(user=user).count(),
-            'total_cards': Card.objects.filter(deck__user=user).count(),
-            'cards_learned': Card.objects.filter(deck__user=user, repetitions__gte=1).count()
+            'total_cards': cards.count(),
+            'cards_learned': cards.filter(repetitions__gte=1).count()
         })
 
 
@@ -498,43 +888,26 @@ class StatisticsViewSet(viewsets.GenericViewSet):
     
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
-        user = request.user
-        cache_key = f'stats_dashboard_{user.id}'
-        data = cache.get(cache_key)
-        if data is not None:
-            return Response(data)
-        profile = user.profile
-        today = timezone.now().date()
-        week_ago = today - timedelta(days=7)
-        now = timezone.now()
-        data = {
+        """
+        Одна строка DashboardStats с профилем (см. dashboard.py): счётчики поддерживаются
+        при записи карточек и ответов, поэтому без кэша и всегда актуальны.
+        due_today – карточки к повторению до конца дня, «за неделю» – с понедельника.
+        """
+        stats = dashboard.stats_for(request.user)
+        profile = stats.user.profile
+        return Response({
             'cards': {
-                'total': Card.objects.filter(deck__user=user).count(),
-                'due_today': Card.objects.filter(
-                    deck__user=user,
-                    is_suspended=False,
-                    next_review__lte=now
-                ).count()
+                'total': stats.cards_count,
+                'due_today': stats.due_count
             },
             'decks': {
-                'total': Deck.objects.filter(user=user).count()
+                'total': stats.decks_count
             },
             'study': {
-                'cards_studied_this_week': CardReview.objects.filter(
-                    session__user=user,
-                    reviewed_at__date__gte=week_ago,
-                    reviewed_at__date__lte=today,
-                    session__is_practice_mode=False
-                ).values('card').distinct().count(),
-                'sessions_this_week': StudySession.objects.filter(
-                    user=user,
-                    started_at__date__gte=week_ago,
-                    started_at__date__lte=today,
-                    ended_at__isnull=False,
-                    is_practice_mode=False
-                ).count()
+                'cards_studied_this_week': stats.week_cards,
+                'sessions_this_week': stats.week_sessions
             },
-            'cards_learned': Card.objects.filter(deck__user=user, repetitions__gte=1).count(),
+            'cards_learned': stats.learned_count,
             'progress': {
                 'points': profile.total_points,
                 'level': profile.level,
@@ -542,119 +915,146 @@ class StatisticsViewSet(viewsets.GenericViewSet):
                 'longest_streak': profile.longest_streak,
                 'total_cards_studied': profile.total_cards_studied
             }
-        }
-        cache.set(cache_key, data, getattr(django_settings, 'CACHE_STATS_TTL', 120))
-        return Response(data)
+        })
     
     @action(detail=False, methods=['get'])
     def learning_stats(self, request):
         user = request.user
         days = int(request.query_params.get('days', 30))
-        today = timezone.now().date()
+        today = local_today(user_timezone(user))
         start_date = today - timedelta(days=days)
         
+        rows = {
+            row.date: row
+            for row in DailyActivity.objects.filter(
+                user=user,
+                date__gte=start_date,
+                date__lt=start_date + timedelta(days=days)
+            )
+        }
+        
         daily_activity = []
         for i in range(days):
             date = start_date + timedelta(days=i)
-            reviews = CardReview.objects.filter(
-                session__user=user,
-                reviewed_at__date=date,
-                session__is_practice_mode=False
-            )
-            
+            row = rows.get(date)
             daily_activity.append({
                 'date': date.isoformat(),
-                'cards_studied': reviews.values('card').distinct().count(),
-                'cards_correct': reviews.filter(rating__gte=3).count(),
-                'sessions': StudySession.objects.filter(
-                    user=user,
-                    started_at__date=date,
-                    ended_at__isnull=False,
-                    is_practice_mode=False
-                ).count()
+                'cards_studied': row.cards_studied if row else 0,
+                'cards_correct': row.cards_correct if row else 0,
+                'sessions': row.sessions if row else 0,
+                'reviews': row.reviews if row else 0,
+                'time_spent': row.time_spent if row else 0
             })
         
         return Response({'daily_activity': daily_activity})
     
     @action(detail=False, methods=['get'])
     def tags_stats(self, request):
-        user = request.user
-        user_cards = Card.objects.filter(deck__user=user)
-        
-        tags_data = []
-        for tag in Tag.objects.filter(
-            taggit_taggeditem_items__content_type__model='card',
-            taggit_taggeditem_items__object_id__in=user_cards.values_list('id', flat=True)
-        ).distinct():
-            tagged_cards = user_cards.filter(tags__name=tag.name)
-            total = tagged_cards.count()
-            mastered = tagged_cards.filter(repetitions__gte=3).count()
-            
-            tags_data.append({
+        tags = TagStat.objects.filter(
+            user=request.user, cards_count__gt=0
+        ).order_by('-cards_count', 'name')
+        return Response([
+            {
                 'tag': tag.name,
-                'total_cards': total,
-                'mastered_cards': mastered,
-                'mastery_percent': round((mastered / total * 100) if total > 0 else 0),
-                'avg_repetitions': round(
-                    tagged_cards.aggregate(Avg('repetitions'))['repetitions__avg'] or 0, 1
-                )
-            })
-        
-        return Response(sorted(tags_data, key=lambda x: x['total_cards'], reverse=True))
+                'total_cards': tag.cards_count,
+                'mastered_cards': tag.mastered_count,
+                'mastery_percent': round(tag.mastered_count / tag.cards_count * 100),
+                'avg_repetitions': round(tag.repetitions_sum / tag.cards_count, 1),
+            }
+            for tag in tags
+        ])
     
     @action(detail=False, methods=['get'])
     def decks_progress(self, request):
         user = request.user
         now = timezone.now()
-        decks = Deck.objects.filter(user=user).prefetch_related('cards')
+        mastered_q = Q(cards__interval__gte=10, cards__repetitions__gte=1) | Q(cards__repetitions__gte=3)
+        decks = Deck.objects.filter(user=user).annotate(
+            total_cards=Count('cards'),
+            new_cards=Count('cards', filter=Q(cards__repetitions=0)),
+            learning_cards=Count('cards', filter=Q(cards__repetitions__gte=1) & ~mastered_q),
+            mastered_cards=Count('cards', filter=mastered_q),
+            cards_due_today=Count('cards', filter=Q(
+                cards__next_review__lte=now,
+                cards__is_suspended=False
+            )),
+        ).order_by('-created_at', 'id')
         
-        decks_data = []
-        for deck in decks:
-            cards = deck.cards.all()
-            total_cards = cards.count()
-            
-            if total_cards > 0:
-                mastered = cards.filter(
-                    Q(interval__gte=10, repetitions__gte=1) | Q(repetitions__gte=3)
-                ).count()
-                learning = cards.filter(repetitions__gte=1).exclude(
-                    Q(interval__gte=10, repetitions__gte=1) | Q(repetitions__gte=3)
-                ).count()
-                
-                decks_data.append({
-                    'id': deck.id,
-                    'name': deck.name,
-                    'description': deck.description,
-                    'color': deck.color,
-                    'total_cards': total_cards,
-                    'new_cards': cards.filter(repetitions=0).count(),
-                    'learning_cards': learning,
-                    'mastered_cards': mastered,
-                    'cards_due_today': cards.filter(
-                        next_review__lte=now,
-                        is_suspended=False
-                    ).count(),
-                    'mastery_percent': round((mastered / total_cards) * 100),
-                    'created_at': deck.created_at
-                })
-            else:
-                decks_data.append({
-                    'id': deck.id,
-                    'name': deck.name,
-                    'description': deck.description,
-                    'color': deck.color,
-                    'total_cards': 0,
-                    'new_cards': 0,
-                    'learning_cards': 0,
-                    'mastered_cards': 0,
-                    'cards_due_today': 0,
-                    'mastery_percent': 0,
-                    'created_at': deck.created_at
-                })
+        deck_ids = request.query_params.get('deck_ids')
+        if deck_ids:
+            try:
+                decks = decks.filter(id__in=[int(i) for i in deck_ids.split(',') if i])
+            except ValueError:
+                return Response({'error': 'Invalid deck_ids'}, status=400)
         
+        paginator = None
+        if 'page' in request.query_params or 'page_size' in request.query_params:
+            paginator = PageNumberPagination()
+            paginator.page_size = min(int(request.query_params.get('page_size', 50)), 200)
+            decks = paginator.paginate_queryset(decks, request)
+        
+        decks_data = [{
+            'id': deck.id,
+            'name': deck.name,
+            'description': deck.description,
+            'color': deck.color,
+            'total_cards': deck.total_cards,
+            'new_cards': deck.new_cards,
+            'learning_cards': deck.learning_cards,
+            'mastered_cards': deck.mastered_cards,
+            'cards_due_today': deck.cards_due_today,
+            'mastery_percent': round((deck.mastered_cards / deck.total_cards) * 100) if deck.total_cards else 0,
+            'created_at': deck.created_at
+        } for deck in decks]
+        
+        if paginator is not None:
+            return Response({
+                'results': decks_data,
+                'count': paginator.page.paginator.count,
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+            })
         return Response(decks_data)
 
 
+class SyncViewSet(viewsets.GenericViewSet):
+    permission_classes = [IsAuthenticated]
+    
+    def list(self, request):
+        """
+        Изменения после отметки из ?token= (без токена – всё): папки, колоды, карточки
+        и id удалённых объектов. Токен из ответа клиент присылает в следующий раз,
+        при more=true – сразу. Подробности в sync.py.
+        """
+        try:
+            result = sync_changes(request.user, request.query_params.get('token'))
+        except InvalidSyncToken:
+            return Response({'error': 'Invalid sync token'}, status=400)
+        return Response({
+            'folders': FolderSyncSerializer(result.folders, many=True).data,
+            'decks': DeckSerializer(result.decks, many=True).data,
+            'cards': CardSerializer(result.cards, many=True, context={'request': request}).data,
+            'deleted': result.deleted,
+            'token': result.token,
+            'more': result.more,
+            'reset': result.reset,
+        })
+
+
+class ExportViewSet(viewsets.GenericViewSet):
+    permission_classes = [IsAuthenticated]
+    
+    @action(detail=False, methods=['get'])
+    def account(self, request):
+        """
+        Все данные пользователя в JSON Lines: папки, колоды, карточки, история ответов
+        и дневная активность, у каждой записи поле type. ?compress=gzip сжимает поток.
+        """
+        compress = request.query_params.get('compress') == 'gzip'
+        filename = f'memora-{request.user.id}-{timezone.localdate().isoformat()}'
+        return export_response(request.user, 'jsonl', filename, compress=compress)
+
+
 class FolderViewSet(viewsets.ModelViewSet):
     serializer_class = FolderSerializer
     permission_classes = [IsAuthenticated]
@@ -667,8 +1067,47 @@ class FolderViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def tree(self, request):
-        root_folders = Folder.objects.filter(user=request.user, parent__isnull=True)
-        serializer = FolderTreeSerializer(root_folders, many=True)
+        """
+        Дерево папок с колодами: все папки и колоды загружаются двумя запросами
+        и собираются в памяти. ?depth=N ограничивает глубину, ?parent_id=X отдаёт
+        поддерево папки X (для ленивого раскрытия узлов).
+        """
+        try:
+            depth = int(request.query_params['depth']) if 'depth' in request.query_params else None
+        except ValueError:
+            return Response({'error': 'Invalid depth'}, status=400)
+        parent_id = request.query_params.get('parent_id')
+        
+        folders = Folder.objects.filter(user=request.user)
+        base_depth = 0
+        if parent_id:
+            try:
+                parent = Folder.objects.get(id=parent_id, user=request.user)
+            except (Folder.DoesNotExist, ValueError):
+                return Response({'error': 'Папка не найдена'}, status=404)
+            folders = parent.get_descendants(include_self=False)
+            base_depth = parent.depth + 1
+        if depth is not None:
+            folders = folders.filter(depth__lt=base_depth + depth)
+        folders = list(folders.order_by('name'))
+        
+        folders_by_id = {folder.id: folder for folder in folders}
+        children = defaultdict(list)
+        roots = []
+        for folder in folders:
+            if folder.depth == base_depth:
+                roots.append(folder)
+            else:
+                children[folder.parent_id].append(folder)
+        
+        decks = defaultdict(list)
+        for deck in Deck.objects.filter(folder_id__in=folders_by_id):
+            deck.folder = folders_by_id[deck.folder_id]
+            decks[deck.folder_id].append(deck)
+        
+        serializer = FolderTreeSerializer(
+            roots, many=True, context={'children': children, 'decks': decks}
+        )
         return Response(serializer.data)
     
     @action(detail=True, methods=['get'])
@@ -681,6 +1120,13 @@ class FolderViewSet(viewsets.ModelViewSet):
             'decks': DeckSerializer(folder.decks.all(), many=True).data
         })
     
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """Экспорт карточек всех колод папки и её подпапок, параметры как у экспорта колоды."""
+        folder = self.get_object()
+        cards = Card.objects.filter(deck__folder__in=folder.get_descendants(include_self=True))
+        return _export(request, cards, f'folder-{folder.id}')
+    
     @action(detail=True, methods=['post'])
     def move(self, request, pk=None):
         folder = self.get_object()
@@ -689,7 +1135,7 @@ class FolderViewSet(viewsets.ModelViewSet):
         if new_parent_id:
             try:
                 new_parent = Folder.objects.get(id=new_parent_id, user=request.user)
-                if new_parent == folder or new_parent.parent == folder:
+                if new_parent.is_descendant_of(folder):
                     return Response(
                         {'error': 'Нельзя переместить папку в саму себя или в дочернюю'},
                         status=400
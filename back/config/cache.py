@@ -0,0 +1,283 @@
+"""
+Общий для процессов локальный кэш на файле SQLite.
+
+LocMemCache у каждого воркера gunicorn свой: ключи пользователя попадают то в
+один процесс, то в другой, а счётчики DRF-троттлинга считаются в каждом воркере
+отдельно. SQLiteCache хранит записи в одном файле на машине – все процессы видят
+одни и те же ключи без внешнего сервиса.
+
+- Файл в режиме WAL: читатели не ждут писателя, страницы читаются через mmap.
+- Соединение своё у каждого потока и процесса (после fork открывается заново).
+- Размер считается триггерами в однострочной таблице cache_stats: число записей
+  и сумма размеров (ключ + pickle значения).
+- При превышении MAX_ENTRIES или MAX_SIZE сначала удаляются просроченные записи,
+  затем давно не читавшиеся (LRU по колонке accessed), пока не освободится
+  1/CULL_FREQUENCY лимита. Отметка чтения пишется не чаще раза в ACCESS_RESOLUTION
+  секунд на ключ, чтобы горячие ключи не превращали каждое чтение в запись.
+- incr/decr атомарны между процессами (BEGIN IMMEDIATE).
+
+Настройки (settings.CACHES):
+    'BACKEND': 'config.cache.SQLiteCache',
+    'LOCATION': путь к файлу,
+    'OPTIONS': {'MAX_ENTRIES': ..., 'MAX_SIZE': байт, 'CULL_FREQUENCY': ..., 'ACCESS_RESOLUTION': секунд}
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Столько ключей в одном запросе IN (...) – ниже лимита параметров SQLite
+CHUNK_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (accessed);
+CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires) WHERE expires IS NOT NULL;
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats (id, entries, size) VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert AFTER INSERT ON cache_entries BEGIN
+    UPDATE cache_stats SET entries = entries + 1, size = size + new.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete AFTER DELETE ON cache_entries BEGIN
+    UPDATE cache_stats SET entries = entries - 1, size = size - old.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_update AFTER UPDATE OF size ON cache_entries BEGIN
+    UPDATE cache_stats SET size = size - old.size + new.size WHERE id = 0;
+END;
+"""
+
+# Запись поверх существующей – UPSERT, а не INSERT OR REPLACE: REPLACE удаляет
+# строку без триггера DELETE, и размер в cache_stats разошёлся бы
+UPSERT = """
+INSERT INTO cache_entries (key, value, expires, size, accessed) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value, expires = excluded.expires, size = excluded.size, accessed = excluded.accessed
+"""
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = str(location)
+        self._max_size = options.get('MAX_SIZE')
+        self._access_resolution = options.get('ACCESS_RESOLUTION', 5)
+        self._local = threading.local()
+
+    # Соединение
+
+    @property
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = self._connect()
+            local.pid = os.getpid()
+        return local.connection
+
+    def _connect(self):
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self._path, timeout=10, isolation_level=None)
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.execute('PRAGMA mmap_size = 268435456')
+        # Схему создаёт первый процесс; остальные ждут его блокировку и находят таблицы готовыми
+        connection.executescript('BEGIN IMMEDIATE;' + SCHEMA + 'COMMIT;')
+        return connection
+
+    @staticmethod
+    @contextmanager
+    def _transaction(connection):
+        """Транзакция с блокировкой на запись сразу: чтение и запись в ней не перебьёт другой процесс."""
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    # Значения
+
+    @staticmethod
+    def _dump(value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _row(self, key, value, timeout, now):
+        data = self._dump(value)
+        return key, data, self.get_backend_timeout(timeout), len(key) + len(data), now
+
+    def _touch_accessed(self, keys, now):
+        """Отметка чтения для LRU; уже свежая не переписывается."""
+        threshold = now - self._access_resolution
+        for start in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[start:start + CHUNK_SIZE]
+            self._connection.execute(
+                f'UPDATE cache_entries SET accessed = ? WHERE accessed < ? '
+                f'AND key IN ({", ".join("?" * len(chunk))})',
+                [now, threshold, *chunk],
+            )
+
+    # Интерфейс BaseCache
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        # Существующую запись перезаписывает только просроченную
+        cursor = self._connection.execute(
+            UPSERT + ' WHERE cache_entries.expires IS NOT NULL AND cache_entries.expires <= ?',
+            (*self._row(key, value, timeout, now), now),
+        )
+        self._cull_if_needed()
+        return cursor.rowcount == 1
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        row = self._connection.execute(
+            'SELECT value, expires, accessed FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires, accessed = row
+        if expires is not None and expires <= now:
+            self._connection.execute('DELETE FROM cache_entries WHERE key = ? AND expires <= ?', (key, now))
+            return default
+        if accessed < now - self._access_resolution:
+            self._touch_accessed([key], now)
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._connection.execute(UPSERT, self._row(key, value, timeout, time.time()))
+        self._cull_if_needed()
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._connection.execute(
+            'UPDATE cache_entries SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection.execute('DELETE FROM cache_entries WHERE key = ?', (key,)).rowcount == 1
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection.execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection
+        now = time.time()
+        with self._transaction(connection):
+            row = connection.execute(
+                'SELECT value FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, now)
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            data = self._dump(value)
+            connection.execute(
+                'UPDATE cache_entries SET value = ?, size = ?, accessed = ? WHERE key = ?',
+                (data, len(key) + len(data), now, key),
+            )
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_and_validate_key(key, version=version): key for key in keys}
+        now = time.time()
+        result, found = {}, []
+        names = list(keys)
+        for start in range(0, len(names), CHUNK_SIZE):
+            chunk = names[start:start + CHUNK_SIZE]
+            rows = self._connection.execute(
+                f'SELECT key, value FROM cache_entries WHERE (expires IS NULL OR expires > ?) '
+                f'AND key IN ({", ".join("?" * len(chunk))})',
+                [now, *chunk],
+            )
+            for key, value in rows:
+                result[keys[key]] = pickle.loads(value)
+                found.append(key)
+        if found:
+            self._touch_accessed(found, now)
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        rows = [
+            self._row(self.make_and_validate_key(key, version=version), value, timeout, now)
+            for key, value in data.items()
+        ]
+        with self._transaction(self._connection) as connection:
+            connection.executemany(UPSERT, rows)
+        self._cull_if_needed()
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [(self.make_and_validate_key(key, version=version),) for key in keys]
+        with self._transaction(self._connection) as connection:
+            connection.executemany('DELETE FROM cache_entries WHERE key = ?', keys)
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache_entries')
+
+    def close(self, **kwargs):
+        # Соединение живёт весь поток: открывать файл и ставить PRAGMA на каждый запрос дороже,
+        # чем держать его открытым
+        pass
+
+    # Размер и вытеснение
+
+    def stats(self):
+        """(записей, байт) по счётчикам триггеров."""
+        return self._connection.execute('SELECT entries, size FROM cache_stats WHERE id = 0').fetchone()
+
+    def _cull_if_needed(self):
+        entries, size = self.stats()
+        if entries > self._max_entries or (self._max_size is not None and size > self._max_size):
+            self._cull()
+
+    def _cull(self):
+        connection = self._connection
+        with self._transaction(connection):
+            if self._cull_frequency == 0:
+                connection.execute('DELETE FROM cache_entries')
+                return
+            connection.execute('DELETE FROM cache_entries WHERE expires <= ?', (time.time(),))
+            entries, size = connection.execute('SELECT entries, size FROM cache_stats WHERE id = 0').fetchone()
+            # Запас: освобождаем 1/CULL_FREQUENCY лимита, чтобы не вытеснять на каждой записи
+            target_entries = self._max_entries - self._max_entries // self._cull_frequency
+            target_size = None if self._max_size is None else self._max_size - self._max_size // self._cull_frequency
+            if entries <= target_entries and (target_size is None or size <= target_size):
+                return
+            victims = []
+            for key, entry_size in connection.execute('SELECT key, size FROM cache_entries ORDER BY accessed'):
+                if entries <= target_entries and (target_size is None or size <= target_size):
+                    break
+                victims.append((key,))
+                entries -= 1
+                size -= entry_size
+            connection.executemany('DELETE FROM cache_entries WHERE key = ?', victims)
@@ -1,6 +1,7 @@
 from pathlib import Path
 from datetime import timedelta
 import os
+import tempfile
 import dj_database_url
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -95,14 +96,30 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'OPTIONS': {'MAX_ENTRIES': 500},
-    },
-}
-CACHE_TAGS_TTL = 300
-CACHE_STATS_TTL = 120
+# Кэш: locmem – свой в каждом процессе; sqlite – один файл на машину для всех воркеров
+# gunicorn (config/cache.py), с общими ключами и счётчиками троттлинга
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND == 'sqlite':
+    CACHES = {
+        'default': {
+            'BACKEND': 'config.cache.SQLiteCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'memora-cache.sqlite3')),
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 50_000)),
+                'MAX_SIZE': int(os.environ.get('CACHE_MAX_SIZE', 64 * 1024 * 1024)),
+            },
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 500},
+        },
+    }
+CACHE_DISTRACTORS_TTL = 300
+# Сколько дней хранятся надгробия удалённых объектов; более старый токен синхронизации – полная выгрузка
+SYNC_TOMBSTONE_DAYS = 90
 
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -128,8 +145,8 @@ REST_FRAMEWORK = {
     ],
     'EXCEPTION_HANDLER': 'config.exceptions.custom_exception_handler',
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'config.throttling.AnonRateThrottle',
+        'config.throttling.UserRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour',
@@ -0,0 +1,41 @@
+"""
+Троттлинг DRF на счётчике в кэше.
+
+SimpleRateThrottle хранит список отметок запросов и переписывает его целиком
+(get, затем set): воркеры, читающие общий кэш одновременно, затирают записи друг
+друга, и лимит не соблюдается. Здесь окно фиксированной длины и счётчик на окно –
+add и incr атомарны и в LocMemCache, и в SQLiteCache (config/cache.py).
+"""
+from rest_framework import throttling
+
+
+class CounterThrottleMixin:
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        window = int(self.timer() // self.duration)
+        self.window_end = (window + 1) * self.duration
+        key = f'{self.key}_{window}'
+        if self.cache.add(key, 1, self.duration):
+            return True
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # Счётчик истёк между add и incr – окно уже следующее
+            self.cache.set(key, 1, self.duration)
+            return True
+        return count <= self.num_requests
+
+    def wait(self):
+        return max(self.window_end - self.timer(), 0)
+
+
+class AnonRateThrottle(CounterThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(CounterThrottleMixin, throttling.UserRateThrottle):
+    pass